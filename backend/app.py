@@ -1,7 +1,12 @@
-from flask import Flask, jsonify, render_template, send_from_directory, request
+from flask import Flask, Response, jsonify, render_template, send_from_directory
 from flask_cors import CORS
-from routes.api import api_bp
+from routes.api import api_bp, service_stats
 from models.database import db
+from models.migrations import upgrade
+from services.job_queue import job_queue
+from services.metrics import metrics
+from services.prediction_pool import prediction_pool
+from services.request_log import request_log
 import config
 import os
 from datetime import datetime
@@ -10,7 +15,7 @@ import numpy as np
 import json
 
 # Configure logging first
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=config.Config.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
 # Create a custom JSON encoder that handles NumPy types
@@ -34,21 +39,17 @@ app.json_encoder = CustomJSONEncoder
 app.config['CORS_HEADERS'] = 'Content-Type'
 CORS(app, resources={r"/*": {"origins": "*"}})
 
-# Initialize the database
+# Initialize the database, the background job queue, request metrics and (if enabled) request logging
 db.init_app(app)
-
-# Request logging
-@app.before_request
-def log_request_info():
-    logger.debug('Headers: %s', request.headers)
-    logger.debug('Body: %s', request.get_data())
+job_queue.init_app(app)
+metrics.init_app(app)
+request_log.init_app(app)
 
 @app.after_request
 def add_cors_headers(response):
     response.headers.add('Access-Control-Allow-Origin', '*')
     response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,Accept')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-    logger.debug('Response: %s', response.get_data())
     return response
 
 # Special handler for OPTIONS requests (CORS preflight)
@@ -65,9 +66,16 @@ def index():
     """Serve HTML documentation page"""
     endpoints = [
         {"path": "/api/keywords", "methods": ["GET", "POST"], "description": "List or add keywords"},
-        {"path": "/api/keywords/<id>/rankings", "methods": ["GET"], "description": "Get rankings for a keyword"},
+        {"path": "/api/keywords/<id>/rankings", "methods": ["GET"], "description": "Get rankings for a keyword (?limit/?cursor to page, ?format=ndjson to stream)"},
         {"path": "/api/keywords/<id>/fetch", "methods": ["POST"], "description": "Fetch new rankings"},
-        {"path": "/api/keywords/<id>/predict", "methods": ["GET"], "description": "Get ranking predictions"}
+        {"path": "/api/keywords/refresh", "methods": ["POST"], "description": "Fetch new rankings for many keywords (background job)"},
+        {"path": "/api/rankings/ingest", "methods": ["POST"], "description": "Store SERP snapshots for many keywords"},
+        {"path": "/api/keywords/<id>/predict", "methods": ["GET"], "description": "Get ranking predictions (?async=1 to run as a job)"},
+        {"path": "/api/jobs/<id>", "methods": ["GET"], "description": "Get background job status and result"},
+        {"path": "/api/exports", "methods": ["POST"], "description": "Export ranking history as columnar files (background job)"},
+        {"path": "/api/cache/stats", "methods": ["GET"], "description": "Prediction, Claude analysis and page cache counters"},
+        {"path": "/metrics", "methods": ["GET"], "description": "Latency histograms and service counters (Prometheus text format)"},
+        {"path": "/api/predictions", "methods": ["GET", "POST"], "description": "Stream predictions for many keywords as NDJSON"}
     ]
     
     return render_template('index.html', 
@@ -79,6 +87,20 @@ def index():
 def health():
     return jsonify({"status": "ok"})
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape target: request/job/stage histograms plus service stats as gauges"""
+    if not metrics.enabled:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    gauges = service_stats()
+    gauges["jobs"] = job_queue.stats()
+    gauges["prediction_pool"] = prediction_pool.stats()
+    gauges["request_log"] = request_log.stats()
+    pool = db.engine.pool
+    gauges["db_pool"] = {name: getattr(pool, name)() for name in ('size', 'checkedin', 'checkedout', 'overflow')
+                         if hasattr(pool, name)}
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
 # Add this after imports for debugging
 print("Loaded environment variables:")
 print(f"DEBUG: {os.getenv('DEBUG')}")
@@ -89,6 +111,7 @@ print(f"SERPAPI_KEY: {os.getenv('SERPAPI_KEY') != None}")
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        upgrade()
     print(f"Current working directory: {os.getcwd()}")
     print(f"Database URI: {app.config['SQLALCHEMY_DATABASE_URI']}")
     app.run(debug=app.config['DEBUG'], port=5001) 
\ No newline at end of file
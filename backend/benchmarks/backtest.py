@@ -0,0 +1,141 @@
+"""Backtest the trend models: forecast error and fit time per 1,000 series on replayed history.
+
+For each origin the last `--horizon` days before it are held out, every model
+is fitted on the `--window` days before that, and the forecasts are scored
+against the held-out daily positions. A last-value forecast is included as a
+baseline.
+
+Run from the backend directory:
+    python -m benchmarks.backtest --db instance/rankings.db
+    python -m benchmarks.backtest --keywords 200 --days 120 --outliers 0.02   # synthetic
+"""
+import argparse
+import os
+import time
+import numpy as np
+
+from flask import Flask
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+from models.database import db, Keyword
+from services.batch_predictor import MICROSECONDS_PER_DAY, RESAMPLE_METHODS, pack_arrays, resample_daily
+from services.history import RankingColumns, load_columns, to_epoch_us
+from services.trend_models import MODELS
+from benchmarks.synthetic import make_portfolio
+
+
+def load_database(path, limit=None):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.abspath(path)}"
+    db.init_app(app)
+    with app.app_context():
+        query = select(Keyword.id).order_by(Keyword.id)
+        if limit:
+            query = query.limit(limit)
+        try:
+            return load_columns(list(db.session.execute(query).scalars()))
+        except OperationalError as e:
+            raise SystemExit(f"Can't read {path} ({e.orig}); upgrade it with migrate_db.py first")
+
+
+def synthetic_columns(keywords, urls, days, fetches_per_day, outliers, seed=0):
+    """Synthetic portfolio; a fraction `outliers` of positions is replaced by a random position"""
+    rows = [row for rows in make_portfolio(keywords, urls, days, fetches_per_day, seed).values() for row in rows]
+    url_ids = {}
+    positions = np.array([row.position for row in rows], dtype=np.int16)
+    rng = np.random.default_rng(seed)
+    hit = rng.random(len(positions)) < outliers
+    positions[hit] = rng.integers(1, urls + 1, size=int(hit.sum()))
+    return RankingColumns(np.array([row.keyword_id for row in rows], dtype=np.int64),
+                          np.array([url_ids.setdefault(row.url, len(url_ids)) for row in rows], dtype=np.int64),
+                          positions, to_epoch_us([row.timestamp for row in rows]))
+
+
+def backtest(columns, window, horizon, origins, resample, models):
+    """{name: {'errors': [...], 'fit_seconds': float, 'series': int}} over all origins"""
+    keys = (columns.keyword_ids.astype(np.int64) << 32) | columns.url_ids.astype(np.int64)
+    days = columns.timestamps // MICROSECONDS_PER_DAY
+    last_day = int(days.max())
+    results = {name: {'errors': [], 'fit_seconds': 0.0, 'series': 0} for name in ('last_value', *models)}
+
+    for origin in range(origins):
+        cutoff = last_day + 1 - horizon * (origin + 1)  # first held-out day
+        train = (days >= cutoff - window) & (days < cutoff)
+        test = (days >= cutoff) & (days < cutoff + horizon)
+        if not train.any() or not test.any():
+            continue
+        batch = pack_arrays(keys[train], columns.timestamps[train], columns.positions[train], resample)
+
+        # Held-out targets, resampled the same way
+        order = np.lexsort((columns.timestamps[test], keys[test]))
+        target_keys, target_days, targets = resample_daily(
+            keys[test][order], days[test][order], columns.positions[test][order].astype(np.float64), resample)
+
+        # Map targets to batch rows; drop series unseen in training or too short to fit
+        row_keys = np.array(batch.keys, dtype=np.int64)
+        sorter = np.argsort(row_keys)
+        found = np.searchsorted(row_keys, target_keys, sorter=sorter)
+        found = np.minimum(found, len(row_keys) - 1)
+        rows = sorter[found]
+        keep = (row_keys[rows] == target_keys) & (batch.counts[rows] >= 3)
+        rows, x, targets = rows[keep], target_days[keep] - batch.origin, targets[keep]
+        fitted = batch.counts >= 3
+
+        last = batch.mask.shape[1] - 1 - np.argmax(batch.mask[:, ::-1], axis=1)
+        current = batch.positions[np.arange(len(batch)), last]
+        results['last_value']['errors'].append(current[rows] - targets)
+        results['last_value']['series'] += int(fitted.sum())
+
+        for name in models:
+            start = time.perf_counter()
+            fits = MODELS[name](batch.positions, batch.mask, batch.counts)
+            results[name]['fit_seconds'] += time.perf_counter() - start
+            results[name]['series'] += int(fitted.sum())
+            forecast = np.maximum(1, fits['intercept'][rows] + fits['slope'][rows] * x)
+            results[name]['errors'].append(forecast - targets)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help="SQLite database to replay (e.g. instance/rankings.db); synthetic data otherwise")
+    parser.add_argument('--limit', type=int, help="Only the first N keywords of --db")
+    parser.add_argument('--keywords', type=int, default=200)
+    parser.add_argument('--urls', type=int, default=30)
+    parser.add_argument('--days', type=int, default=120)
+    parser.add_argument('--fetches-per-day', type=int, default=2)
+    parser.add_argument('--outliers', type=float, default=0.0, help="Fraction of synthetic positions replaced at random")
+    parser.add_argument('--window', type=int, default=30, help="Training days before each origin")
+    parser.add_argument('--horizon', type=int, default=7, help="Held-out days after each origin")
+    parser.add_argument('--origins', type=int, default=4)
+    parser.add_argument('--resample', choices=RESAMPLE_METHODS, default='last')
+    parser.add_argument('--models', nargs='+', choices=sorted(MODELS), default=list(MODELS))
+    args = parser.parse_args()
+
+    if args.db:
+        columns = load_database(args.db, args.limit)
+        source = args.db
+    else:
+        columns = synthetic_columns(args.keywords, args.urls, args.days, args.fetches_per_day, args.outliers)
+        source = f"synthetic ({args.keywords} keywords x {args.urls} URLs x {args.days} days, outliers {args.outliers})"
+    if len(columns) == 0:
+        raise SystemExit("No rankings to replay")
+    print(f"{source}: {len(columns)} rankings; window {args.window}d, horizon {args.horizon}d, "
+          f"{args.origins} origins, resample={args.resample}")
+
+    results = backtest(columns, args.window, args.horizon, args.origins, args.resample, args.models)
+    if not any(len(errors) for errors in results['last_value']['errors']):
+        raise SystemExit("No series has three days of training data and a held-out day; "
+                         "try a longer --window or shorter --horizon")
+    print(f"{'model':>12} {'MAE':>7} {'RMSE':>7} {'fit ms/1k series':>17}")
+    for name, result in results.items():
+        if not result['errors']:
+            continue
+        errors = np.concatenate(result['errors'])
+        fit = f"{result['fit_seconds'] / result['series'] * 1e6:17.2f}" if name != 'last_value' else f"{'-':>17}"
+        print(f"{name:>12} {np.abs(errors).mean():7.3f} {np.sqrt((errors ** 2).mean()):7.3f} {fit}")
+
+
+if __name__ == '__main__':
+    main()
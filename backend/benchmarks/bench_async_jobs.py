@@ -0,0 +1,130 @@
+"""Upstream-bound ?async=1 jobs under load: worker threads vs coroutines on the event loop.
+
+Submits --jobs /predict (Claude analysis) or /content-analysis (page
+fetches + Claude) jobs at once through the API and waits for all of them.
+Claude and the pages are local stubs running in a child process with fixed
+latencies, so the numbers show how many upstream calls one process keeps
+open and with how many threads, not real upstream timings. Failed counts
+jobs that errored or whose pages missed CONTENT_FETCH_DEADLINE.
+
+Run from the backend directory:
+    python -m benchmarks.bench_async_jobs --jobs 300 --kind predict --modes async threads:4 threads:64
+"""
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from config import Config
+from benchmarks.stubs import StubAnthropicServer, StubPageServer, StubProcess
+from benchmarks.synthetic import make_portfolio
+
+
+class Sampler:
+    """Peak thread count of this process and peak number of running jobs, sampled every 10 ms"""
+
+    def __init__(self, job_queue):
+        self.job_queue = job_queue
+        self.peak_threads = 0
+        self.peak_running = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self.stopped.wait(0.01):
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            self.peak_running = max(self.peak_running, self.job_queue.stats().get('running', 0))
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--jobs', type=int, default=300)
+    parser.add_argument('--kind', choices=('predict', 'content'), default='predict')
+    parser.add_argument('--modes', nargs='+', default=['async', 'threads:4', 'threads:64'],
+                        help="'async' or 'threads:<job workers>'; run async first so idle workers don't count")
+    parser.add_argument('--claude-latency', type=float, default=1.0)
+    parser.add_argument('--page-latency', type=float, default=0.3)
+    parser.add_argument('--paragraphs', type=int, default=5, help="Size of the stub pages (parsing is CPU work)")
+    parser.add_argument('--hosts', type=int, default=200, help="Distinct page hosts (127.0.0.2 upwards)")
+    parser.add_argument('--urls', type=int, default=30)
+    parser.add_argument('--days', type=int, default=30)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp, \
+            StubProcess(StubAnthropicServer, args.claude_latency) as claude, \
+            StubProcess(StubPageServer, args.page_latency, bind='0.0.0.0', paragraphs=args.paragraphs) as pages:
+        # Every job goes upstream: no analysis, page or prediction caching
+        os.environ['ANTHROPIC_BASE_URL'] = claude.url
+        Config.CLAUDE_API_KEY = 'stub'
+        Config.CLAUDE_CACHE_PATH = Config.PAGE_CACHE_PATH = ''
+        Config.PREDICTION_CACHE_SIZE = 0
+        Config.ASYNC_JOB_CONCURRENCY = args.jobs
+        from models.database import db, Keyword
+        from routes.api import claude_service
+        from services.async_runner import async_runner
+        from services.ingest import ingest_snapshots
+        from services.job_queue import job_queue
+        from benchmarks.bench_ranking_stats import snapshots_of
+        from benchmarks.bench_rankings_stream import make_app
+
+        app = make_app(os.path.join(tmp, "bench.db"))
+        app.config['ASYNC_JOB_CONCURRENCY'] = args.jobs
+        job_queue.init_app(app)
+        portfolio = make_portfolio(min(args.jobs, 50), args.urls, args.days)
+        with app.app_context():
+            db.create_all()
+            db.session.add_all([Keyword(id=k, term=f"keyword {k}") for k in portfolio])
+            db.session.commit()
+            ingest_snapshots(snapshots_of(portfolio))
+        keyword_ids = list(portfolio)
+        client = app.test_client()
+
+        port = pages.url.rsplit(':', 1)[1]
+
+        def page_url(i, path):
+            # Spread the pages over loopback addresses so they look like separate sites (per-host limits)
+            return f"http://127.0.0.{2 + i % args.hosts}:{port}/{path}"
+
+        def submit(i):
+            keyword_id = keyword_ids[i % len(keyword_ids)]
+            if args.kind == 'predict':
+                return client.get(f'/api/keywords/{keyword_id}/predict?days={args.days}&async=1')
+            return client.post(f'/api/keywords/{keyword_id}/content-analysis?async=1',
+                               json={"target_url": page_url(i, f"target/{i}"),
+                                     "competitor_urls": [page_url(i + n + 1, f"competitor/{i}/{n}")
+                                                         for n in range(3)]})
+
+        print(f"{args.jobs} {args.kind} jobs; stubs: Claude {args.claude_latency}s, pages {args.page_latency}s")
+        print(f"{'mode':>11} {'seconds':>8} {'jobs/s':>7} {'peak running':>12} {'peak threads':>12} {'failed':>6}")
+        for mode in args.modes:
+            Config.ASYNC_JOBS = mode == 'async'
+            if not Config.ASYNC_JOBS:
+                job_queue.workers = int(mode.split(':')[1])
+            with Sampler(job_queue) as sampler:
+                start = time.perf_counter()
+                job_ids = [submit(i).json['job_id'] for i in range(args.jobs)]
+                jobs = [job_queue.get(job_id) for job_id in job_ids]
+                while not all(job.done for job in jobs):
+                    time.sleep(0.02)
+                elapsed = time.perf_counter() - start
+            # Content jobs report unreachable pages inside a successful result
+            failed = sum(job.status == 'failed' or "error" in ((job.result or {}).get("analysis") or {})
+                         for job in jobs)
+            print(f"{mode:>11} {elapsed:8.2f} {args.jobs / elapsed:7.1f} {sampler.peak_running:12d} "
+                  f"{sampler.peak_threads:12d} {failed:6d}")
+        print(f"event loop: {async_runner.stats()}")
+
+
+if __name__ == '__main__':
+    main()
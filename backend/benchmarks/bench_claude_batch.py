@@ -0,0 +1,70 @@
+"""Portfolio analysis throughput: one keyword per request vs batched and concurrent requests.
+
+Runs ClaudeService.analyze_many through the Anthropic SDK against the local
+stub, whose latency is a base round trip plus per-token costs for the
+prompt and the reply (all configurable; they model a remote endpoint, not
+real model timings). --missing-rate makes the stub leave keywords out of
+batch replies to exercise the single-request fallback.
+
+Run from the backend directory:
+    python -m benchmarks.bench_claude_batch --keywords 40 --modes 1x1 1x8 8x1 8x4
+"""
+import argparse
+import time
+
+import anthropic
+
+from config import Config
+from services.batch_predictor import BatchRankingPredictor
+from services.claude_service import ClaudeService
+from benchmarks.stubs import StubAnthropicServer
+from benchmarks.synthetic import make_portfolio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--keywords', type=int, default=40)
+    parser.add_argument('--urls', type=int, default=30)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--modes', nargs='+', default=['1x1', '1x8', '8x1', '8x4'],
+                        help="<keywords per request>x<requests in flight>")
+    parser.add_argument('--latency', type=float, default=0.5, help="Base seconds per request")
+    parser.add_argument('--seconds-per-1k-input', type=float, default=0.05)
+    parser.add_argument('--seconds-per-1k-output', type=float, default=5.0)
+    parser.add_argument('--output-tokens-per-keyword', type=int, default=200)
+    parser.add_argument('--missing-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    Config.CLAUDE_CACHE_PATH = ''  # every run goes to the stub
+    portfolio = make_portfolio(args.keywords, args.urls, args.days)
+    predictor = BatchRankingPredictor()
+    items = [(keyword_id, f"keyword {keyword_id}", rows, predictor.predict(rows))
+             for keyword_id, rows in portfolio.items()]
+    print(f"{args.keywords} keywords x {args.urls} URLs x {args.days} days; stub: {args.latency}s + "
+          f"{args.seconds_per_1k_input}s/1k input + {args.seconds_per_1k_output}s/1k output tokens, "
+          f"missing rate {args.missing_rate}")
+
+    with StubAnthropicServer(args.latency, seconds_per_1k_input=args.seconds_per_1k_input,
+                             seconds_per_1k_output=args.seconds_per_1k_output,
+                             output_tokens_per_keyword=args.output_tokens_per_keyword,
+                             missing_rate=args.missing_rate) as stub:
+        print(f"{'mode':>6} {'seconds':>8} {'keywords/s':>10} {'requests':>8} {'fallbacks':>9} {'errors':>6} "
+              f"{'speed-up':>8}")
+        baseline = None
+        for mode in args.modes:
+            group_size, concurrency = (int(part) for part in mode.split('x'))
+            service = ClaudeService(client=anthropic.Anthropic(api_key="stub", base_url=stub.url))
+            requests_before = stub.requests
+            start = time.perf_counter()
+            results = service.analyze_many(items, group_size=group_size, concurrency=concurrency)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            errors = sum(1 for analysis in results.values() if "error" in analysis)
+            if len(results) != len(items):
+                raise SystemExit(f"{mode}: got {len(results)} analyses for {len(items)} keywords")
+            print(f"{mode:>6} {elapsed:8.2f} {len(items) / elapsed:10.2f} {stub.requests - requests_before:8d} "
+                  f"{service.request_stats()['fallbacks']:9d} {errors:6d} {baseline / elapsed:8.2f}")
+
+
+if __name__ == '__main__':
+    main()
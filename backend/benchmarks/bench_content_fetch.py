@@ -0,0 +1,57 @@
+"""Serial vs concurrent page fetching in ContentService against local stub page servers.
+
+Run from the backend directory:
+    python -m benchmarks.bench_content_fetch --pages 4 12 --latency 0.3
+"""
+import argparse
+from contextlib import ExitStack
+import logging
+import time
+
+from services.content_service import ContentService
+from benchmarks.stubs import StubPageServer
+
+
+def timed_fetch(service, urls, deadline=None):
+    start = time.perf_counter()
+    results = service.fetch_pages(urls, deadline=deadline)
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for page in results if page.get('error'))
+    return elapsed, len(results) - failed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, nargs='+', default=[4, 12])
+    parser.add_argument('--hosts', type=int, default=4, help="Stub servers, each a separate host:port")
+    parser.add_argument('--latency', type=float, default=0.3, help="Stub response time in seconds")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--per-host', type=int, default=2)
+    parser.add_argument('--deadline', type=float, default=1.0,
+                        help="Deadline for the run that includes one slow page")
+    args = parser.parse_args()
+    logging.getLogger('services.content_service').setLevel(logging.ERROR)  # expected deadline warnings
+
+    with ExitStack() as stack:
+        hosts = [stack.enter_context(StubPageServer(latency=args.latency, slow_latency=args.deadline * 3))
+                 for _ in range(args.hosts)]
+        serial = ContentService(workers=1, page_cache=False)
+        concurrent = ContentService(workers=args.workers, per_host=args.per_host, deadline=0, page_cache=False)
+
+        for n_pages in args.pages:
+            urls = [f"{hosts[i % len(hosts)].url}/page/{i}" for i in range(n_pages)]
+            serial_s, _, _ = timed_fetch(serial, urls)
+            concurrent_s, ok, _ = timed_fetch(concurrent, urls)
+            print(f"{n_pages:>3} pages on {len(hosts)} hosts: serial {serial_s:.2f}s, "
+                  f"concurrent {concurrent_s:.2f}s ({ok} ok), speedup {serial_s / concurrent_s:.1f}x")
+
+        urls = [f"{hosts[i % len(hosts)].url}/page/{i}" for i in range(args.pages[0] - 1)]
+        urls.append(f"{hosts[0].url}/slow/page")
+        elapsed, ok, failed = timed_fetch(concurrent, urls, deadline=args.deadline)
+        print(f"with one slow page and a {args.deadline:.1f}s deadline: {elapsed:.2f}s, "
+              f"{ok} pages returned, {failed} timed out")
+        print(f"stubs served {sum(host.requests for host in hosts)} requests")
+
+
+if __name__ == '__main__':
+    main()
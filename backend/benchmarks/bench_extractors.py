@@ -0,0 +1,82 @@
+"""Throughput and peak memory of the page content extractors over a corpus of HTML fixtures.
+
+Run from the backend directory:
+    python -m benchmarks.bench_extractors                  # generated fixtures
+    python -m benchmarks.bench_extractors --fixtures DIR   # saved *.html pages
+"""
+import argparse
+import glob
+import os
+import tempfile
+import time
+import tracemalloc
+
+from services.extractors import EXTRACTORS
+from benchmarks.synthetic import make_html
+
+
+def write_fixtures(directory, sizes, per_size):
+    for paragraphs in sizes:
+        for seed in range(per_size):
+            path = os.path.join(directory, f"page-{paragraphs}-{seed}.html")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(make_html(paragraphs, seed=seed, title=f"Fixture {paragraphs}/{seed}"))
+
+
+def load_fixtures(directory):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.html'))):
+        with open(path, encoding='utf-8', errors='replace') as f:
+            pages.append((os.path.basename(path), f.read()))
+    return pages
+
+
+def measure(extract, pages, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        results = [extract(name, html) for name, html in pages]
+    elapsed = (time.perf_counter() - start) / rounds
+
+    # Peak memory of the single most expensive page, measured separately so tracing doesn't skew timing
+    largest = max(pages, key=lambda page: len(page[1]))
+    tracemalloc.start()
+    extract(*largest)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fixtures', help="Directory of saved .html pages (default: generate a corpus)")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 200, 2000],
+                        help="Paragraph counts of generated pages")
+    parser.add_argument('--per-size', type=int, default=5)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.fixtures
+        if not directory:
+            directory = tmp
+            write_fixtures(directory, args.sizes, args.per_size)
+        pages = load_fixtures(directory)
+
+    total_mb = sum(len(html.encode('utf-8')) for _, html in pages) / 2 ** 20
+    print(f"{len(pages)} pages, {total_mb:.1f} MiB of HTML")
+
+    reference = None
+    for name, extract in EXTRACTORS.items():
+        elapsed, peak, results = measure(extract, pages, args.rounds)
+        if reference is None:
+            reference = results
+        same = sum(result == expected for result, expected in zip(results, reference))
+        same_content = sum(result['content'] == expected['content']
+                           for result, expected in zip(results, reference))
+        print(f"{name:>15}: {elapsed * 1000:8.1f} ms/corpus  {len(pages) / elapsed:7.1f} pages/s  "
+              f"{total_mb / elapsed:6.1f} MiB/s  peak {peak / 2 ** 20:6.1f} MiB  "
+              f"identical {same}/{len(pages)} (content {same_content}/{len(pages)})")
+
+
+if __name__ == '__main__':
+    main()
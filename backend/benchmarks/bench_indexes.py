@@ -0,0 +1,102 @@
+"""Ranking query latency and EXPLAIN QUERY PLAN before/after the composite indexes.
+
+Run from the backend directory:
+    python -m benchmarks.bench_indexes --rows 2000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+from models.migrations import upgrade
+
+LEGACY_SCHEMA = """
+CREATE TABLE keyword (
+    id INTEGER NOT NULL, term VARCHAR(255) NOT NULL, industry VARCHAR(100), created_at DATETIME,
+    PRIMARY KEY (id)
+);
+CREATE TABLE ranking (
+    id INTEGER NOT NULL, keyword_id INTEGER NOT NULL, url VARCHAR(500) NOT NULL,
+    position INTEGER NOT NULL, timestamp DATETIME,
+    PRIMARY KEY (id), FOREIGN KEY(keyword_id) REFERENCES keyword (id)
+);
+"""
+
+# The SQL the ORM emits for get_rankings, predict_rankings and the content-analysis lookup
+QUERIES = {
+    "rankings (30d)": "SELECT * FROM ranking WHERE keyword_id = ? AND timestamp >= ?",
+    "predict (30d, sorted)": "SELECT * FROM ranking WHERE keyword_id = ? AND timestamp >= ? "
+                             "ORDER BY timestamp DESC",
+    "latest top 10": "SELECT * FROM ranking WHERE keyword_id = ? ORDER BY timestamp DESC LIMIT 10",
+}
+
+
+def seed(path, rows, urls):
+    """Daily snapshots of `urls` results for enough keywords to reach `rows` rows"""
+    days = 365
+    keywords = max(1, rows // (urls * days))
+    end = datetime.utcnow()
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.executemany("INSERT INTO keyword (id, term) VALUES (?, ?)",
+                     [(k, f"keyword {k}") for k in range(1, keywords + 1)])
+
+    # Insert day by day across all keywords, the way scheduled refreshes interleave
+    for day in range(days):
+        stamp = (end - timedelta(days=days - day)).strftime("%Y-%m-%d %H:%M:%S.%f")
+        conn.executemany(
+            "INSERT INTO ranking (keyword_id, url, position, timestamp) VALUES (?, ?, ?, ?)",
+            ((k, f"https://site{(k * 31 + p) % 997}.example.com/{k}", p, stamp)
+             for k in range(1, keywords + 1) for p in range(1, urls + 1)))
+    conn.commit()
+    conn.close()
+    return keywords
+
+
+def measure(path, keywords, samples):
+    conn = sqlite3.connect(path)
+    since = (datetime.utcnow() - timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S.%f")
+    picks = [random.randint(1, keywords) for _ in range(samples)]
+    for name, sql in QUERIES.items():
+        params = (lambda k: (k, since)) if sql.count('?') == 2 else (lambda k: (k,))
+        plan = " | ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params(1)))
+        start = time.perf_counter()
+        for k in picks:
+            conn.execute(sql, params(k)).fetchall()
+        elapsed = (time.perf_counter() - start) / samples
+        print(f"  {name:<22} {elapsed * 1000:9.3f} ms/query   plan: {plan}")
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--urls', type=int, default=30)
+    parser.add_argument('--samples', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'rankings.db')
+        start = time.perf_counter()
+        keywords = seed(path, args.rows, args.urls)
+        print(f"Seeded {keywords * args.urls * 365} rows for {keywords} keywords "
+              f"in {time.perf_counter() - start:.1f}s")
+
+        print("Before (primary key only):")
+        measure(path, keywords, args.samples)
+
+        start = time.perf_counter()
+        applied = upgrade(create_engine(f"sqlite:///{path}"))
+        print(f"Migration {applied} took {time.perf_counter() - start:.1f}s")
+
+        print("After:")
+        measure(path, keywords, args.samples)
+
+
+if __name__ == '__main__':
+    main()
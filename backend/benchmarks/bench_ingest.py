@@ -0,0 +1,75 @@
+"""Snapshot ingest throughput: one ORM object per row vs the executemany ingest path.
+
+Run from the backend directory:
+    python -m benchmarks.bench_ingest --keywords 500 --results 30
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+
+from models.database import db, Keyword, Ranking
+from services.ingest import ingest_snapshots, url_interner
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{path}"
+    db.init_app(app)
+    return app
+
+
+def orm_path(snapshots):
+    """The previous write path: db.session.add per ranking, one commit per snapshot"""
+    for keyword_id, organic_results, timestamp in snapshots:
+        url_ids = url_interner.get_ids([result['url'] for result in organic_results])
+        for idx, result in enumerate(organic_results, 1):
+            db.session.add(Ranking(keyword_id=keyword_id, url_id=url_ids[result['url']],
+                                   position=idx, timestamp=timestamp))
+        db.session.commit()
+
+
+def per_snapshot_path(snapshots):
+    for snapshot in snapshots:
+        ingest_snapshots([snapshot])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--keywords', type=int, default=500)
+    parser.add_argument('--results', type=int, default=30)
+    parser.add_argument('--rounds', type=int, default=3,
+                        help="Daily refreshes; the first one also creates every Url row")
+    args = parser.parse_args()
+
+    now = datetime.utcnow()
+    snapshots = [(kid, [{"url": f"https://site{i}.example.com/{kid}"} for i in range(args.results)],
+                  now + timedelta(days=day))
+                 for day in range(args.rounds) for kid in range(1, args.keywords + 1)]
+    total = len(snapshots) * args.results
+
+    paths = [("ORM add per row", orm_path),
+             ("ingest per snapshot", per_snapshot_path),
+             ("ingest one batch", ingest_snapshots)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, fn in paths:
+            app = make_app(os.path.join(tmp, f"{fn.__name__}.db"))
+            with app.app_context():
+                url_interner.clear()
+                db.create_all()
+                db.session.add_all([Keyword(id=kid, term=f"kw{kid}") for kid in range(1, args.keywords + 1)])
+                db.session.commit()
+
+                start = time.perf_counter()
+                fn(snapshots)
+                elapsed = time.perf_counter() - start
+                assert Ranking.query.count() == total
+                print(f"{name:>20}: {total} rows in {elapsed:6.2f}s ({total / elapsed:9.0f} rows/s)")
+
+
+if __name__ == '__main__':
+    main()
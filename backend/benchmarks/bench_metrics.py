@@ -0,0 +1,87 @@
+"""Cost of the /metrics instrumentation on cheap, SQL-heavy requests.
+
+Times the same /predict (caches off) and paged /rankings requests with
+metrics switched off and on (request hooks, stage timers and SQLAlchemy
+cursor events), alternating rounds and keeping the fastest of each so
+machine noise doesn't swamp the difference, then how long rendering
+/metrics takes.
+
+Run from the backend directory:
+    python -m benchmarks.bench_metrics --keywords 20 --requests 500 --rounds 5
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from models.database import db, Keyword
+from services.ingest import ingest_snapshots
+from services.metrics import metrics
+from benchmarks.bench_ranking_stats import snapshots_of
+from benchmarks.bench_rankings_stream import make_app
+from benchmarks.synthetic import make_portfolio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--keywords', type=int, default=20)
+    parser.add_argument('--urls', type=int, default=30)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--requests', type=int, default=500, help="Per endpoint, mode and round")
+    parser.add_argument('--rounds', type=int, default=5, help="Alternating off/on rounds; the fastest counts")
+    args = parser.parse_args()
+
+    # Every /predict reads history and fits; nothing is served from memory, and Claude is off
+    from routes.api import claude_service, prediction_cache, series_store
+    claude_service.client = None
+    prediction_cache.max_entries = 0
+    series_store.max_bytes = 0
+
+    portfolio = make_portfolio(args.keywords, args.urls, args.days)
+    keyword_ids = list(portfolio)
+    endpoints = {
+        'predict': lambda i: f'/api/keywords/{keyword_ids[i % len(keyword_ids)]}/predict?days={args.days}',
+        'rankings': lambda i: f'/api/keywords/{keyword_ids[i % len(keyword_ids)]}/rankings?limit=100',
+    }
+    print(f"{args.keywords} keywords x {args.urls} URLs x {args.days} days, {args.requests} requests per run")
+    print(f"{'endpoint':>9} {'mode':>4} {'ms/request':>10} {'overhead':>8}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        app = make_app(path)
+        with app.app_context():
+            db.create_all()
+            db.session.add_all([Keyword(id=k, term=f"keyword {k}") for k in portfolio])
+            db.session.commit()
+            ingest_snapshots(snapshots_of(portfolio))
+
+        # Hooks and cursor events stay installed; 'off' rounds flip the runtime switch
+        metrics.init_app(app)
+        client = app.test_client()
+        for name, url in endpoints.items():
+            for i in range(min(20, args.requests)):  # warm up
+                client.get(url(i))
+        timings = {}
+        for _ in range(args.rounds):
+            for mode in ('off', 'on'):
+                metrics.enabled = mode == 'on'
+                for name, url in endpoints.items():
+                    start = time.perf_counter()
+                    for i in range(args.requests):
+                        response = client.get(url(i))
+                        if response.status_code != 200:
+                            raise SystemExit(f"{url(i)} returned {response.status_code}")
+                    elapsed = (time.perf_counter() - start) / args.requests * 1000
+                    timings[name, mode] = min(elapsed, timings.get((name, mode), elapsed))
+        for name in endpoints:
+            for mode in ('off', 'on'):
+                overhead = timings[name, mode] / timings[name, 'off'] - 1
+                print(f"{name:>9} {mode:>4} {timings[name, mode]:10.3f} {overhead:+8.1%}")
+
+        start = time.perf_counter()
+        text = metrics.render()
+        print(f"render: {(time.perf_counter() - start) * 1000:.2f} ms for {len(text.splitlines())} lines")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Page cache cold fetches vs fresh hits vs ETag revalidations against a local stub page server.
+
+Run from the backend directory:
+    python -m benchmarks.bench_page_cache --pages 20 --latency 0.05
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from services.content_service import ContentService
+from services.disk_cache import DiskCache
+from benchmarks.stubs import StubPageServer
+
+
+def fetch_all(service, urls):
+    start = time.perf_counter()
+    for url in urls:
+        service.fetch_page_content(url)
+    return (time.perf_counter() - start) / len(urls) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--paragraphs', type=int, default=200, help="Size of each generated page")
+    parser.add_argument('--latency', type=float, default=0.05, help="Stub response time in seconds")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            StubPageServer(latency=args.latency, paragraphs=args.paragraphs) as stub:
+        cache = DiskCache(os.path.join(tmp, 'pages.db'), namespace='pages')
+        urls = [f"{stub.url}/page/{i}" for i in range(args.pages)]
+
+        cold = fetch_all(ContentService(workers=1, page_cache=cache), urls)
+        fresh = fetch_all(ContentService(workers=1, page_cache=cache), urls)
+        served = stub.requests
+        revalidating = ContentService(workers=1, page_cache=cache, max_age=0)
+        revalidated = fetch_all(revalidating, urls)
+
+        print(f"cold fetch + parse:   {cold:7.2f} ms/page")
+        print(f"fresh cache hit:      {fresh:7.2f} ms/page ({served - args.pages} extra requests)")
+        print(f"304 revalidation:     {revalidated:7.2f} ms/page ({revalidating.revalidated} not modified)")
+        print(f"cache: {cache.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Prediction pool scaling: full-portfolio batch prediction with 1, 2, 4 and 8 worker processes.
+
+Keywords are predicted in chunks of --chunk-size, as /predictions does.
+One worker means inline, the baseline. Worker start-up is timed separately
+(the first call), and every run is checked against the inline result.
+
+Run from the backend directory:
+    python -m benchmarks.bench_prediction_pool --keywords 2000 --urls 30 --days 30 --fetches-per-day 2
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+import numpy as np
+
+from services.batch_predictor import BatchRankingPredictor
+from services.prediction_pool import PredictionPool
+from services.trend_models import MODELS
+from benchmarks.bench_predictor import to_columns
+from benchmarks.synthetic import make_portfolio
+
+
+def run(pool, predictor, chunks, workers, model, now):
+    results = {}
+    for chunk in chunks:
+        results.update(pool.predict_columns(chunk, predictor, 7, now, model, workers))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--keywords', type=int, default=2000)
+    parser.add_argument('--urls', type=int, default=30)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--fetches-per-day', type=int, default=2)
+    parser.add_argument('--chunk-size', type=int, default=200, help="Keywords per chunk")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--model', choices=sorted(MODELS), default='linear')
+    parser.add_argument('--start-method', default='spawn')
+    args = parser.parse_args()
+
+    columns = to_columns(make_portfolio(args.keywords, args.urls, args.days, args.fetches_per_day))
+    keyword_ids = np.unique(columns.keyword_ids)
+    chunks = [columns.select(np.isin(columns.keyword_ids, keyword_ids[i:i + args.chunk_size]))
+              for i in range(0, len(keyword_ids), args.chunk_size)]
+    predictor = BatchRankingPredictor(model=args.model)
+    now = datetime.utcnow()
+    print(f"{args.keywords} keywords, {len(columns)} rankings in {len(chunks)} chunks, model={args.model}, "
+          f"{os.cpu_count()} CPUs")
+
+    start = time.perf_counter()
+    expected = run(PredictionPool(workers=1), predictor, chunks, 1, args.model, now)
+    baseline = time.perf_counter() - start
+    print(f"{'workers':>7} {'start-up s':>10} {'predict s':>9} {'speed-up':>8}")
+    print(f"{1:>7} {'-':>10} {baseline:9.2f} {1.0:8.2f}")
+
+    for workers in [w for w in args.workers if w > 1]:
+        pool = PredictionPool(workers=workers, min_rows=0, start_method=args.start_method)
+        try:
+            start = time.perf_counter()
+            pool.predict_columns(chunks[0], predictor, 7, now, args.model)  # spawns the workers
+            startup = time.perf_counter() - start
+            start = time.perf_counter()
+            got = run(pool, predictor, chunks, workers, args.model, now)
+            elapsed = time.perf_counter() - start
+        finally:
+            pool.shutdown()
+        if got != expected:
+            raise SystemExit(f"{workers} workers returned different predictions than inline")
+        print(f"{workers:>7} {startup:10.2f} {elapsed:9.2f} {baseline / elapsed:8.2f}")
+
+
+if __name__ == '__main__':
+    main()
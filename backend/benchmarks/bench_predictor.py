@@ -0,0 +1,117 @@
+"""Batched vs per-URL prediction throughput, per resampling mode, and trend error on irregular schedules.
+
+Run from the backend directory:
+    python -m benchmarks.bench_predictor --keywords 200 --urls 30 --days 30 --fetches-per-day 4
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+import numpy as np
+
+from services.batch_predictor import BatchRankingPredictor
+from services.history import RankingColumns, to_epoch_us
+from services.predictor import RankingPredictor
+from benchmarks.synthetic import RankingRow, make_portfolio
+
+
+def compare(reference, batched):
+    """Return the number of URLs whose batched output differs from the per-URL loop"""
+    mismatches = 0
+    for url, expected in reference.items():
+        got = batched.get(url)
+        if got is None or got['current_position'] != expected['current_position'] \
+                or got['predictions'] != expected['predictions'] \
+                or abs(got['trend'] - expected['trend']) > 1e-9 \
+                or abs(got['volatility'] - expected['volatility']) > 1e-9:
+            mismatches += 1
+    return mismatches + len(set(batched) - set(reference))
+
+
+def irregular_series(urls=30, days=60, seed=0):
+    """Rankings with a known drift per day, fetched in bursts: up to 12 fetches some days, none on others.
+
+    Returns (rows, {url: true slope in positions per day}).
+    """
+    rng = np.random.default_rng(seed)
+    end = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    base = rng.uniform(5, 50, size=urls)
+    drift = rng.normal(0, 0.3, size=urls)
+    rows = []
+    for day in range(days):
+        fetches = int(rng.choice([0, 0, 1, 12]))
+        for hour in sorted(rng.choice(24, size=fetches, replace=False)):
+            values = base + drift * (day + hour / 24) + rng.normal(0, 1.0, size=urls)
+            timestamp = end - timedelta(days=days - day) + timedelta(hours=int(hour))
+            rows.extend(RankingRow(1, f"https://site-{i}.example.com/", max(1, int(round(v))), timestamp)
+                        for i, v in enumerate(values))
+    return rows, {f"https://site-{i}.example.com/": d for i, d in enumerate(drift)}
+
+
+def trend_error(resample, trials=20):
+    """Mean absolute error of the fitted trend (positions/day) against the true drift"""
+    errors = []
+    for seed in range(trials):
+        rows, truth = irregular_series(seed=seed)
+        predictions = BatchRankingPredictor(resample=resample).predict(rows)
+        errors.extend(abs(predictions[url]['trend'] - slope) for url, slope in truth.items() if url in predictions)
+    return float(np.mean(errors))
+
+
+def to_columns(portfolio):
+    rows = [row for rows in portfolio.values() for row in rows]
+    url_ids = {}
+    return RankingColumns(np.array([row.keyword_id for row in rows], dtype=np.int64),
+                          np.array([url_ids.setdefault(row.url, len(url_ids)) for row in rows], dtype=np.int64),
+                          np.array([row.position for row in rows], dtype=np.int16),
+                          to_epoch_us([row.timestamp for row in rows]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--keywords', type=int, default=200)
+    parser.add_argument('--urls', type=int, default=30)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--fetches-per-day', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    portfolio = make_portfolio(args.keywords, args.urls, args.days, args.fetches_per_day)
+    print(f"{args.keywords} keywords x {args.urls} URLs x {args.days} days x {args.fetches_per_day} fetches/day")
+    predictor = RankingPredictor()
+
+    for resample in (None, 'last', 'median'):
+        predictor.batch.resample = resample
+        mismatches = sum(compare(predictor.predict_future_rankings_per_url(rows),
+                                 predictor.predict_future_rankings(rows))
+                         for rows in portfolio.values())
+        print(f"resample={resample}: output mismatches {mismatches}")
+
+        for name, fn in [("per-URL loop", predictor.predict_future_rankings_per_url),
+                         ("batched", predictor.predict_future_rankings)]:
+            best = float('inf')
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                for rows in portfolio.values():
+                    fn(rows)
+                best = min(best, time.perf_counter() - start)
+            print(f"{name:>14}: {best * 1000:8.1f} ms total, "
+                  f"{best * 1000 / args.keywords:6.2f} ms/keyword")
+
+    columns = to_columns(portfolio)
+    print(f"whole portfolio from arrays ({len(columns)} rankings):")
+    for resample in (None, 'last', 'median'):
+        predictor = BatchRankingPredictor(resample=resample)
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            predictor.predict_columns(columns)
+            best = min(best, time.perf_counter() - start)
+        print(f"  resample={resample}: {best * 1000:8.1f} ms")
+
+    print("trend error on bursty schedules (positions/day, mean absolute):")
+    for resample in (None, 'last', 'median'):
+        print(f"  resample={resample}: {trend_error(resample):.4f}")
+
+
+if __name__ == '__main__':
+    main()
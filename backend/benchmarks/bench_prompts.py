@@ -0,0 +1,105 @@
+"""Ranking-analysis prompt size and latency: raw rows + full predictions vs the compact, budgeted prompt.
+
+End-to-end latency goes through the real Anthropic SDK against a local
+stub whose response time grows with the request size (--seconds-per-1k-input,
+a stand-in for prompt processing), so it shows the effect of prompt size
+only, not real model timings.
+
+Run from the backend directory:
+    python -m benchmarks.bench_prompts --keywords 20 --urls 30 --days 30 --fetches-per-day 2
+"""
+import argparse
+import json
+import statistics
+import time
+
+import anthropic
+
+from config import Config
+from services.batch_predictor import BatchRankingPredictor
+from services.claude_service import ClaudeService
+from services.prompt_builder import build_ranking_prompt, estimate_tokens
+from benchmarks.stubs import StubAnthropicServer
+from benchmarks.synthetic import make_portfolio
+
+
+def raw_prompt(keyword, rankings, predictions):
+    """The prompt analyze_rankings used to send: every row and the whole predictions dict"""
+    ranking_data = [{"date": r.timestamp.strftime("%Y-%m-%d"), "url": r.url, "position": r.position}
+                    for r in rankings]
+    return f"""Analyze these search ranking trends for the keyword "{keyword}".
+
+Ranking history:
+{json.dumps(ranking_data, indent=2)}
+
+Predictions:
+{json.dumps(predictions, indent=2)}
+
+Please provide an analysis covering:
+1. An overall summary of the ranking trends
+2. Which URLs showed significant volatility
+3. Which URLs are predicted to improve or decline in rankings
+4. Any patterns or anomalies in the data
+5. Strategic recommendations based on these trends
+
+Format your response as JSON with these keys: "summary", "volatility_analysis", "prediction_analysis", "patterns_discovered", and "recommendations"."""
+
+
+def request_for(text):
+    return {"model": "claude-3-5-sonnet-latest", "max_tokens": 2000, "temperature": 0.2,
+            "messages": [{"role": "user", "content": text}]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--keywords', type=int, default=20)
+    parser.add_argument('--urls', type=int, default=30)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--fetches-per-day', type=int, default=2)
+    parser.add_argument('--budget', type=int, default=Config.CLAUDE_PROMPT_TOKEN_BUDGET)
+    parser.add_argument('--max-urls', type=int, default=Config.CLAUDE_PROMPT_MAX_URLS)
+    parser.add_argument('--seconds-per-1k-input', type=float, default=0.02)
+    args = parser.parse_args()
+
+    portfolio = make_portfolio(args.keywords, args.urls, args.days, args.fetches_per_day)
+    predictor = BatchRankingPredictor()
+    cases = [(f"keyword {k}", rows, predictor.predict(rows)) for k, rows in portfolio.items()]
+
+    sizes = {'raw': [], 'compact': []}
+    build_ms = {'raw': [], 'compact': []}
+    prompts = {'raw': [], 'compact': []}
+    for keyword, rows, predictions in cases:
+        start = time.perf_counter()
+        text = raw_prompt(keyword, rows, predictions)
+        build_ms['raw'].append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        compact = build_ranking_prompt(keyword, rows, predictions, args.budget, args.max_urls)
+        build_ms['compact'].append((time.perf_counter() - start) * 1000)
+        for name, prompt in (('raw', text), ('compact', compact.text)):
+            sizes[name].append(estimate_tokens(prompt))
+            prompts[name].append(prompt)
+
+    print(f"{args.keywords} keywords x {args.urls} URLs x {args.days} days x {args.fetches_per_day} fetches/day; "
+          f"budget {args.budget} tokens, max {args.max_urls} URLs; last compact prompt: {compact.urls_included} URLs, "
+          f"history step {compact.history_step}")
+    with StubAnthropicServer(seconds_per_1k_input=args.seconds_per_1k_input) as stub:
+        service = ClaudeService(client=anthropic.Anthropic(api_key="stub", base_url=stub.url))
+        latency = {}
+        for name in ('raw', 'compact'):
+            timings = []
+            for text in prompts[name]:
+                start = time.perf_counter()
+                service._request_analysis(request_for(text))
+                timings.append((time.perf_counter() - start) * 1000)
+            latency[name] = timings
+
+    print(f"{'prompt':>8} {'est. tokens':>12} {'max':>7} {'build ms':>9} {'analysis ms':>12}")
+    for name in ('raw', 'compact'):
+        print(f"{name:>8} {statistics.mean(sizes[name]):12.0f} {max(sizes[name]):7d} "
+              f"{statistics.mean(build_ms[name]):9.2f} {statistics.mean(latency[name]):12.1f}")
+    print(f"compact prompt: {statistics.mean(sizes['raw']) / statistics.mean(sizes['compact']):.1f}x smaller, "
+          f"{statistics.mean(latency['raw']) / statistics.mean(latency['compact']):.1f}x faster end to end")
+
+
+if __name__ == '__main__':
+    main()
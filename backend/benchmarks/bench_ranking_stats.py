@@ -0,0 +1,89 @@
+"""Per-keyword prediction from persisted regression sums vs refitting the window, and the ingest overhead.
+
+Run from the backend directory:
+    python -m benchmarks.bench_ranking_stats --keywords 20 --days 365
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+
+from config import Config
+from models.database import db, Keyword
+from services.history import load_columns
+from services.ingest import ingest_snapshots
+from services.predictor import RankingPredictor
+from benchmarks.synthetic import make_portfolio
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{path}"
+    db.init_app(app)
+    return app
+
+
+def snapshots_of(portfolio):
+    grouped = {}
+    for keyword_id, rows in portfolio.items():
+        for row in rows:
+            grouped.setdefault((keyword_id, row.timestamp), []).append(row)
+    return [(keyword_id, [{"url": r.url} for r in sorted(rows, key=lambda r: r.position)], timestamp)
+            for (keyword_id, timestamp), rows in sorted(grouped.items(), key=lambda item: item[0][1])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--keywords', type=int, default=20)
+    parser.add_argument('--urls', type=int, default=30)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--fetches-per-day', type=int, default=2)
+    parser.add_argument('--windows', type=int, nargs='+', default=[30, 365])
+    args = parser.parse_args()
+
+    portfolio = make_portfolio(args.keywords, args.urls, args.days, args.fetches_per_day)
+    snapshots = snapshots_of(portfolio)
+    predictor = RankingPredictor()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        timings = {}
+        for enabled in (False, True):
+            Config.RANKING_STATS = enabled
+            app = make_app(os.path.join(tmp, f"bench-{enabled}.db"))
+            with app.app_context():
+                db.create_all()
+                db.session.add_all([Keyword(id=k, term=f"keyword {k}") for k in portfolio])
+                db.session.commit()
+                # One fetch round at a time, as the refresh scheduler would ingest them
+                start = time.perf_counter()
+                per_round = args.keywords
+                for i in range(0, len(snapshots), per_round):
+                    ingest_snapshots(snapshots[i:i + per_round])
+                timings[enabled] = time.perf_counter() - start
+        print(f"ingest {len(snapshots)} snapshots: {timings[False]:.2f}s without stats, "
+              f"{timings[True]:.2f}s with stats ({timings[True] / timings[False]:.2f}x)")
+
+        with app.app_context():
+            # Warm up statement compilation so the first window isn't charged for it
+            predictor.predict_from_columns(load_columns([next(iter(portfolio))]))
+            predictor.predict_from_stats(next(iter(portfolio)), args.windows[0])
+            for window in args.windows:
+                since = datetime.utcnow() - timedelta(days=window)
+                start = time.perf_counter()
+                for keyword_id in portfolio:
+                    predictor.predict_from_columns(load_columns([keyword_id], since))
+                refit = (time.perf_counter() - start) / args.keywords * 1000
+
+                start = time.perf_counter()
+                for keyword_id in portfolio:
+                    predictor.predict_from_stats(keyword_id, window)
+                from_stats = (time.perf_counter() - start) / args.keywords * 1000
+                print(f"{window:>4}-day window: load + batched refit {refit:7.2f} ms/keyword, "
+                      f"from sums {from_stats:6.2f} ms/keyword ({refit / from_stats:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
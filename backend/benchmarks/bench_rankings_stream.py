@@ -0,0 +1,88 @@
+"""Time to first byte, total time and peak memory of /rankings: full JSON array vs NDJSON stream vs pages.
+
+Run from the backend directory:
+    python -m benchmarks.bench_rankings_stream --days 365 --fetches-per-day 4
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+
+from flask import Flask
+
+from models.database import db, Keyword
+from routes.api import api_bp
+from services.ingest import ingest_snapshots
+from benchmarks.synthetic import make_rankings
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{path}"
+    db.init_app(app)
+    app.register_blueprint(api_bp, url_prefix='/api')
+    return app
+
+
+def consume(client, url):
+    start = time.perf_counter()
+    response = client.get(url, buffered=False)
+    first = None
+    size = 0
+    for chunk in response.response:
+        if first is None:
+            first = time.perf_counter() - start
+        size += len(chunk)
+    response.close()
+    return first, time.perf_counter() - start, size
+
+
+def timed_get(client, url):
+    """(seconds to first chunk, total seconds, bytes, peak traced MiB) for one streamed GET.
+
+    Timing and memory come from separate requests since tracemalloc slows allocation-heavy code.
+    """
+    first, total, size = consume(client, url)
+    tracemalloc.start()
+    consume(client, url)
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return first, total, size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--urls', type=int, default=30)
+    parser.add_argument('--fetches-per-day', type=int, default=4)
+    parser.add_argument('--page-size', type=int, default=1000)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)  # request/response body logging would dominate
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            db.session.add(Keyword(id=1, term="keyword 1"))
+            db.session.commit()
+            snapshots = {}
+            for row in make_rankings(1, args.urls, args.days, args.fetches_per_day):
+                snapshots.setdefault(row.timestamp, []).append(row)
+            ingest_snapshots([(1, [{"url": r.url} for r in sorted(rows, key=lambda r: r.position)], ts)
+                              for ts, rows in snapshots.items()])
+            n_rows = len(snapshots) * args.urls
+
+        client = app.test_client()
+        window = f"/api/keywords/1/rankings?days={args.days + 1}"
+        print(f"{n_rows} rankings in the window")
+        for label, url in (("json array", window), ("ndjson stream", window + "&format=ndjson"),
+                           (f"first page ({args.page_size})", f"{window}&limit={args.page_size}")):
+            first, total, size, peak = timed_get(client, url)
+            print(f"{label:>20}: first byte {first * 1000:8.1f} ms, total {total * 1000:8.1f} ms, "
+                  f"{size / 2 ** 20:6.1f} MiB, peak {peak:6.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
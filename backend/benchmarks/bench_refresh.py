@@ -0,0 +1,56 @@
+"""Refresh-scheduler throughput against a local stub SERP server.
+
+Run from the backend directory:
+    python -m benchmarks.bench_refresh --keywords 500 --latency 0.05
+"""
+import argparse
+import logging
+import os
+import tempfile
+
+from flask import Flask
+
+from models.database import db, Keyword, Ranking
+from services.serp_service import SerpDataService
+from services.refresh_scheduler import RefreshScheduler
+from benchmarks.stubs import StubSerpServer
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{path}"
+    db.init_app(app)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--keywords', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.05, help="Stub response time in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.05, help="Fraction of 429 responses")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--rate-limit', type=float, default=0, help="Requests/second, 0 = unlimited")
+    args = parser.parse_args()
+    logging.getLogger('services.serp_service').setLevel(logging.ERROR)  # expected 429 retries
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            StubSerpServer(latency=args.latency, error_rate=args.error_rate) as stub:
+        app = make_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            db.session.add_all([Keyword(term=f"keyword {i}") for i in range(args.keywords)])
+            db.session.commit()
+
+            for concurrency in args.concurrency:
+                service = SerpDataService(api_key=f"bench-{concurrency}", base_url=stub.url,
+                                          pool_size=concurrency, rate_limit=args.rate_limit)
+                service.backoff_base = 0.01
+                stats = RefreshScheduler(service, concurrency=concurrency).run()
+                print(f"concurrency {concurrency:>3}: {stats['fetched']}/{stats['keywords']} fetched, "
+                      f"{stats['rows_inserted']} rows in {stats['elapsed_seconds']:.2f}s "
+                      f"({stats['fetched'] / stats['elapsed_seconds']:.0f} keywords/s)")
+            print(f"stub served {stub.requests} requests, {Ranking.query.count()} rankings stored")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Throughput of large /rankings responses under each request-logging setup.
+
+Modes: 'none' (no logging hooks), 'legacy' (the old DEBUG hooks that
+logged headers, the request body and the whole response body on every
+request), and 'sample:<rate>' (services.request_log with that sample rate
+and --max-body bytes of each body). Responses are the whole window as a
+JSON array, as NDJSON, and one --page-size page. Log lines go to
+--log-file (os.devnull by default, i.e. the cost of producing them).
+
+Run from the backend directory:
+    python -m benchmarks.bench_request_logging --days 365 --rounds 3 --modes none legacy sample:1 sample:0.01
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from flask import request
+
+from models.database import db, Keyword
+from services.ingest import ingest_snapshots
+from services.request_log import RequestLogger
+from benchmarks.bench_rankings_stream import consume, make_app
+from benchmarks.synthetic import make_rankings
+
+
+def install_legacy_logging(app, stream):
+    """The hooks app.py used to install, with logging.basicConfig(level=logging.DEBUG)"""
+    logger = logging.getLogger('bench.legacy')
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    logger.addHandler(logging.StreamHandler(stream))
+
+    @app.before_request
+    def log_request_info():
+        logger.debug('Headers: %s', request.headers)
+        logger.debug('Body: %s', request.get_data())
+
+    @app.after_request
+    def log_response(response):
+        if not response.is_streamed and not response.direct_passthrough:
+            logger.debug('Response: %s', response.get_data())
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--urls', type=int, default=30)
+    parser.add_argument('--fetches-per-day', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=5, help="Per mode, response format and round")
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--page-size', type=int, default=5000)
+    parser.add_argument('--max-body', type=int, default=1024)
+    parser.add_argument('--log-file', default=os.devnull, help="Where every mode writes its log lines")
+    parser.add_argument('--modes', nargs='+', default=['none', 'legacy', 'sample:1', 'sample:0.01'])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, open(args.log_file, 'w') as log_file:
+        path = os.path.join(tmp, 'bench.db')
+        app = make_app(path)
+        with app.app_context():
+            db.create_all()
+            db.session.add(Keyword(id=1, term="keyword 1"))
+            db.session.commit()
+            snapshots = {}
+            for row in make_rankings(1, args.urls, args.days, args.fetches_per_day):
+                snapshots.setdefault(row.timestamp, []).append(row)
+            ingest_snapshots([(1, [{"url": r.url} for r in sorted(rows, key=lambda r: r.position)], ts)
+                              for ts, rows in snapshots.items()])
+
+        window = f"/api/keywords/1/rankings?days={args.days + 1}"
+        formats = {"json": window, "ndjson": window + "&format=ndjson", "page": f"{window}&limit={args.page_size}"}
+        clients, loggers = {}, {}
+        for mode in args.modes:
+            # Hooks can't be added to an app that has served requests, so each mode gets its own
+            app = make_app(path)
+            if mode == 'legacy':
+                install_legacy_logging(app, log_file)
+            elif mode.startswith('sample:'):
+                app.config.update(REQUEST_LOG=True, REQUEST_LOG_SAMPLE_RATE=float(mode.split(':')[1]),
+                                  REQUEST_LOG_MAX_BODY=args.max_body)
+                loggers[mode] = RequestLogger()
+                loggers[mode].init_app(app)
+                loggers[mode].stop()
+                loggers[mode].start(target=logging.StreamHandler(log_file))
+            clients[mode] = app.test_client()
+            for url in formats.values():
+                consume(clients[mode], url)  # warm up
+
+        # Modes take turns each round and the best round counts, so drift on the machine hits them all alike
+        best = {}
+        for _ in range(args.rounds):
+            for mode, client in clients.items():
+                for label, url in formats.items():
+                    firsts = []
+                    size = 0
+                    start = time.perf_counter()
+                    for _ in range(args.requests):
+                        first, _, n = consume(client, url)
+                        firsts.append(first)
+                        size += n
+                    elapsed = time.perf_counter() - start
+                    result = (args.requests / elapsed, size / 2 ** 20 / elapsed, sorted(firsts)[len(firsts) // 2])
+                    best[mode, label] = max(result, best.get((mode, label), result))
+
+        # The logging hooks alone, on an already built response (whole-request timings are noisy)
+        hooks = {}
+        for mode, client in clients.items():
+            app = client.application
+            for label, url in formats.items():
+                response = client.get(url, buffered=label != 'ndjson')
+                with app.test_request_context(url):
+                    start = time.perf_counter()
+                    for _ in range(args.requests):
+                        app.preprocess_request()
+                        app.process_response(response)
+                    hooks[mode, label] = (time.perf_counter() - start) / args.requests
+                response.close()
+
+        print(f"{len(snapshots) * args.urls} rankings in the window, best of {args.rounds} rounds "
+              f"of {args.requests} requests")
+        print(f"{'mode':>12} {'format':>7} {'req/s':>7} {'MiB/s':>7} {'first byte ms':>13} {'hooks ms':>8}")
+        for (mode, label), (rate, mib, first) in best.items():
+            print(f"{mode:>12} {label:>7} {rate:7.2f} {mib:7.1f} {first * 1000:13.1f} "
+                  f"{hooks[mode, label] * 1000:8.2f}")
+        for mode, logger in loggers.items():
+            logger.stop()
+            print(f"{mode}: {logger.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Per-keyword /predict history reads: ORM rows vs loading columns vs the in-memory series store.
+
+Times each way of getting one keyword's window and predicting from it, and
+compares the memory they hold (tracemalloc) per ranking.
+
+Run from the backend directory:
+    python -m benchmarks.bench_series_store --keywords 50 --days 90 --storage rows
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from config import Config
+from models.database import db, Keyword, Ranking
+from services.history import load_columns, window_start
+from services.ingest import ingest_snapshots
+from services.predictor import RankingPredictor
+from services.series_store import SeriesStore
+from benchmarks.bench_ranking_stats import make_app, snapshots_of
+from benchmarks.synthetic import make_portfolio
+
+
+def orm_rows(keyword_id, since):
+    return Ranking.query.filter_by(keyword_id=keyword_id).filter(Ranking.timestamp >= since)\
+        .order_by(Ranking.timestamp.desc()).all()
+
+
+def timed(label, keyword_ids, read, predict, rows):
+    start = time.perf_counter()
+    for keyword_id in keyword_ids:
+        predict(read(keyword_id))
+    elapsed = (time.perf_counter() - start) / len(keyword_ids) * 1000
+
+    tracemalloc.start()
+    held = [read(keyword_id) for keyword_id in keyword_ids]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    print(f"{label:>22} {elapsed:8.2f} ms/keyword {size / rows:8.1f} bytes/ranking")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--keywords', type=int, default=50)
+    parser.add_argument('--urls', type=int, default=30)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--fetches-per-day', type=int, default=2)
+    parser.add_argument('--window', type=int, default=30)
+    parser.add_argument('--storage', choices=('rows', 'snapshots'), default='rows')
+    args = parser.parse_args()
+
+    Config.RANKING_STORAGE = 'dual' if args.storage == 'rows' else 'snapshots'
+    portfolio = make_portfolio(args.keywords, args.urls, args.days, args.fetches_per_day)
+    predictor = RankingPredictor()
+    keyword_ids = list(portfolio)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, "bench.db"))
+        with app.app_context():
+            db.create_all()
+            db.session.add_all([Keyword(id=k, term=f"keyword {k}") for k in portfolio])
+            db.session.commit()
+            ingest_snapshots(snapshots_of(portfolio))
+            db.session.expunge_all()
+
+            since = window_start(args.window)
+            store = SeriesStore(256 * 2**20, max(args.days, args.window))
+            rows = len(load_columns(keyword_ids, since))
+            print(f"{args.keywords} keywords, {rows} rankings in the {args.window}-day window, "
+                  f"storage={args.storage}")
+
+            results = {}
+            if args.storage == 'rows':
+                def orm_read(keyword_id):
+                    found = orm_rows(keyword_id, since)
+                    db.session.expunge_all()
+                    return found
+                results['orm'] = timed("ORM rows", keyword_ids, orm_read, predictor.predict_future_rankings, rows)
+            results['columns'] = timed("load columns", keyword_ids, lambda k: load_columns([k], since),
+                                       predictor.predict_from_columns, rows)
+            for keyword_id in keyword_ids:
+                store.columns(keyword_id, since)  # warm
+            results['store'] = timed("series store (hit)", keyword_ids, lambda k: store.columns(k, since),
+                                     predictor.predict_from_columns, rows)
+            stats = store.stats()
+            print(f"store holds {stats['rows']} rankings in {stats['bytes'] / 2**20:.1f} MB "
+                  f"({stats['bytes'] / stats['rows']:.1f} bytes/ranking incl. spare capacity)")
+            print("series store speed-up: " + ", ".join(f"{results[name] / results['store']:.1f}x vs {name}"
+                                                        for name in results if name != 'store'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Row-per-result vs packed-snapshot storage: table size and history-load cost for prediction.
+
+Run from the backend directory:
+    python -m benchmarks.bench_snapshots --keywords 300 --days 90
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+
+from config import Config
+from models.database import db, Keyword, Ranking, SerpSnapshot
+from services.ingest import ingest_snapshots, url_interner
+from services.history import load_columns
+from services.batch_predictor import BatchRankingPredictor
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{path}"
+    db.init_app(app)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--keywords', type=int, default=300)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--urls', type=int, default=30)
+    parser.add_argument('--window', type=int, default=30, help="Days of history loaded per prediction")
+    args = parser.parse_args()
+
+    end = datetime.utcnow()
+    keyword_ids = list(range(1, args.keywords + 1))
+    predictor = BatchRankingPredictor()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ('rows', 'snapshots'):
+            Config.RANKING_STORAGE = mode
+            path = os.path.join(tmp, f"{mode}.db")
+            app = make_app(path)
+            with app.app_context():
+                url_interner.clear()
+                db.create_all()
+                db.session.add_all([Keyword(id=k, term=f"kw{k}") for k in keyword_ids])
+                db.session.commit()
+                for day in range(args.days):
+                    timestamp = end - timedelta(days=args.days - day)
+                    ingest_snapshots([
+                        (k, [{"url": f"https://site{(k + day * (i % 3) + i) % 60}.example.com/{k}"}
+                             for i in range(args.urls)], timestamp)
+                        for k in keyword_ids])
+
+                rows = Ranking.query.count() if mode == 'rows' else SerpSnapshot.query.count()
+                size = os.path.getsize(path) / 2**20
+
+                since = end - timedelta(days=args.window)
+                start = time.perf_counter()
+                loaded = 0
+                for k in keyword_ids:
+                    columns = load_columns([k], since)
+                    predictor.predict_columns(columns)
+                    loaded += len(columns)
+                per_keyword = (time.perf_counter() - start) / len(keyword_ids)
+
+                start = time.perf_counter()
+                bulk = load_columns(keyword_ids, since)
+                bulk_load = time.perf_counter() - start
+
+                print(f"{mode:>9}: {rows:>8} table rows, {size:6.1f} MiB, "
+                      f"load+predict {per_keyword * 1000:6.2f} ms/keyword ({loaded} rankings), "
+                      f"bulk load of {len(bulk)} rankings {bulk_load * 1000:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
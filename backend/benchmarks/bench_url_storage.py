@@ -0,0 +1,102 @@
+"""On-disk size and scan speed: inline URL strings vs the interned Url table.
+
+Run from the backend directory:
+    python -m benchmarks.bench_url_storage --rows 10000000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+from models.database import db
+
+LEGACY_SCHEMA = """
+CREATE TABLE ranking (
+    id INTEGER NOT NULL, keyword_id INTEGER NOT NULL, url VARCHAR(500) NOT NULL,
+    position INTEGER NOT NULL, timestamp DATETIME, PRIMARY KEY (id)
+);
+CREATE INDEX ix_ranking_keyword_timestamp ON ranking (keyword_id, timestamp);
+CREATE INDEX ix_ranking_keyword_url_timestamp ON ranking (keyword_id, url, timestamp);
+"""
+
+SCANS = {
+    "legacy": {
+        "full scan": "SELECT keyword_id, url, position, timestamp FROM ranking",
+        "one keyword, 30d": "SELECT keyword_id, url, position, timestamp FROM ranking "
+                            "WHERE keyword_id = ? AND timestamp >= ?",
+    },
+    "normalized": {
+        "full scan": "SELECT r.keyword_id, u.url, r.position, r.timestamp "
+                     "FROM ranking r JOIN url u ON u.id = r.url_id",
+        "full scan, ids only": "SELECT keyword_id, url_id, position, timestamp FROM ranking",
+        "one keyword, 30d": "SELECT r.keyword_id, u.url, r.position, r.timestamp "
+                            "FROM ranking r JOIN url u ON u.id = r.url_id "
+                            "WHERE r.keyword_id = ? AND r.timestamp >= ?",
+    },
+}
+
+
+def url_for(keyword_id, slot):
+    return (f"https://www.competitor-{(keyword_id * 31 + slot) % 5000}.example.com/"
+            f"blog/guides/keyword-{keyword_id}-complete-guide-{slot}")
+
+
+def seed(path, layout, rows, urls):
+    days = max(1, rows // (urls * 1000))
+    keywords = max(1, rows // (urls * days))
+    end = datetime.utcnow()
+    conn = sqlite3.connect(path)
+    if layout == "legacy":
+        conn.executescript(LEGACY_SCHEMA)
+    else:
+        conn.close()
+        db.metadata.create_all(create_engine(f"sqlite:///{path}"))
+        conn = sqlite3.connect(path)
+        conn.executemany("INSERT INTO url (id, url) VALUES (?, ?)",
+                         ((k * urls + s, url_for(k, s)) for k in range(keywords) for s in range(urls)))
+
+    for day in range(days):
+        stamp = (end - timedelta(days=days - day)).strftime("%Y-%m-%d %H:%M:%S.%f")
+        if layout == "legacy":
+            conn.executemany("INSERT INTO ranking (keyword_id, url, position, timestamp) VALUES (?, ?, ?, ?)",
+                             ((k, url_for(k, s), s + 1, stamp) for k in range(keywords) for s in range(urls)))
+        else:
+            conn.executemany("INSERT INTO ranking (keyword_id, url_id, position, timestamp) VALUES (?, ?, ?, ?)",
+                             ((k, k * urls + s, s + 1, stamp) for k in range(keywords) for s in range(urls)))
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    return keywords, days
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--urls', type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for layout, scans in SCANS.items():
+            path = os.path.join(tmp, f"{layout}.db")
+            start = time.perf_counter()
+            keywords, days = seed(path, layout, args.rows, args.urls)
+            size = os.path.getsize(path) / 2**20
+            print(f"{layout}: {keywords * days * args.urls} rows ({keywords} keywords x {days} days), "
+                  f"{size:.0f} MiB on disk, seeded in {time.perf_counter() - start:.0f}s")
+
+            conn = sqlite3.connect(path)
+            since = (datetime.utcnow() - timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S.%f")
+            for name, sql in scans.items():
+                params = (keywords // 2, since) if '?' in sql else ()
+                start = time.perf_counter()
+                count = sum(1 for _ in conn.execute(sql, params))
+                print(f"  {name:<20} {count:>10} rows in {time.perf_counter() - start:7.3f}s")
+            conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""Local stub servers standing in for upstream APIs in benchmarks and manual testing"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import json
+import multiprocessing
+import random
+import re
+import threading
+import time
+
+from benchmarks.synthetic import make_html
+from services.prompt_builder import ANALYSIS_KEYS
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class StubServer:
+    """Run a handler class on an ephemeral localhost port in a background thread"""
+    handler_class = None
+
+    def __init__(self, latency=0.0, bind='127.0.0.1', **options):
+        """bind='0.0.0.0' also answers on 127.0.0.2, 127.0.0.3, ..., which clients see as separate hosts"""
+        self.latency = latency
+        self.options = options
+        self.requests = 0
+        self.lock = threading.Lock()
+        handler = type('Handler', (self.handler_class,), {'stub': self})
+        # The listen backlog is fixed when the server binds, so it has to be a class attribute
+        self.httpd = StubHTTPServer((bind, 0), handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f"http://{'127.0.0.1' if host == '0.0.0.0' else host}:{port}"
+
+    def count(self):
+        with self.lock:
+            self.requests += 1
+            return self.requests
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _serve(server_class, latency, options, urls, stop):
+    with server_class(latency, **options) as server:
+        urls.put(server.url)
+        stop.wait()
+
+
+class StubProcess:
+    """Run a StubServer subclass in a child process, so its per-connection threads don't
+    count against the process being measured (e.g. thread counts in load tests)"""
+
+    def __init__(self, server_class, latency=0.0, **options):
+        context = multiprocessing.get_context('spawn')
+        self.stop = context.Event()
+        self.urls = context.Queue()
+        self.process = context.Process(target=_serve, args=(server_class, latency, options, self.urls, self.stop),
+                                       daemon=True)
+        self.url = None
+
+    def __enter__(self):
+        self.process.start()
+        self.url = self.urls.get(timeout=60)
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.process.join(10)
+
+
+class QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, content_type='application/json', headers=None):
+        data = body if isinstance(body, bytes) else body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class SerpHandler(QuietHandler):
+    def do_GET(self):
+        stub = self.stub
+        stub.count()
+        time.sleep(stub.latency)
+        if random.random() < stub.options.get('error_rate', 0.0):
+            self.send_body(429, '{"error": "rate limited"}', headers={'Retry-After': '0'})
+            return
+
+        query = parse_qs(urlparse(self.path).query).get('q', [''])[0]
+        results = stub.options.get('results', 30)
+        slug = query.replace(' ', '-')
+        organic = [{"position": i, "link": f"https://site{(i * 7 + len(query)) % 50}.example.com/{slug}",
+                    "title": f"{query} result {i}", "snippet": "..."}
+                   for i in range(1, results + 1)]
+        random.shuffle(organic)
+        self.send_body(200, json.dumps({"organic_results": organic}))
+
+
+class StubSerpServer(StubServer):
+    """SerpAPI-shaped JSON with configurable latency and 429 rate (error_rate)"""
+    handler_class = SerpHandler
+
+
+class PageHandler(QuietHandler):
+    def do_GET(self):
+        stub = self.stub
+        stub.count()
+        path = urlparse(self.path).path
+        # /slow/... pages take slow_latency instead, to exercise deadlines
+        time.sleep(stub.options.get('slow_latency', 5.0) if path.startswith('/slow/') else stub.latency)
+        # Pages never change, so the path doubles as a strong validator
+        etag = f'"{path}"'
+        if stub.options.get('etags', True) and self.headers.get('If-None-Match') == etag:
+            self.send_body(304, b'', content_type='text/html; charset=utf-8', headers={'ETag': etag})
+            return
+        headers = {'ETag': etag} if stub.options.get('etags', True) else {}
+        self.send_body(200, make_html(stub.options.get('paragraphs', 50), seed=len(path), title=path),
+                       content_type='text/html; charset=utf-8', headers=headers)
+
+
+class StubPageServer(StubServer):
+    """Generated HTML pages with ETags and configurable latency; /slow/* paths take slow_latency"""
+    handler_class = PageHandler
+
+
+class AnthropicHandler(QuietHandler):
+    def do_POST(self):
+        stub = self.stub
+        stub.count()
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        request = json.loads(body)
+        content = request["messages"][-1]["content"]
+        options = stub.options
+        if random.random() < options.get('error_rate', 0.0):
+            time.sleep(stub.latency)
+            self.send_body(529, json.dumps({"type": "error",
+                                            "error": {"type": "overloaded_error", "message": "Overloaded"}}))
+            return
+
+        # A batch prompt (build_batch_prompt) gets {keyword id: analysis}; missing_rate leaves some out
+        padding = "x" * (4 * options.get('output_tokens_per_keyword', 50) // len(ANALYSIS_KEYS))
+        analysis = {key: f"stub {key} {padding}" for key in ANALYSIS_KEYS}
+        keyword_ids = re.findall(r'^### Keyword (\d+):', content, re.M)
+        if keyword_ids:
+            text = json.dumps({key: analysis for key in keyword_ids
+                               if random.random() >= options.get('missing_rate', 0.0)})
+        else:
+            text = json.dumps(analysis)
+        input_tokens = len(body) // 4
+        output_tokens = len(text) // 4 + 1
+        if output_tokens > request.get("max_tokens", 4096):  # cut off like a reply that hit max_tokens
+            output_tokens = request.get("max_tokens", 4096)
+            text = text[:output_tokens * 4]
+
+        # Stand-in for model time: base latency plus per-token costs for reading the prompt and writing the reply
+        time.sleep(stub.latency + options.get('seconds_per_1k_input', 0.0) * input_tokens / 1000
+                   + options.get('seconds_per_1k_output', 0.0) * output_tokens / 1000)
+        self.send_body(200, json.dumps({
+            "id": f"msg_stub_{stub.requests}", "type": "message", "role": "assistant",
+            "model": request.get("model"), "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn", "stop_sequence": None,
+            "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens}
+        }))
+
+
+class StubAnthropicServer(StubServer):
+    """Messages API (POST /v1/messages) returning canned JSON analyses, one per "### Keyword <id>"
+    heading for batch prompts. Latency grows with prompt and reply size (seconds_per_1k_input /
+    seconds_per_1k_output); error_rate answers 529 overloaded, missing_rate drops batch entries."""
+    handler_class = AnthropicHandler
@@ -0,0 +1,52 @@
+"""Synthetic ranking data and HTML pages shared by the benchmark scripts"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+import numpy as np
+
+RankingRow = namedtuple('RankingRow', ['keyword_id', 'url', 'position', 'timestamp'])
+
+
+def make_rankings(keyword_id=1, urls=30, days=30, fetches_per_day=1, seed=0, end=None):
+    """One keyword's history: `urls` results per fetch, newest first like the API queries"""
+    rng = np.random.default_rng(seed + keyword_id)
+    end = end or datetime.utcnow().replace(microsecond=0)
+    base = rng.permutation(urls) + 1
+    drift = rng.normal(0, 0.15, size=urls)
+    rows = []
+    n_fetches = days * fetches_per_day
+    for step in range(n_fetches):
+        timestamp = end - timedelta(days=days) + timedelta(hours=24 * step / fetches_per_day)
+        noisy = base + drift * step + rng.normal(0, 1.5, size=urls)
+        for position, idx in enumerate(np.argsort(noisy), 1):
+            rows.append(RankingRow(keyword_id, f"https://site{keyword_id}-{idx}.example.com/page",
+                                   position, timestamp))
+    rows.reverse()
+    return rows
+
+
+def make_portfolio(keywords=100, urls=30, days=30, fetches_per_day=1, seed=0):
+    """{keyword_id: rankings} for a synthetic portfolio"""
+    end = datetime.utcnow().replace(microsecond=0)
+    return {kid: make_rankings(kid, urls, days, fetches_per_day, seed, end)
+            for kid in range(1, keywords + 1)}
+
+
+WORDS = ("search ranking content page keyword traffic organic result query index crawl link "
+         "authority snippet title heading intent audience update signal").split()
+
+
+def make_html(paragraphs=50, seed=0, title="Synthetic page"):
+    """A page with the boilerplate ContentService strips (nav, scripts, footer) around `paragraphs` of text"""
+    rng = np.random.default_rng(seed)
+    body = []
+    for i in range(paragraphs):
+        if i % 10 == 0:
+            body.append(f"<h{1 if i == 0 else 2}>Section {i // 10} {rng.choice(WORDS)}</h{1 if i == 0 else 2}>")
+        body.append("<p>" + " ".join(rng.choice(WORDS, size=int(rng.integers(40, 120)))) + "</p>")
+    return (f"<!DOCTYPE html><html><head><title>{title}</title>"
+            f'<meta name="description" content="{title} description">'
+            "<style>body { font-family: sans-serif; }</style>"
+            "<script>var tracking = {enabled: true};</script></head><body>"
+            "<header><nav><a href='/'>Home</a> <a href='/blog'>Blog</a></nav></header>"
+            "<main>" + "\n".join(body) + "</main>"
+            "<footer>Copyright synthetic</footer></body></html>")
@@ -9,4 +9,110 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-key')
     SERPAPI_KEY = os.getenv('SERPAPI_KEY')
-    CLAUDE_API_KEY = os.getenv('CLAUDE_API_KEY') 
\ No newline at end of file
+    CLAUDE_API_KEY = os.getenv('CLAUDE_API_KEY')
+
+    # SERP fetching
+    SERPAPI_URL = os.getenv('SERPAPI_URL', 'https://serpapi.com/search')
+    SERP_TIMEOUT = float(os.getenv('SERP_TIMEOUT', '30'))
+    SERP_MAX_RETRIES = int(os.getenv('SERP_MAX_RETRIES', '3'))
+    SERP_CONCURRENCY = int(os.getenv('SERP_CONCURRENCY', '8'))
+    SERP_RATE_LIMIT = float(os.getenv('SERP_RATE_LIMIT', '5'))  # requests/second per API key, 0 = unlimited
+    SERP_RATE_BURST = int(os.getenv('SERP_RATE_BURST', '10'))
+
+    # Ranking storage: 'rows' (one Ranking row per result), 'snapshots' (one packed
+    # SerpSnapshot row per fetch) or 'dual' (write both, read rows)
+    RANKING_STORAGE = os.getenv('RANKING_STORAGE', 'rows')
+
+    # Paged /rankings responses (?limit / ?cursor)
+    RANKINGS_PAGE_SIZE = int(os.getenv('RANKINGS_PAGE_SIZE', '1000'))
+    RANKINGS_PAGE_MAX = int(os.getenv('RANKINGS_PAGE_MAX', '10000'))
+
+    # Trend fits collapse each URL's history to one point per UTC day first: 'last' or 'median'
+    # of the day's positions, or 'none' to regress on the raw sample index
+    PREDICTION_RESAMPLE = os.getenv('PREDICTION_RESAMPLE', 'last')
+    # Default trend model for predictions: 'linear', 'holt', 'theil_sen' or 'huber' (see
+    # services/trend_models.py); /predict and /predictions take ?model= per request
+    PREDICTION_MODEL = os.getenv('PREDICTION_MODEL', 'linear')
+
+    # Persisted per-URL regression sums (RankingStat), updated on ingest and used by /predict
+    # for the 'linear' model when PREDICTION_RESAMPLE is 'last'; run
+    # `python migrate_db.py --rebuild-stats` once before enabling on an existing database
+    RANKING_STATS = os.getenv('RANKING_STATS', 'False') == 'True'
+
+    # Prediction response cache
+    PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', '1024'))
+    PREDICTION_CACHE_TTL = float(os.getenv('PREDICTION_CACHE_TTL', '300'))
+
+    # In-memory history of hot keywords for /predict (0 MB disables it); windows
+    # longer than SERIES_STORE_DAYS are read from the database
+    SERIES_STORE_MAX_MB = float(os.getenv('SERIES_STORE_MAX_MB', '256'))
+    SERIES_STORE_DAYS = int(os.getenv('SERIES_STORE_DAYS', '90'))
+
+    # Ranking analysis prompts: estimated-token budget and how many of the biggest movers to include
+    CLAUDE_PROMPT_TOKEN_BUDGET = int(os.getenv('CLAUDE_PROMPT_TOKEN_BUDGET', '4000'))
+    CLAUDE_PROMPT_MAX_URLS = int(os.getenv('CLAUDE_PROMPT_MAX_URLS', '20'))
+
+    # Batched portfolio analyses (POST /api/keywords/analyze): keywords per request, requests in
+    # flight, estimated input tokens per request, and output tokens allowed per keyword / request
+    CLAUDE_BATCH_KEYWORDS = int(os.getenv('CLAUDE_BATCH_KEYWORDS', '8'))
+    CLAUDE_BATCH_CONCURRENCY = int(os.getenv('CLAUDE_BATCH_CONCURRENCY', '4'))
+    CLAUDE_BATCH_TOKEN_BUDGET = int(os.getenv('CLAUDE_BATCH_TOKEN_BUDGET', '24000'))
+    CLAUDE_BATCH_TOKENS_PER_KEYWORD = int(os.getenv('CLAUDE_BATCH_TOKENS_PER_KEYWORD', '1000'))
+    CLAUDE_BATCH_MAX_TOKENS = int(os.getenv('CLAUDE_BATCH_MAX_TOKENS', '8192'))
+
+    # Claude analysis cache (SQLite file; empty path disables it)
+    CLAUDE_CACHE_PATH = os.getenv('CLAUDE_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                     'instance', 'claude_cache.db'))
+    CLAUDE_CACHE_TTL = float(os.getenv('CLAUDE_CACHE_TTL', '86400'))
+    CLAUDE_CACHE_MAX_ENTRIES = int(os.getenv('CLAUDE_CACHE_MAX_ENTRIES', '5000'))
+
+    # Page fetching for content analysis
+    CONTENT_FETCH_TIMEOUT = float(os.getenv('CONTENT_FETCH_TIMEOUT', '10'))
+    CONTENT_FETCH_WORKERS = int(os.getenv('CONTENT_FETCH_WORKERS', '8'))
+    CONTENT_FETCH_PER_HOST = int(os.getenv('CONTENT_FETCH_PER_HOST', '2'))
+    CONTENT_FETCH_DEADLINE = float(os.getenv('CONTENT_FETCH_DEADLINE', '15'))  # whole batch, 0 = none
+    CONTENT_EXTRACTOR = os.getenv('CONTENT_EXTRACTOR', 'streaming')  # 'soup', 'streaming' or 'streaming_full'
+
+    # Extracted page cache (SQLite file; empty path disables it)
+    PAGE_CACHE_PATH = os.getenv('PAGE_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                 'instance', 'page_cache.db'))
+    PAGE_CACHE_MAX_AGE = float(os.getenv('PAGE_CACHE_MAX_AGE', '3600'))  # serve without revalidating
+    PAGE_CACHE_TTL = float(os.getenv('PAGE_CACHE_TTL', str(7 * 86400)))  # drop entries entirely
+    PAGE_CACHE_MAX_ENTRIES = int(os.getenv('PAGE_CACHE_MAX_ENTRIES', '2000'))
+
+    # Columnar exports written by POST /api/exports. A job's files are deleted when the job is
+    # evicted (JOB_RETENTION); directories older than EXPORT_TTL seconds are swept on each export
+    EXPORT_DIR = os.getenv('EXPORT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'exports'))
+    EXPORT_PART_ROWS = int(os.getenv('EXPORT_PART_ROWS', '1000000'))
+    EXPORT_TTL = float(os.getenv('EXPORT_TTL', str(86400)))  # 0 = never sweep
+
+    # Bulk prediction. PREDICTION_WORKERS > 1 shards /predictions chunks of at
+    # least PREDICTION_POOL_MIN_ROWS rankings across that many processes.
+    PREDICTION_WORKERS = int(os.getenv('PREDICTION_WORKERS', '0'))
+    PREDICTION_POOL_MIN_ROWS = int(os.getenv('PREDICTION_POOL_MIN_ROWS', '100000'))
+    PREDICTION_POOL_SHARDS_PER_WORKER = int(os.getenv('PREDICTION_POOL_SHARDS_PER_WORKER', '2'))
+    PREDICTION_POOL_START_METHOD = os.getenv('PREDICTION_POOL_START_METHOD', 'spawn')
+    BULK_PREDICTION_CHUNK_SIZE = int(os.getenv('BULK_PREDICTION_CHUNK_SIZE', '200'))
+
+    # Background jobs
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+    JOB_RETENTION = int(os.getenv('JOB_RETENTION', '1000'))
+    # ?async=1 jobs that mostly wait on upstreams (/predict, /content-analysis, /fetch) run as
+    # coroutines on one event loop thread instead of holding a job worker for the whole round trip
+    ASYNC_JOBS = os.getenv('ASYNC_JOBS', 'True') == 'True'
+    ASYNC_JOB_CONCURRENCY = int(os.getenv('ASYNC_JOB_CONCURRENCY', '256'))  # running at once; the rest queue
+    ASYNC_BLOCKING_WORKERS = int(os.getenv('ASYNC_BLOCKING_WORKERS', '8'))  # threads for their DB/parsing steps
+    ASYNC_MAX_CONNECTIONS = int(os.getenv('ASYNC_MAX_CONNECTIONS', '256'))  # per async HTTP client
+    ASYNC_HOST_CLIENTS = int(os.getenv('ASYNC_HOST_CLIENTS', '256'))  # page hosts with an open client (LRU)
+
+    # Latency histograms (requests, jobs, SQL/SERP/page/predictor/Claude stages) served at /metrics
+    METRICS = os.getenv('METRICS', 'True') == 'True'
+
+    # Logging. Request logging writes one JSON line per sampled request from a background
+    # thread (to REQUEST_LOG_PATH, or stderr); bodies are only included up to REQUEST_LOG_MAX_BODY
+    # bytes each and only when already in memory, so streamed responses stay streamed
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG' if DEBUG else 'INFO')
+    REQUEST_LOG = os.getenv('REQUEST_LOG', 'False') == 'True'
+    REQUEST_LOG_SAMPLE_RATE = float(os.getenv('REQUEST_LOG_SAMPLE_RATE', '1.0'))  # 5xx responses are always logged
+    REQUEST_LOG_MAX_BODY = int(os.getenv('REQUEST_LOG_MAX_BODY', '0'))  # 0 = no bodies
+    REQUEST_LOG_PATH = os.getenv('REQUEST_LOG_PATH', '')
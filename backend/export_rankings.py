@@ -0,0 +1,24 @@
+import argparse
+from datetime import datetime
+from app import app
+from services.export import FORMATS, export_rankings
+
+# Export ranking history as columnar files for offline analysis, e.g.
+#   python export_rankings.py exports/2024 --since 2024-01-01 --period-days 30
+parser = argparse.ArgumentParser(description="Export ranking history as columnar files (npy/npz/parquet)")
+parser.add_argument('path', help="Output directory")
+parser.add_argument('keyword_ids', nargs='*', type=int, help="Keyword ids to export (default: all)")
+parser.add_argument('--format', choices=FORMATS, default='npy',
+                    help="npy parts can be memory-mapped; parquet needs pyarrow")
+parser.add_argument('--since', type=datetime.fromisoformat, help="Start of the window (ISO date)")
+parser.add_argument('--until', type=datetime.fromisoformat, help="End of the window, exclusive (ISO date)")
+parser.add_argument('--keywords-per-part', type=int, default=500)
+parser.add_argument('--period-days', type=int, default=None, help="Also split parts into windows of this many days")
+args = parser.parse_args()
+
+with app.app_context():
+    manifest = export_rankings(args.path, args.keyword_ids or None, args.since, args.until, args.format,
+                               args.keywords_per_part, args.period_days,
+                               progress=lambda fraction, message: print(f"  {message}"))
+    print(f"Exported {manifest['rows']} rankings for {manifest['keywords']} keywords "
+          f"in {len(manifest['parts'])} {args.format} parts to {args.path}")
@@ -0,0 +1,28 @@
+import argparse
+from app import app
+from models.migrations import upgrade
+from services.snapshot_store import backfill_from_rows
+from services.ranking_stats import rebuild_stats
+
+# Upgrade an existing database (e.g. instance/rankings.db) to the current schema
+parser = argparse.ArgumentParser(description="Upgrade the rankings database schema")
+parser.add_argument('--backfill-snapshots', action='store_true',
+                    help="Pack existing Ranking rows into SerpSnapshot rows (for RANKING_STORAGE=snapshots)")
+parser.add_argument('--rebuild-stats', action='store_true',
+                    help="Recompute the per-URL regression sums (for RANKING_STATS=True)")
+args = parser.parse_args()
+
+with app.app_context():
+    print(f"Migrating {app.config['SQLALCHEMY_DATABASE_URI']}...")
+    applied = upgrade()
+    if applied:
+        for name, result in applied.items():
+            print(f"  {name}: {result}")
+    else:
+        print("Database already up to date.")
+
+    if args.backfill_snapshots:
+        print(f"Backfilled {backfill_from_rows()} snapshots from ranking rows.")
+
+    if args.rebuild_stats:
+        print(f"Rebuilt {rebuild_stats()} regression checkpoints.")
@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import select
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -10,12 +11,26 @@ class Keyword(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     rankings = db.relationship('Ranking', backref='keyword', lazy=True)
 
+class Url(db.Model):
+    # Interned URL strings; the same competitor URLs repeat in every snapshot
+    id = db.Column(db.Integer, primary_key=True)
+    url = db.Column(db.String(500), nullable=False, unique=True)
+
 class Ranking(db.Model):
+    # Every hot query filters on keyword_id and then ranges or sorts on timestamp
+    __table_args__ = (
+        db.Index('ix_ranking_keyword_timestamp', 'keyword_id', 'timestamp'),
+        db.Index('ix_ranking_keyword_url_timestamp', 'keyword_id', 'url_id', 'timestamp'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     keyword_id = db.Column(db.Integer, db.ForeignKey('keyword.id'), nullable=False)
-    url = db.Column(db.String(500), nullable=False)
+    url_id = db.Column(db.Integer, db.ForeignKey('url.id'), nullable=False)
     position = db.Column(db.Integer, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Read-only URL string; hot Core queries join Url explicitly instead
+    url = db.column_property(select(Url.url).where(Url.id == url_id).scalar_subquery())
     
     def to_dict(self):
         return {
@@ -24,4 +39,44 @@ class Ranking(db.Model):
             'url': self.url,
             'position': self.position,
             'timestamp': self.timestamp.isoformat()
-        } 
\ No newline at end of file
+        } 
+
+class SerpSnapshot(db.Model):
+    # Compact storage mode: one row per SERP fetch, results packed as (url_id, position) pairs
+    __table_args__ = (
+        db.Index('ix_serp_snapshot_keyword_timestamp', 'keyword_id', 'timestamp'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    keyword_id = db.Column(db.Integer, db.ForeignKey('keyword.id'), nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    result_count = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)
+
+class RankingStat(db.Model):
+    # Running regression sums per (keyword, url) over its closed days: x is the day
+    # (days since 1970-01-01) and y that day's last position. The latest point stands for the
+    # open day. Updated on ingest so trend fits never rescan the rankings.
+    keyword_id = db.Column(db.Integer, db.ForeignKey('keyword.id'), primary_key=True)
+    url_id = db.Column(db.Integer, db.ForeignKey('url.id'), primary_key=True)
+    n = db.Column(db.BigInteger, nullable=False)
+    sum_x = db.Column(db.BigInteger, nullable=False)
+    sum_y = db.Column(db.BigInteger, nullable=False)
+    sum_xy = db.Column(db.BigInteger, nullable=False)
+    sum_xx = db.Column(db.BigInteger, nullable=False)
+    sum_yy = db.Column(db.BigInteger, nullable=False)
+    last_position = db.Column(db.Integer, nullable=False)
+    last_timestamp = db.Column(db.DateTime, nullable=False)
+
+class RankingStatCheckpoint(db.Model):
+    # RankingStat's sums as of the end of `day`, written once the day is closed; the sums over
+    # any whole-day window are the current RankingStat minus the last checkpoint before it
+    keyword_id = db.Column(db.Integer, db.ForeignKey('keyword.id'), primary_key=True)
+    url_id = db.Column(db.Integer, db.ForeignKey('url.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    n = db.Column(db.BigInteger, nullable=False)
+    sum_x = db.Column(db.BigInteger, nullable=False)
+    sum_y = db.Column(db.BigInteger, nullable=False)
+    sum_xy = db.Column(db.BigInteger, nullable=False)
+    sum_xx = db.Column(db.BigInteger, nullable=False)
+    sum_yy = db.Column(db.BigInteger, nullable=False)
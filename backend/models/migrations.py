@@ -0,0 +1,67 @@
+from sqlalchemy import inspect, text
+import logging
+
+from models.database import db, Ranking, Url
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_ranking_urls(connection):
+    """Move Ranking.url strings into the Url table and rebuild ranking with url_id"""
+    columns = {column['name'] for column in inspect(connection).get_columns(Ranking.__tablename__)}
+    if 'url' not in columns or 'url_id' in columns:
+        return None
+
+    count = connection.execute(text("SELECT COUNT(*) FROM ranking")).scalar()
+    Url.__table__.create(connection, checkfirst=True)
+    connection.execute(text("INSERT INTO url (url) SELECT DISTINCT url FROM ranking "
+                            "WHERE url NOT IN (SELECT url FROM url)"))
+
+    # Indexes stay attached to the renamed table, so drop them to free their names
+    for index in inspect(connection).get_indexes(Ranking.__tablename__):
+        connection.execute(text(f'DROP INDEX "{index["name"]}"'))
+    connection.execute(text("ALTER TABLE ranking RENAME TO ranking_legacy"))
+    Ranking.__table__.create(connection)
+    connection.execute(text(
+        "INSERT INTO ranking (id, keyword_id, url_id, position, timestamp) "
+        "SELECT r.id, r.keyword_id, u.id, r.position, r.timestamp "
+        "FROM ranking_legacy r JOIN url u ON u.url = r.url"))
+    connection.execute(text("DROP TABLE ranking_legacy"))
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text("ANALYZE"))
+    return f"{count} rankings moved to url_id"
+
+
+def add_ranking_indexes(connection):
+    """Create the composite Ranking indexes on databases created before they existed"""
+    existing = {index['name'] for index in inspect(connection).get_indexes(Ranking.__tablename__)}
+    created = []
+    for index in Ranking.__table__.indexes:
+        if index.name not in existing:
+            index.create(connection)
+            created.append(index.name)
+    if created and connection.dialect.name == 'sqlite':
+        # Refresh planner statistics so SQLite actually picks the new indexes
+        connection.execute(text("ANALYZE"))
+    return created
+
+
+# Idempotent schema upgrades, applied in order
+MIGRATIONS = [
+    normalize_ranking_urls,
+    add_ranking_indexes,
+]
+
+
+def upgrade(engine=None):
+    """Bring an existing database up to the current schema; safe to run repeatedly"""
+    engine = engine or db.engine
+    db.metadata.create_all(engine)
+    applied = {}
+    with engine.begin() as connection:
+        for migration in MIGRATIONS:
+            result = migration(connection)
+            if result:
+                logger.info(f"Migration {migration.__name__}: {result}")
+                applied[migration.__name__] = result
+    return applied
@@ -0,0 +1,16 @@
+import argparse
+from app import app
+from services.refresh_scheduler import RefreshScheduler
+
+# Refresh rankings for every keyword (or the given ids), e.g. from cron
+parser = argparse.ArgumentParser(description="Fetch fresh SERP rankings for tracked keywords")
+parser.add_argument('keyword_ids', nargs='*', type=int, help="Keyword ids to refresh (default: all)")
+parser.add_argument('--concurrency', type=int, default=None, help="Parallel SERP requests")
+args = parser.parse_args()
+
+with app.app_context():
+    scheduler = RefreshScheduler(concurrency=args.concurrency)
+    stats = scheduler.run(args.keyword_ids or None)
+    print(f"Refreshed {stats['fetched']}/{stats['keywords']} keywords, "
+          f"{stats['rows_inserted']} rankings stored, {stats['failed']} failed "
+          f"in {stats['elapsed_seconds']}s")
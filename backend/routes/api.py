@@ -1,15 +1,316 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context, send_from_directory
 from models.database import db, Keyword, Ranking
 from services.serp_service import SerpDataService
 from services.claude_service import ClaudeService
 from services.predictor import RankingPredictor
+from services.portfolio_service import PortfolioPredictionService
+from services.refresh_scheduler import RefreshScheduler
+from services.analysis_scheduler import AnalysisScheduler
+from services.job_queue import job_queue
+from services.async_runner import async_runner
+from services.ingest import ingest_snapshot, ingest_snapshots, on_ingest
+from services.history import reads_snapshots, load_rankings, with_url_strings, latest_urls, \
+    latest_timestamp, iter_ranking_records, window_start
+from services.prediction_cache import prediction_cache
+from services.series_store import series_store
+from services.export import FORMATS, export_rankings, remove_export, require_pyarrow, sweep_exports
+from services.ranking_stats import serves_predictions
+from services.trend_models import MODELS
+from config import Config
+from collections import namedtuple
 from datetime import datetime, timedelta
 import numpy as np
+import base64
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
 
 api_bp = Blueprint('api', __name__)
 serp_service = SerpDataService()
 claude_service = ClaudeService()
 predictor = RankingPredictor()
+portfolio_service = PortfolioPredictionService()
+refresh_scheduler = RefreshScheduler(serp_service=serp_service)
+analysis_scheduler = AnalysisScheduler(claude_service)
+on_ingest(prediction_cache.invalidate_keywords)
+
+# A /predict result still waiting for Claude: where to cache it, and the rows to analyze
+PendingPrediction = namedtuple('PendingPrediction', ['cache_key', 'rankings'])
+
+def json_object():
+    """The request's JSON body as a dict ({} when there is none), or None when it is another JSON value"""
+    data = request.get_json(silent=True)
+    if data is None:
+        return {}
+    return data if isinstance(data, dict) else None
+
+def wants_async():
+    """True when the client asked for a background job (?async=1) instead of a blocking call"""
+    value = request.args.get('async')
+    if value is None:
+        value = (json_object() or {}).get('async', '')
+    return str(value).lower() in ('1', 'true', 'yes')
+
+def job_accepted(job):
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}"
+    }), 202
+
+def store_serp_rankings(keyword_id, term):
+    """Fetch the current SERP for a keyword and save it; returns the number of rankings saved, or None"""
+    serp_data = serp_service.fetch_rankings(term)
+    if not serp_data:
+        return None
+
+    return ingest_snapshot(keyword_id, serp_data.get('organic_results', []))
+
+def encode_cursor(key):
+    timestamp, row_id = key
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{row_id}".encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """(timestamp, id) from an opaque cursor; raises ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def prepare_predictions(keyword, days, job=None, model=None):
+    """(result, pending) for /predict. `result` is final when `pending` is None (a cache hit or no
+    history); otherwise Claude's analysis of `pending.rankings` (None when Claude is unavailable)
+    still has to be added with finish_predictions."""
+    model = model or Config.PREDICTION_MODEL
+    cache_key = (keyword.id, days, latest_timestamp(keyword.id), model)
+    cached = prediction_cache.get(cache_key)
+    if cached is not None:
+        return cached, None
+
+    since = window_start(days)
+    columns = None
+
+    if serves_predictions(model):
+        # Fits come from the persisted regression sums; rows are only loaded for Claude
+        has_history = cache_key[2] is not None and cache_key[2] >= since
+    else:
+        # Arrays from the in-memory series store (loaded on a miss); rows are only built for Claude
+        columns = series_store.columns(keyword.id, since, latest=cache_key[2])
+        has_history = len(columns) > 0
+
+    if not has_history:
+        # Instead of returning an error, return an empty prediction set
+        return {
+            "keyword": {"id": keyword.id, "term": keyword.term},
+            "predictions": {},
+            "days_analyzed": days,
+            "claude_analysis": None,
+            "message": "No historical ranking data available for predictions. Try fetching rankings first."
+        }, None
+
+    # Generate predictions using the predictor service
+    if serves_predictions(model):
+        predictions_data = with_url_strings(predictor.predict_from_stats(keyword.id, days))
+    else:
+        predictions_data = with_url_strings(predictor.predict_from_columns(columns, model=model).get(keyword.id, {}))
+    if job:
+        job.update(0.5, "Predictions generated")
+
+    rankings = load_rankings([keyword.id], since) if claude_service.is_available() else None
+    result = {
+        "keyword": {"id": keyword.id, "term": keyword.term},
+        "predictions": predictions_data,
+        "days_analyzed": days,
+        "model": model,
+        "claude_analysis": None
+    }
+    return result, PendingPrediction(cache_key, rankings)
+
+def finish_predictions(result, pending, analysis):
+    result["claude_analysis"] = analysis
+    # Don't pin a failed Claude call in the cache for the whole TTL
+    if not (isinstance(analysis, dict) and "error" in analysis):
+        prediction_cache.set(pending.cache_key, result)
+    return result
+
+def build_predictions(keyword, days, job=None, model=None):
+    """Predictions plus Claude analysis for one keyword, as returned by /predict"""
+    result, pending = prepare_predictions(keyword, days, job, model)
+    if pending is None:
+        return result
+
+    # Generate analysis using Claude
+    analysis = None
+    if pending.rankings is not None:
+        try:
+            analysis = claude_service.analyze_rankings(keyword.term, pending.rankings, result["predictions"])
+        except Exception:
+            logger.exception(f"Claude analysis failed for keyword {keyword.term!r}")
+    return finish_predictions(result, pending, analysis)
+
+def pick_competitors(keyword, target_url, competitor_urls):
+    # If no competitor URLs provided, get top ranking URLs
+    if not competitor_urls:
+        # Get URLs of the latest rankings, excluding target URL
+        competitor_urls = [url for url in latest_urls(keyword.id, limit=10) if url != target_url][:5]
+    return competitor_urls
+
+def content_analysis_payload(keyword, target_url, competitor_urls, analysis):
+    """(payload, HTTP status) for a content-gap analysis result"""
+    if not analysis:
+        return {"error": "Failed to analyze content"}, 500
+
+    return {
+        "keyword": {"id": keyword["id"], "term": keyword["term"]},
+        "target_url": target_url,
+        "competitor_urls": competitor_urls,
+        "analysis": analysis
+    }, 200
+
+def build_content_analysis(keyword, target_url, competitor_urls):
+    """Run the content-gap analysis; returns (payload, HTTP status)"""
+    competitor_urls = pick_competitors(keyword, target_url, competitor_urls)
+
+    # Analyze content
+    if not claude_service.is_available():
+        return {"error": "Claude API not available"}, 503
+
+    analysis = claude_service.analyze_content_gaps(
+        query=keyword.term,
+        target_url=target_url,
+        competitor_urls=competitor_urls
+    )
+    return content_analysis_payload({"id": keyword.id, "term": keyword.term}, target_url, competitor_urls,
+                                    analysis)
+
+def fetch_rankings_job(job, keyword_id):
+    keyword = Keyword.query.get(keyword_id)
+    if not keyword:
+        raise ValueError(f"Keyword {keyword_id} not found")
+    job.update(0.1, f"Fetching rankings for '{keyword.term}'")
+    saved = store_serp_rankings(keyword.id, keyword.term)
+    if saved is None:
+        raise RuntimeError("Failed to fetch SERP data")
+    return {"message": "Rankings updated", "rankings_saved": saved}
+
+def predict_job(job, keyword_id, days, model=None):
+    keyword = Keyword.query.get(keyword_id)
+    if not keyword:
+        raise ValueError(f"Keyword {keyword_id} not found")
+    job.update(0.1, "Loading rankings")
+    return build_predictions(keyword, days, job, model)
+
+def content_analysis_job(job, keyword_id, target_url, competitor_urls):
+    keyword = Keyword.query.get(keyword_id)
+    if not keyword:
+        raise ValueError(f"Keyword {keyword_id} not found")
+    job.update(0.1, "Fetching pages")
+    payload, status = build_content_analysis(keyword, target_url, competitor_urls)
+    if status != 200:
+        raise RuntimeError(payload["error"])
+    return payload
+
+# Coroutine versions of the jobs above, used with ASYNC_JOBS: database steps run through
+# job_queue.run_blocking and the upstream calls are awaited on the shared event loop
+
+def keyword_fields(keyword_id):
+    keyword = Keyword.query.get(keyword_id)
+    if not keyword:
+        raise ValueError(f"Keyword {keyword_id} not found")
+    return {"id": keyword.id, "term": keyword.term}
+
+def predict_inputs(job, keyword_id, days, model):
+    keyword = Keyword.query.get(keyword_id)
+    if not keyword:
+        raise ValueError(f"Keyword {keyword_id} not found")
+    job.update(0.1, "Loading rankings")
+    return keyword.term, *prepare_predictions(keyword, days, job, model)
+
+def content_analysis_inputs(keyword_id, target_url, competitor_urls):
+    keyword = Keyword.query.get(keyword_id)
+    if not keyword:
+        raise ValueError(f"Keyword {keyword_id} not found")
+    return {"id": keyword.id, "term": keyword.term}, pick_competitors(keyword, target_url, competitor_urls)
+
+async def fetch_rankings_job_async(job, keyword_id):
+    keyword = await job_queue.run_blocking(keyword_fields, keyword_id)
+    job.update(0.1, f"Fetching rankings for '{keyword['term']}'")
+    serp_data = await serp_service.fetch_rankings_async(keyword['term'])
+    if not serp_data:
+        raise RuntimeError("Failed to fetch SERP data")
+    saved = await job_queue.run_blocking(ingest_snapshot, keyword['id'], serp_data.get('organic_results', []))
+    return {"message": "Rankings updated", "rankings_saved": saved}
+
+async def predict_job_async(job, keyword_id, days, model=None):
+    term, result, pending = await job_queue.run_blocking(predict_inputs, job, keyword_id, days, model)
+    if pending is None:
+        return result
+
+    analysis = None
+    if pending.rankings is not None:
+        job.update(0.6, "Waiting for Claude analysis")
+        try:
+            analysis = await claude_service.analyze_rankings_async(term, pending.rankings, result["predictions"])
+        except Exception:
+            logger.exception(f"Claude analysis failed for keyword {term!r}")
+    return finish_predictions(result, pending, analysis)
+
+async def content_analysis_job_async(job, keyword_id, target_url, competitor_urls):
+    keyword, competitor_urls = await job_queue.run_blocking(content_analysis_inputs, keyword_id, target_url,
+                                                            competitor_urls)
+    if not claude_service.is_available():
+        raise RuntimeError("Claude API not available")
+    job.update(0.1, "Fetching pages")
+    analysis = await claude_service.analyze_content_gaps_async(keyword["term"], target_url, competitor_urls)
+    payload, status = content_analysis_payload(keyword, target_url, competitor_urls, analysis)
+    if status != 200:
+        raise RuntimeError(payload["error"])
+    return payload
+
+def submit_upstream_job(kind, fn, async_fn, *args):
+    """Queue a job that mostly waits on upstream APIs: as a coroutine with ASYNC_JOBS, else on a worker"""
+    if Config.ASYNC_JOBS:
+        return job_queue.submit_async(kind, async_fn, *args)
+    return job_queue.submit(kind, fn, *args)
+
+@job_queue.on_evict
+def remove_export_files(job):
+    if job.kind == 'export':
+        remove_export(os.path.join(Config.EXPORT_DIR, job.id))
+
+def refresh_job(job, keyword_ids):
+    job.update(0.0, "Fetching rankings")
+    return refresh_scheduler.run(keyword_ids, progress=job.update)
+
+def analyze_portfolio_job(job, keyword_ids, days):
+    job.update(0.0, "Loading rankings")
+    return analysis_scheduler.run(keyword_ids, days, progress=job.update)
+
+def export_job(job, keyword_ids, since, until, fmt, period_days):
+    sweep_exports(Config.EXPORT_DIR, Config.EXPORT_TTL)
+    path = os.path.join(Config.EXPORT_DIR, job.id)
+    manifest = export_rankings(path, keyword_ids, since, until, fmt, period_days=period_days,
+                               rows_per_part=Config.EXPORT_PART_ROWS, progress=job.update)
+    files = sorted(os.path.relpath(os.path.join(root, name), path)
+                   for root, _, names in os.walk(path) for name in names)
+    return {
+        "rows": manifest["rows"],
+        "keywords": manifest["keywords"],
+        "parts": len(manifest["parts"]),
+        "format": fmt,
+        "files": [f"/api/exports/{job.id}/{name}" for name in files]
+    }
+
+@api_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
 
 @api_bp.route('/keywords', methods=['GET'])
 def get_keywords():
@@ -41,34 +342,14 @@ def add_keyword():
         
         print(f"Keyword created with ID: {keyword.id}")
         
-        # Fetch initial rankings data
-        try:
-            print(f"Fetching initial rankings for keyword ID: {keyword.id}")
-            serp_data = serp_service.fetch_rankings(keyword.term)
-            
-            if serp_data and 'organic_results' in serp_data:
-                # Save rankings
-                timestamp = datetime.utcnow()
-                for idx, result in enumerate(serp_data.get('organic_results', []), 1):
-                    ranking = Ranking(
-                        keyword_id=keyword.id,
-                        url=result['url'],
-                        position=idx,
-                        timestamp=timestamp
-                    )
-                    db.session.add(ranking)
-                
-                db.session.commit()
-                print(f"Initial rankings saved for keyword ID: {keyword.id}")
-            else:
-                print(f"No SERP data found for keyword: {keyword.term}")
-        except Exception as e:
-            print(f"Error fetching initial rankings: {str(e)}")
-            # Continue with response even if ranking fetch fails
+        # Fetch initial rankings data in the background
+        print(f"Queueing initial rankings fetch for keyword ID: {keyword.id}")
+        job = submit_upstream_job('fetch_rankings', fetch_rankings_job, fetch_rankings_job_async, keyword.id)
         
         return jsonify({
             "id": keyword.id, 
             "term": keyword.term, 
+            "job_id": job.id,
             "message": "Keyword added successfully"
         })
     except Exception as e:
@@ -81,8 +362,55 @@ def add_keyword():
 
 @api_bp.route('/keywords/<int:keyword_id>/rankings', methods=['GET'])
 def get_rankings(keyword_id):
+    """Ranking history for a keyword.
+
+    Without paging parameters this returns the whole window as one JSON array.
+    ?limit=N and/or ?cursor=... return one page in (timestamp, id) keyset order,
+    as {"rankings": [...], "next_cursor": ...}. ?format=ndjson (or
+    Accept: application/x-ndjson) streams one ranking per line instead.
+    ?order=asc|desc picks the direction for both; newest first is the default.
+    """
     days = request.args.get('days', 30, type=int)
     since = datetime.utcnow() - timedelta(days=days)
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    stream = request.args.get('format') == 'ndjson' or \
+        request.accept_mimetypes.best == 'application/x-ndjson'
+
+    if limit is not None or cursor or stream:
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if limit is not None and limit <= 0:
+            return jsonify({"error": "limit must be positive"}), 400
+        newest_first = request.args.get('order', 'desc') != 'asc'
+
+        if stream:
+            def generate():
+                for _, record in iter_ranking_records(keyword_id, since, after, limit, newest_first):
+                    yield json.dumps(record) + "\n"
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+        limit = min(limit or Config.RANKINGS_PAGE_SIZE, Config.RANKINGS_PAGE_MAX)
+        key = None
+        records = []
+        for key, record in iter_ranking_records(keyword_id, since, after, limit, newest_first):
+            records.append(record)
+        return jsonify({
+            "rankings": records,
+            "next_cursor": encode_cursor(key) if len(records) >= limit else None
+        })
+    
+    if reads_snapshots():
+        # Snapshot storage has no per-result row ids
+        return jsonify([{
+            'id': None,
+            'keyword_id': r.keyword_id,
+            'url': r.url,
+            'position': r.position,
+            'timestamp': r.timestamp.isoformat()
+        } for r in load_rankings([keyword_id], since)])
     
     rankings = Ranking.query.filter_by(keyword_id=keyword_id)\
                             .filter(Ranking.timestamp >= since)\
@@ -94,25 +422,90 @@ def get_rankings(keyword_id):
 def fetch_rankings_for_keyword(keyword_id):
     keyword = Keyword.query.get_or_404(keyword_id)
     
-    # Get SERP data
-    serp_data = serp_service.fetch_rankings(keyword.term)
-    if not serp_data:
-        return jsonify({"error": "Failed to fetch SERP data"}), 500
+    if wants_async():
+        return job_accepted(submit_upstream_job('fetch_rankings', fetch_rankings_job, fetch_rankings_job_async,
+                                                keyword.id))
     
-    # Save rankings
-    timestamp = datetime.utcnow()
-    for idx, result in enumerate(serp_data.get('organic_results', []), 1):
-        ranking = Ranking(
-            keyword_id=keyword_id,
-            url=result['url'],
-            position=idx,
-            timestamp=timestamp
-        )
-        db.session.add(ranking)
+    # Get SERP data and save rankings
+    if store_serp_rankings(keyword.id, keyword.term) is None:
+        return jsonify({"error": "Failed to fetch SERP data"}), 500
     
-    db.session.commit()
     return jsonify({"message": "Rankings updated"})
 
+@api_bp.route('/keywords/refresh', methods=['POST'])
+def refresh_all_rankings():
+    """Fetch fresh rankings for many keywords (all by default) concurrently, in a background job.
+
+    Body: {"keyword_ids": [...]}. The finished job holds the run statistics.
+    """
+    data = json_object()
+    if data is None:
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    try:
+        keyword_ids = [int(k) for k in data['keyword_ids']] if data.get('keyword_ids') else None
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid refresh request: {str(e)}"}), 400
+    return job_accepted(job_queue.submit('refresh', refresh_job, keyword_ids))
+
+@api_bp.route('/keywords/analyze', methods=['POST'])
+def analyze_portfolio():
+    """Claude analyses for many keywords (all by default) in a background job, batched several per request.
+
+    Body: {"keyword_ids": [...], "days": 30}. The finished job holds run
+    statistics and the analyses by keyword id; they are also cached for /predict.
+    """
+    if not claude_service.is_available():
+        return jsonify({"error": "Claude API not available"}), 503
+    data = json_object()
+    if data is None:
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    try:
+        keyword_ids = [int(k) for k in data['keyword_ids']] if data.get('keyword_ids') else None
+        days = int(data.get('days', request.args.get('days', 30, type=int)))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid analysis request: {str(e)}"}), 400
+    return job_accepted(job_queue.submit('analyze_portfolio', analyze_portfolio_job, keyword_ids, days))
+
+@api_bp.route('/rankings/ingest', methods=['POST'])
+def ingest_rankings():
+    """Store SERP snapshots for many keywords in one batch.
+
+    Body: {"snapshots": [{"keyword_id": 1, "timestamp": "<ISO 8601, optional>",
+                          "urls": ["https://...", ...]}, ...]}
+    where urls are in ranking order (organic_results with a "url" key also work).
+    """
+    data = json_object()
+    if data is None:
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    snapshots = data.get('snapshots')
+    if not isinstance(snapshots, list):
+        return jsonify({"error": "snapshots must be a list"}), 400
+
+    try:
+        batch = []
+        for snapshot in snapshots:
+            if not isinstance(snapshot, dict):
+                raise ValueError("each snapshot must be an object")
+            results, urls = snapshot.get('organic_results'), snapshot.get('urls', [])
+            if results is not None and not (isinstance(results, list) and
+                                            all(isinstance(result, dict) for result in results)):
+                raise ValueError("organic_results must be a list of objects")
+            if not (isinstance(urls, list) and all(isinstance(url, str) for url in urls)):
+                raise ValueError("urls must be a list of strings")
+            results = results or [{"url": url} for url in urls]
+            timestamp = datetime.fromisoformat(snapshot['timestamp']) if snapshot.get('timestamp') else None
+            batch.append((int(snapshot['keyword_id']), results, timestamp))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid snapshot: {str(e)}"}), 400
+
+    known = {k for (k,) in db.session.query(Keyword.id).filter(Keyword.id.in_({b[0] for b in batch}))}
+    missing = sorted({b[0] for b in batch} - known)
+    if missing:
+        return jsonify({"error": f"Unknown keyword ids: {missing}"}), 404
+
+    rows = ingest_snapshots(batch)
+    return jsonify({"snapshots": len(batch), "rows_inserted": rows})
+
 @api_bp.route('/keywords/<int:keyword_id>/predict', methods=['GET'])
 def predict_rankings(keyword_id):
     try:
@@ -121,43 +514,17 @@ def predict_rankings(keyword_id):
         if not keyword:
             return jsonify({"error": "Keyword not found"}), 404
             
-        # Get the latest rankings
         days = request.args.get('days', 30, type=int)
-        since = datetime.utcnow() - timedelta(days=days)
-        
-        rankings = Ranking.query.filter_by(keyword_id=keyword_id)\
-                              .filter(Ranking.timestamp >= since)\
-                              .order_by(Ranking.timestamp.desc())\
-                              .all()
+        model = request.args.get('model', Config.PREDICTION_MODEL)
+        if model not in MODELS:
+            return jsonify({"error": f"model must be one of {sorted(MODELS)}"}), 400
         
-        if not rankings:
-            # Instead of returning an error, return an empty prediction set
-            return jsonify({
-                "keyword": {"id": keyword.id, "term": keyword.term},
-                "predictions": {},
-                "days_analyzed": days,
-                "claude_analysis": None,
-                "message": "No historical ranking data available for predictions. Try fetching rankings first."
-            })
+        if wants_async():
+            return job_accepted(submit_upstream_job('predict', predict_job, predict_job_async, keyword.id, days, model))
         
-        # Generate predictions using the predictor service
+        # Generate predictions from the latest rankings
         try:
-            predictions_data = predictor.predict_future_rankings(rankings)
-            
-            # Generate analysis using Claude
-            analysis = None
-            if claude_service.is_available():
-                try:
-                    analysis = claude_service.analyze_rankings(keyword.term, rankings, predictions_data)
-                except Exception as e:
-                    print(f"Claude analysis error: {str(e)}")
-            
-            return jsonify({
-                "keyword": {"id": keyword.id, "term": keyword.term},
-                "predictions": predictions_data,
-                "days_analyzed": days,
-                "claude_analysis": analysis
-            })
+            return jsonify(build_predictions(keyword, days, model=model))
             
         except Exception as e:
             print(f"Prediction error: {str(e)}")
@@ -167,6 +534,81 @@ def predict_rankings(keyword_id):
         print(f"Error in predict_rankings: {str(e)}")
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
+@api_bp.route('/predictions', methods=['GET', 'POST'])
+def bulk_predictions():
+    """Stream predictions for many keywords (all of them by default) as NDJSON"""
+    data = json_object()
+    if data is None:
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    keyword_ids = data.get('keyword_ids')
+    if keyword_ids is None and request.args.get('keyword_ids'):
+        try:
+            keyword_ids = [int(k) for k in request.args['keyword_ids'].split(',') if k]
+        except ValueError:
+            return jsonify({"error": "keyword_ids must be a comma-separated list of integers"}), 400
+
+    try:
+        if keyword_ids is not None and not isinstance(keyword_ids, list):
+            raise ValueError("keyword_ids must be a list")
+        keyword_ids = [int(k) for k in keyword_ids] if keyword_ids is not None else None
+        days = int(data.get('days', request.args.get('days', 30)))
+        days_ahead = int(data.get('days_ahead', request.args.get('days_ahead', 7)))
+        if days <= 0 or days_ahead <= 0:
+            raise ValueError("days and days_ahead must be positive")
+        workers = data.get('workers', request.args.get('workers'))
+        if workers is not None:
+            workers = int(workers) if isinstance(workers, str) else workers
+            if not isinstance(workers, int) or isinstance(workers, bool):
+                raise ValueError("workers must be an integer")
+            # Only ever fewer shards than the shared pool has processes
+            workers = max(1, min(workers, Config.PREDICTION_WORKERS))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid prediction request: {str(e)}"}), 400
+    model = data.get('model', request.args.get('model', Config.PREDICTION_MODEL))
+    if model not in MODELS:
+        return jsonify({"error": f"model must be one of {sorted(MODELS)}"}), 400
+
+    def generate():
+        for result in portfolio_service.iter_predictions(keyword_ids, days, days_ahead, workers, model):
+            yield json.dumps(result) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@api_bp.route('/exports', methods=['POST'])
+def create_export():
+    """Export ranking history as columnar files in a background job.
+
+    Body: {"keyword_ids": [...] (default all), "since"/"until": ISO dates,
+           "format": "npy" | "npz" | "parquet", "period_days": N}
+    The finished job lists download URLs under /api/exports/<job_id>/.
+    """
+    data = json_object()
+    if data is None:
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    fmt = data.get('format', 'npy')
+    if fmt not in FORMATS:
+        return jsonify({"error": f"format must be one of {list(FORMATS)}"}), 400
+    try:
+        if fmt == 'parquet':
+            require_pyarrow()
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        since = datetime.fromisoformat(data['since']) if data.get('since') else None
+        until = datetime.fromisoformat(data['until']) if data.get('until') else None
+        keyword_ids = [int(k) for k in data['keyword_ids']] if data.get('keyword_ids') else None
+        period_days = int(data['period_days']) if data.get('period_days') else None
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid export request: {str(e)}"}), 400
+    return job_accepted(job_queue.submit('export', export_job, keyword_ids, since, until, fmt, period_days))
+
+@api_bp.route('/exports/<job_id>/<path:filename>', methods=['GET'])
+def download_export(job_id, filename):
+    job = job_queue.get(job_id)
+    if not job or job.kind != 'export' or job.status != 'succeeded':
+        return jsonify({"error": "Export not found or not finished"}), 404
+    return send_from_directory(os.path.join(Config.EXPORT_DIR, job_id), filename, as_attachment=True)
+
 @api_bp.route('/keywords/<int:keyword_id>/content-analysis', methods=['POST'])
 def analyze_content(keyword_id):
     try:
@@ -179,42 +621,35 @@ def analyze_content(keyword_id):
         target_url = data['target_url']
         competitor_urls = data.get('competitor_urls', [])
         
-        # If no competitor URLs provided, get top ranking URLs
-        if not competitor_urls:
-            # Get latest rankings
-            latest_rankings = Ranking.query\
-                .filter_by(keyword_id=keyword_id)\
-                .order_by(Ranking.timestamp.desc())\
-                .limit(10)\
-                .all()
-                
-            # Get URLs excluding target URL
-            competitor_urls = [r.url for r in latest_rankings if r.url != target_url][:5]
+        if wants_async():
+            return job_accepted(submit_upstream_job('content_analysis', content_analysis_job,
+                                                    content_analysis_job_async, keyword.id, target_url,
+                                                    competitor_urls))
         
-        # Analyze content
-        if not claude_service.is_available():
-            return jsonify({"error": "Claude API not available"}), 503
-            
-        analysis = claude_service.analyze_content_gaps(
-            query=keyword.term,
-            target_url=target_url,
-            competitor_urls=competitor_urls
-        )
-        
-        if not analysis:
-            return jsonify({"error": "Failed to analyze content"}), 500
-            
-        return jsonify({
-            "keyword": {"id": keyword.id, "term": keyword.term},
-            "target_url": target_url,
-            "competitor_urls": competitor_urls,
-            "analysis": analysis
-        })
+        payload, status = build_content_analysis(keyword, target_url, competitor_urls)
+        return jsonify(payload), status
         
     except Exception as e:
         print(f"Error in content analysis: {str(e)}")
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
+@api_bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(service_stats())
+
+def service_stats():
+    """Cache, series store, event loop and Claude counters (also exported as /metrics gauges)"""
+    stats = {"predictions": prediction_cache.stats(), "series": series_store.stats(), "async": async_runner.stats()}
+    if claude_service.analysis_cache:
+        stats["claude_analyses"] = claude_service.analysis_cache.stats()
+    if claude_service.is_available():
+        stats["claude_prompts"] = claude_service.prompt_metrics.stats()
+        stats["claude_requests"] = claude_service.request_stats()
+    page_stats = claude_service.content_service.cache_stats()
+    if page_stats:
+        stats["pages"] = page_stats
+    return stats
+
 @api_bp.route('/debug', methods=['GET'])
 def debug_route():
     """Debug route to help diagnose serialization issues"""
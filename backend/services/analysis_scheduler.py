@@ -0,0 +1,71 @@
+from datetime import datetime
+import logging
+import time
+
+from sqlalchemy import select
+from config import Config
+from models.database import db, Keyword
+from services.batch_predictor import BatchRankingPredictor
+from services.history import load_rankings, window_start
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisScheduler:
+    """Claude analyses for many keywords at once (e.g. a nightly portfolio report).
+
+    Keywords are handled in chunks: one history query per chunk, batched
+    predictions, then ClaudeService.analyze_many, which packs several
+    keywords into each request and keeps a bounded number in flight.
+    Analyses land in the analysis cache, so /predict serves them afterwards
+    while the history is unchanged. Runs on the calling thread, which must
+    hold an app context (a job worker does).
+    """
+
+    def __init__(self, claude_service, chunk_size=None):
+        self.claude_service = claude_service
+        self.chunk_size = chunk_size or Config.BULK_PREDICTION_CHUNK_SIZE
+        self.predictor = BatchRankingPredictor(resample=Config.PREDICTION_RESAMPLE, model=Config.PREDICTION_MODEL)
+
+    def run(self, keyword_ids=None, days=30, progress=None):
+        """Analyze the given keywords (all by default); returns run statistics and the analyses by keyword id"""
+        if not self.claude_service.is_available():
+            raise RuntimeError("Claude API not available")
+        query = select(Keyword.id, Keyword.term).order_by(Keyword.id)
+        if keyword_ids:
+            query = query.where(Keyword.id.in_(keyword_ids))
+        keywords = db.session.execute(query).all()
+
+        started = time.perf_counter()
+        requests_before = self.claude_service.request_stats()
+        since = window_start(days)
+        current_date = datetime.utcnow()
+        stats = {"keywords": len(keywords), "analyzed": 0, "failed": 0, "skipped": 0}
+        analyses = {}
+
+        for start in range(0, len(keywords), self.chunk_size):
+            chunk = keywords[start:start + self.chunk_size]
+            rankings = {}
+            for row in load_rankings([keyword_id for keyword_id, _ in chunk], since):
+                rankings.setdefault(row.keyword_id, []).append(row)
+            with metrics.timed('predictor_fit'):
+                predictions = self.predictor.predict_many([row for rows in rankings.values() for row in rows],
+                                                          current_date=current_date)
+            items = [(keyword_id, term, rankings[keyword_id], predictions.get(keyword_id, {}))
+                     for keyword_id, term in chunk if keyword_id in rankings]
+            stats["skipped"] += len(chunk) - len(items)
+
+            def chunk_progress(fraction, message, offset=start, size=len(chunk)):
+                if progress:
+                    progress((offset + fraction * size) / len(keywords), message)
+
+            for keyword_id, analysis in self.claude_service.analyze_many(items, progress=chunk_progress).items():
+                analyses[str(keyword_id)] = analysis
+                stats["failed" if not analysis or "error" in analysis else "analyzed"] += 1
+
+        requests_after = self.claude_service.request_stats()
+        stats["requests"] = {name: requests_after[name] - requests_before[name] for name in requests_after}
+        stats["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+        logger.info(f"Analysis run finished: {stats}")
+        return {"stats": stats, "analyses": analyses}
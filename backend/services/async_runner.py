@@ -0,0 +1,85 @@
+"""A background asyncio event loop for upstream-bound work.
+
+Coroutines submitted from any thread (request handlers, the job queue) run
+on one loop thread, so hundreds of calls waiting on Claude, SerpAPI or
+fetched pages cost a socket each instead of an OS thread each. Blocking
+work inside those coroutines (database queries, HTML parsing, the SQLite
+caches) goes through asyncio.to_thread, i.e. the loop's small default
+executor (ASYNC_BLOCKING_WORKERS threads).
+"""
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
+
+from config import Config
+
+
+class AsyncRunner:
+    """Owns the event loop thread; started lazily on the first submit"""
+
+    def __init__(self, blocking_workers=None):
+        self.blocking_workers = blocking_workers or Config.ASYNC_BLOCKING_WORKERS
+        self.loop = None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def _ensure_loop(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.loop = asyncio.new_event_loop()
+                self.loop.set_default_executor(ThreadPoolExecutor(max_workers=self.blocking_workers,
+                                                                  thread_name_prefix='async-blocking'))
+                self.thread = threading.Thread(target=self._run_loop, args=(self.loop,), name='async-loop',
+                                               daemon=True)
+                self.thread.start()
+            return self.loop
+
+    @staticmethod
+    def _run_loop(loop):
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    async def _tracked(self, coro):
+        # Only touched on the loop thread
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return await coro
+        finally:
+            self.in_flight -= 1
+
+    def submit(self, coro):
+        """Schedule a coroutine on the loop; returns a concurrent.futures.Future for its result"""
+        loop = self._ensure_loop()
+        with self.lock:
+            self.submitted += 1
+        return asyncio.run_coroutine_threadsafe(self._tracked(coro), loop)
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the loop and block the calling thread until it finishes"""
+        return self.submit(coro).result(timeout)
+
+    def shutdown(self):
+        with self.lock:
+            loop, thread = self.loop, self.thread
+            self.loop = self.thread = None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.run_until_complete(loop.shutdown_default_executor())
+            loop.close()
+
+    def stats(self):
+        return {
+            "running": self.thread is not None and self.thread.is_alive(),
+            "submitted": self.submitted,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "blocking_workers": self.blocking_workers
+        }
+
+
+async_runner = AsyncRunner()
@@ -0,0 +1,294 @@
+import numpy as np
+from datetime import date, datetime, timedelta
+
+from services.trend_models import fit_linear_trends, get_model
+
+RESAMPLE_METHODS = ('last', 'median')
+MICROSECONDS_PER_DAY = 86400 * 10 ** 6
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def day_number(value):
+    """UTC day of a (naive UTC) datetime or date, as days since 1970-01-01"""
+    return value.toordinal() - EPOCH_ORDINAL
+
+
+class SeriesBatch:
+    """Per-URL position series packed into padded, masked NumPy arrays"""
+    __slots__ = ('keys', 'positions', 'mask', 'counts', 'origin')
+
+    def __init__(self, keys, positions, mask, counts, origin=None):
+        self.keys = keys            # group label per row (URL, or (keyword_id, url))
+        self.positions = positions  # float64 (n_series, max_len), 0 where masked
+        self.mask = mask            # bool (n_series, max_len), True for real observations
+        self.counts = counts        # int64 (n_series,), observations per row
+        # None: columns are sample indexes, rows left aligned. Otherwise a daily grid:
+        # column c holds day `origin + c` (see day_number) and missing days are masked
+        self.origin = origin
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def pack_series(keys, timestamps, positions, days=None, resample=None):
+    """Group flat observations by key and pack them into a SeriesBatch.
+
+    Rows keep the order in which each key first appears, and each row is
+    sorted by timestamp (ties keep input order), matching the ordering the
+    per-URL loop in RankingPredictor produces. With `resample` ('last' or
+    'median'), `days` gives each observation's day_number and every row is
+    collapsed onto a daily grid (see resample_daily).
+    """
+    codes_by_key = {}
+    codes = np.fromiter((codes_by_key.setdefault(k, len(codes_by_key)) for k in keys),
+                        dtype=np.int64, count=len(positions))
+    return _pack_codes(codes, list(codes_by_key), timestamps, positions, days, resample)
+
+
+def pack_arrays(key_ids, timestamps, positions, resample=None):
+    """Vectorized pack_series for integer keys (e.g. url ids) already held in NumPy arrays.
+
+    Row keys are the integer ids, in order of first appearance. Timestamps
+    are epoch microseconds, as in RankingColumns.
+    """
+    key_ids = np.asarray(key_ids)
+    days = np.asarray(timestamps) // MICROSECONDS_PER_DAY if resample else None
+    if len(key_ids) == 0:
+        return _pack_codes(np.zeros(0, dtype=np.int64), [], timestamps, positions, days, resample)
+    uniq, first, inverse = np.unique(key_ids, return_index=True, return_inverse=True)
+    by_appearance = np.argsort(first, kind='stable')
+    renumber = np.empty_like(by_appearance)
+    renumber[by_appearance] = np.arange(len(uniq))
+    return _pack_codes(renumber[inverse.ravel()], uniq[by_appearance].tolist(), timestamps, positions,
+                       days, resample)
+
+
+def resample_daily(codes, days, positions, how='last'):
+    """Collapse observations to one per (code, day).
+
+    Input must be sorted by code, then time. Returns (codes, days, values)
+    with one entry per (code, day) in the same order; values are the day's
+    last position, or its median with how='median'.
+    """
+    if how not in RESAMPLE_METHODS:
+        raise ValueError(f"Unknown resample method {how!r}; expected one of {RESAMPLE_METHODS}")
+    new_group = np.ones(len(codes), dtype=bool)
+    new_group[1:] = (codes[1:] != codes[:-1]) | (days[1:] != days[:-1])
+    starts = np.flatnonzero(new_group)
+    ends = np.append(starts[1:], len(codes))
+    if how == 'last':
+        values = positions[ends - 1]
+    else:
+        group = np.cumsum(new_group) - 1
+        ordered = positions[np.lexsort((positions, group))]
+        values = (ordered[starts + (ends - starts - 1) // 2] + ordered[starts + (ends - starts) // 2]) / 2
+    return codes[starts], days[starts], values
+
+
+def _pack_codes(codes, keys, timestamps, positions, days=None, resample=None):
+    ts = np.asarray(timestamps)
+    pos = np.asarray(positions, dtype=np.float64)
+
+    n_series = len(keys)
+    if n_series == 0:
+        return SeriesBatch([], np.zeros((0, 0)), np.zeros((0, 0), dtype=bool), np.zeros(0, dtype=np.int64))
+
+    order = np.lexsort((ts, codes))
+    codes = codes[order]
+    pos = pos[order]
+    if resample:
+        return _pack_grid(keys, *resample_daily(codes, np.asarray(days, dtype=np.int64)[order], pos, resample))
+
+    counts = np.bincount(codes, minlength=n_series)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    cols = np.arange(len(codes)) - starts[codes]
+
+    max_len = int(counts.max())
+    packed = np.zeros((n_series, max_len), dtype=np.float64)
+    mask = np.zeros((n_series, max_len), dtype=bool)
+    packed[codes, cols] = pos
+    mask[codes, cols] = True
+
+    return SeriesBatch(keys, packed, mask, counts)
+
+
+def _pack_grid(keys, codes, days, values):
+    """SeriesBatch with one column per day between the batch's first and last observed day"""
+    origin = int(days.min())
+    cols = days - origin
+    packed = np.zeros((len(keys), int(cols.max()) + 1), dtype=np.float64)
+    mask = np.zeros(packed.shape, dtype=bool)
+    packed[codes, cols] = values
+    mask[codes, cols] = True
+    return SeriesBatch(keys, packed, mask, np.bincount(codes, minlength=len(keys)), origin)
+
+
+def pack_rankings(rankings, key=None, resample=None):
+    """Pack Ranking-like objects (anything with url/timestamp/position) into a SeriesBatch"""
+    key = key or (lambda r: r.url)
+    keys = [key(r) for r in rankings]
+    positions = [r.position for r in rankings]
+
+    # Only the order matters for packing, and a snapshot shares one timestamp
+    # across all of its results, so rank the distinct datetimes instead of
+    # converting every object to datetime64
+    stamps = [r.timestamp for r in rankings]
+    distinct = sorted(set(stamps))
+    rank = {t: i for i, t in enumerate(distinct)}
+    timestamps = np.fromiter((rank[t] for t in stamps), dtype=np.int64, count=len(stamps))
+    days = None
+    if resample:
+        day_of_rank = np.array([day_number(t) for t in distinct], dtype=np.int64)
+        days = day_of_rank[timestamps]
+    return pack_series(keys, timestamps, positions, days, resample)
+
+
+def fit_from_sums(n, sum_x, sum_y, sum_xy, sum_xx, sum_yy):
+    """fit_linear_trends from per-series sums instead of the points themselves.
+
+    Each argument is an array with one entry per series. Sums should be taken
+    in a frame where x starts near 0 (e.g. x - first index) to avoid
+    cancellation; the intercept is relative to that frame.
+    """
+    n = np.asarray(n, dtype=np.float64)
+    n_safe = np.where(n >= 3, n, np.nan)
+    x_mean = np.asarray(sum_x, dtype=np.float64) / n_safe
+    y_mean = np.asarray(sum_y, dtype=np.float64) / n_safe
+
+    ss_xx = np.asarray(sum_xx, dtype=np.float64) - n_safe * x_mean * x_mean
+    ss_xy = np.asarray(sum_xy, dtype=np.float64) - n_safe * x_mean * y_mean
+    ss_yy = np.maximum(np.asarray(sum_yy, dtype=np.float64) - n_safe * y_mean * y_mean, 0.0)
+
+    slope = ss_xy / ss_xx
+    intercept = y_mean - slope * x_mean
+    residual = np.maximum(ss_yy - slope * ss_xy, 0.0)
+    std_err = np.sqrt(residual / (n_safe - 2) / ss_xx)
+    volatility = np.sqrt(ss_yy / n_safe)
+
+    return {
+        'slope': slope,
+        'intercept': intercept,
+        'std_err': std_err,
+        'volatility': volatility,
+    }
+
+
+class BatchRankingPredictor:
+    """Vectorized drop-in for RankingPredictor.predict_future_rankings.
+
+    With `resample` ('last' or 'median') every series is first collapsed to
+    one point per UTC day and regressed against the day, so trends are in
+    positions per day and predicted dates line up with the fitted x. With
+    resample=None (or 'none'), x is the sample index (the original behaviour).
+    `model` names the trend fitter (see services.trend_models.MODELS); the
+    predict methods take a per-call override.
+    """
+
+    def __init__(self, volatility_threshold=2.0, min_points=3, resample='last', model='linear'):
+        resample = None if resample in (None, '', 'none') else resample
+        if resample not in (None, *RESAMPLE_METHODS):
+            raise ValueError(f"Unknown resample method {resample!r}; expected None or one of {RESAMPLE_METHODS}")
+        get_model(model)
+        self.volatility_threshold = volatility_threshold
+        self.min_points = max(3, min_points)
+        self.resample = resample
+        self.model = model
+
+    def predict_batch(self, batch, days_ahead=7, current_date=None, model=None):
+        """Return {key: prediction dict} for every row of a SeriesBatch with enough points"""
+        if len(batch) == 0:
+            return {}
+
+        current_date = current_date or datetime.utcnow()
+        fits = get_model(model or self.model)(batch.positions, batch.mask, batch.counts)
+        # Last observed column of each row
+        last = batch.mask.shape[1] - 1 - np.argmax(batch.mask[:, ::-1], axis=1)
+        current = batch.positions[np.arange(len(batch)), last]
+        next_x = None if batch.origin is None else day_number(current_date) + 1 - batch.origin
+        return self.predict_fits(batch.keys, batch.counts, fits, current, days_ahead, current_date, next_x)
+
+    def predict_fits(self, keys, counts, fits, current, days_ahead=7, current_date=None, next_x=None):
+        """Turn per-series fits into prediction dicts keyed by `keys`.
+
+        `current` is each series' latest position and `next_x` the x of the
+        first predicted day (scalar or per series) in the frame the fits were
+        made in; by default the next sample index, i.e. `counts`. Series with
+        fewer than min_points points are skipped.
+        """
+        current_date = current_date or datetime.utcnow()
+        counts = np.asarray(counts)
+        keep = np.flatnonzero(counts >= self.min_points)
+        if len(keep) == 0:
+            return {}
+
+        counts = counts[keep]
+        slope = fits['slope'][keep]
+        intercept = fits['intercept'][keep]
+        conf_interval = fits['std_err'][keep] * 1.96  # 95% confidence
+        volatility = fits['volatility'][keep]
+        current = np.rint(np.asarray(current)[keep])
+        next_x = counts if next_x is None else np.broadcast_to(next_x, len(keys))[keep]
+
+        # future_x = next_x + day - 1 for day = 1..days_ahead
+        future_x = next_x[:, None] + np.arange(days_ahead)[None, :]
+        predicted = np.rint(intercept[:, None] + slope[:, None] * future_x)
+        lower = np.maximum(1, np.rint(predicted - conf_interval[:, None]))
+        upper = np.rint(predicted + conf_interval[:, None])
+
+        dates = [(current_date + timedelta(days=day)).strftime("%Y-%m-%d")
+                 for day in range(1, days_ahead + 1)]
+
+        predicted = predicted.astype(np.int64).tolist()
+        lower = lower.astype(np.int64).tolist()
+        upper = upper.astype(np.int64).tolist()
+        current = current.astype(np.int64).tolist()
+        slope = slope.tolist()
+        volatility = volatility.tolist()
+
+        predictions = {}
+        for row, idx in enumerate(keep.tolist()):
+            predictions[keys[idx]] = {
+                "current_position": current[row],
+                "trend": slope[row],
+                "volatility": volatility[row],
+                "is_volatile": volatility[row] > self.volatility_threshold,
+                "predictions": [
+                    {"date": date, "position": pos, "lower_bound": lo, "upper_bound": hi}
+                    for date, pos, lo, hi in zip(dates, predicted[row], lower[row], upper[row])
+                ]
+            }
+        return predictions
+
+    def predict(self, rankings, days_ahead=7, current_date=None, model=None):
+        """Generate predictions for one keyword's rankings, keyed by URL"""
+        if not rankings:
+            return {}
+        return self.predict_batch(pack_rankings(rankings, resample=self.resample), days_ahead, current_date, model)
+
+    def predict_many(self, rankings, days_ahead=7, current_date=None, model=None):
+        """Predict several keywords in one pass.
+
+        `rankings` is a flat iterable of rows with keyword_id/url/position/timestamp;
+        returns {keyword_id: {url: prediction dict}}.
+        """
+        if not rankings:
+            return {}
+        batch = pack_rankings(rankings, key=lambda r: (r.keyword_id, r.url), resample=self.resample)
+        results = {}
+        for (keyword_id, url), prediction in self.predict_batch(batch, days_ahead, current_date, model).items():
+            results.setdefault(keyword_id, {})[url] = prediction
+        return results
+
+    def predict_columns(self, columns, days_ahead=7, current_date=None, model=None):
+        """Predict straight from parallel arrays (keyword_ids, url_ids, positions, timestamps).
+
+        Returns {keyword_id: {url_id: prediction dict}}; callers map url ids to strings.
+        """
+        if len(columns) == 0:
+            return {}
+        keys = (columns.keyword_ids.astype(np.int64) << 32) | columns.url_ids.astype(np.int64)
+        batch = pack_arrays(keys, columns.timestamps, columns.positions, self.resample)
+        results = {}
+        for key, prediction in self.predict_batch(batch, days_ahead, current_date, model).items():
+            results.setdefault(key >> 32, {})[key & 0xFFFFFFFF] = prediction
+        return results
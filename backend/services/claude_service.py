@@ -1,101 +1,284 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import contextvars
+import logging
+import threading
 import anthropic
 import json
 from config import Config
 from services.content_service import ContentService
+from services.disk_cache import DiskCache
+from services.metrics import metrics
+from services.prompt_builder import PromptMetrics, build_batch_prompt, build_ranking_prompt, parse_batch_analysis
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_MODEL = "claude-3-5-sonnet-latest"
+ANALYSIS_SYSTEM = "You are an SEO analytics expert who analyzes search ranking trends and provides insights. Your responses should be detailed, data-driven, and actionable."
+
+# A keyword waiting for analyze_many: its single-keyword request (and cache key) and its batch prompt section
+PendingAnalysis = namedtuple('PendingAnalysis', ['key', 'keyword', 'request', 'cache_key', 'section'])
+
+
+def default_analysis_cache():
+    """Analysis cache configured from CLAUDE_CACHE_*; None when CLAUDE_CACHE_PATH is empty"""
+    if not Config.CLAUDE_CACHE_PATH:
+        return None
+    return DiskCache(Config.CLAUDE_CACHE_PATH, ttl=Config.CLAUDE_CACHE_TTL,
+                     max_entries=Config.CLAUDE_CACHE_MAX_ENTRIES, namespace='analyze_rankings')
+
 
 class ClaudeService:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, client=None, analysis_cache=None):
+        """`client` replaces the Anthropic client (e.g. a fake in tests); `analysis_cache`
+        replaces the configured on-disk cache of ranking analyses."""
         self.api_key = api_key or Config.CLAUDE_API_KEY
-        self.client = anthropic.Anthropic(api_key=self.api_key) if self.api_key else None
+        if client is None and self.api_key:
+            client = anthropic.Anthropic(api_key=self.api_key)
+        self.client = client
+        if analysis_cache is None and self.client is not None:
+            analysis_cache = default_analysis_cache()
+        self.analysis_cache = analysis_cache
+        self.prompt_metrics = PromptMetrics()
+        self.lock = threading.Lock()
+        self.request_counts = {"single": 0, "batched": 0, "batched_keywords": 0, "fallbacks": 0, "cached": 0}
+        self.content_service = ContentService()
+        self._async_loop = None
+        self._async_anthropic = None
         
     def is_available(self):
         return self.client is not None
+
+    def _async_client(self):
+        """AsyncAnthropic with the sync client's key, endpoint and retry settings, one per event loop"""
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            self._async_anthropic = anthropic.AsyncAnthropic(
+                api_key=self.client.api_key, base_url=self.client.base_url,
+                max_retries=self.client.max_retries, timeout=self.client.timeout)
+            self._async_loop = loop
+        return self._async_anthropic
         
+    def _ranking_request(self, keyword, rankings, predictions, record=True):
+        """The single-keyword analysis request; its content also addresses the cached analysis"""
+        # Per-URL summaries within the token budget instead of every raw row
+        prompt = build_ranking_prompt(keyword, rankings, predictions)
+        if record:
+            self.prompt_metrics.record(prompt)
+        return {
+            "model": ANALYSIS_MODEL,
+            "max_tokens": 2000,
+            "temperature": 0.2,
+            "system": ANALYSIS_SYSTEM,
+            "messages": [
+                {"role": "user", "content": prompt.text}
+            ]
+        }
+
+    def _cached_analysis(self, request):
+        """(cache_key, cached analysis or None); the request is content-addressed, so unchanged
+        history and predictions reuse the stored analysis"""
+        if not self.analysis_cache:
+            return None, None
+        cache_key = DiskCache.make_key(request)
+        return cache_key, self.analysis_cache.get(cache_key)
+
+    def _store_analysis(self, cache_key, analysis):
+        """Cache an analysis that parsed; errors and unparsed replies ({"raw_analysis": ...}) are retried"""
+        if cache_key and isinstance(analysis, dict) and "error" not in analysis and "raw_analysis" not in analysis:
+            self.analysis_cache.set(cache_key, analysis)
+
+    def _count(self, **increments):
+        with self.lock:
+            for name, value in increments.items():
+                self.request_counts[name] += value
+
     def analyze_rankings(self, keyword, rankings, predictions):
         """Generate an analysis of ranking trends using Claude"""
         if not self.is_available():
             return None
-            
-        # Prepare data for Claude
-        ranking_data = []
-        for r in rankings:
-            ranking_data.append({
-                "date": r.timestamp.strftime("%Y-%m-%d"),
-                "url": r.url,
-                "position": r.position
-            })
-        
-        # Create prompt for Claude
-        prompt = f"""Analyze these search ranking trends for the keyword "{keyword}". 
-        
-Ranking history:
-{json.dumps(ranking_data, indent=2)}
 
-Predictions:
-{json.dumps(predictions, indent=2)}
+        request = self._ranking_request(keyword, rankings, predictions)
+        cache_key, cached = self._cached_analysis(request)
+        if cached is not None:
+            return cached
 
-Please provide an analysis covering:
-1. An overall summary of the ranking trends
-2. Which URLs showed significant volatility
-3. Which URLs are predicted to improve or decline in rankings
-4. Any patterns or anomalies in the data
-5. Strategic recommendations based on these trends
+        self._count(single=1)
+        analysis = self._request_analysis(request)
+        self._store_analysis(cache_key, analysis)
+        return analysis
 
-Format your response as JSON with these keys: "summary", "volatility_analysis", "prediction_analysis", "patterns_discovered", and "recommendations"."""
+    async def analyze_rankings_async(self, keyword, rankings, predictions):
+        """analyze_rankings on the event loop; prompt building and the cache run via asyncio.to_thread"""
+        if not self.is_available():
+            return None
 
+        request = await asyncio.to_thread(self._ranking_request, keyword, rankings, predictions)
+        cache_key, cached = await asyncio.to_thread(self._cached_analysis, request)
+        if cached is not None:
+            return cached
+
+        self._count(single=1)
+        try:
+            with metrics.timed('claude'):
+                response = await self._async_client().messages.create(**request)
+            analysis = self._parse_analysis(response.content[0].text)
+        except Exception as e:
+            logger.exception("Error calling Claude API")
+            analysis = {"error": f"Claude API error: {str(e)}"}
+        await asyncio.to_thread(self._store_analysis, cache_key, analysis)
+        return analysis
+
+    def analyze_many(self, items, group_size=None, concurrency=None, progress=None):
+        """Analyze many keywords in few round trips; returns {key: analysis dict}.
+
+        `items` is [(key, keyword, rankings, predictions)] with unique keys
+        (e.g. keyword ids). Cached analyses are reused. The rest are sent
+        `group_size` keywords per request (CLAUDE_BATCH_KEYWORDS, fewer when
+        their prompts would pass CLAUDE_BATCH_TOKEN_BUDGET), with up to
+        `concurrency` requests in flight (CLAUDE_BATCH_CONCURRENCY). Keywords
+        missing from a batch reply are retried alone, so every key gets an
+        analysis or an {"error": ...}. Analyses are cached under their
+        single-keyword request, so /predict reuses them. `progress(fraction,
+        message)` is called as requests finish (e.g. Job.update).
+        """
+        if not self.is_available():
+            return {}
+        group_size = max(1, group_size or Config.CLAUDE_BATCH_KEYWORDS)
+        concurrency = max(1, concurrency or Config.CLAUDE_BATCH_CONCURRENCY)
+
+        results = {}
+        pending = []
+        for key, keyword, rankings, predictions in items:
+            request = self._ranking_request(keyword, rankings, predictions, record=group_size == 1)
+            cache_key, cached = self._cached_analysis(request)
+            if cached is not None:
+                results[key] = cached
+                continue
+            section = None
+            if group_size > 1:
+                section = build_ranking_prompt(keyword, rankings, predictions, instructions=None)
+                self.prompt_metrics.record(section)
+            pending.append(PendingAnalysis(key, keyword, request, cache_key, section))
+        self._count(cached=len(results))
+
+        groups = []
+        for item in pending:
+            group = groups[-1] if groups else None
+            if group is None or len(group) >= group_size or \
+                    sum(other.section.tokens for other in group) + item.section.tokens > Config.CLAUDE_BATCH_TOKEN_BUDGET:
+                groups.append([item])
+            else:
+                group.append(item)
+
+        done = 0
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='claude-batch') as executor:
+            futures = [executor.submit(contextvars.copy_context().run, self._analyze_group, group)
+                       for group in groups]
+            for future in as_completed(futures):
+                analyses = future.result()
+                results.update(analyses)
+                done += len(analyses)
+                if progress:
+                    progress(done / len(pending), f"Analyzed {done}/{len(pending)} keywords")
+        return results
+
+    def _analyze_group(self, group):
+        """{key: analysis} for one batch, falling back to single requests for keywords it missed"""
+        if len(group) == 1:
+            item = group[0]
+            self._count(single=1)
+            analysis = self._request_analysis(item.request)
+            self._store_analysis(item.cache_key, analysis)
+            return {item.key: analysis}
+
+        keys = [item.key for item in group]
+        request = {
+            "model": ANALYSIS_MODEL,
+            "max_tokens": min(Config.CLAUDE_BATCH_MAX_TOKENS, Config.CLAUDE_BATCH_TOKENS_PER_KEYWORD * len(group)),
+            "temperature": 0.2,
+            "system": ANALYSIS_SYSTEM,
+            "messages": [
+                {"role": "user", "content": build_batch_prompt([(item.key, item.keyword, item.section)
+                                                                for item in group])}
+            ]
+        }
+        self._count(batched=1, batched_keywords=len(group))
+        try:
+            found = parse_batch_analysis(self._request_text(request), keys)
+        except Exception as e:
+            logger.warning(f"Batch analysis of {len(group)} keywords failed: {e}")
+            found = {}
+
+        analyses = {}
+        for item in group:
+            analysis = found.get(item.key)
+            if analysis is None:
+                self._count(fallbacks=1)
+                analysis = self._request_analysis(item.request)
+            self._store_analysis(item.cache_key, analysis)
+            analyses[item.key] = analysis
+        return analyses
+
+    def request_stats(self):
+        with self.lock:
+            return dict(self.request_counts)
+
+    def _request_text(self, request):
+        with metrics.timed('claude'):
+            response = self.client.messages.create(**request)
+        return response.content[0].text
+
+    def _request_analysis(self, request):
+        """Send a prepared analysis request to Claude and parse the JSON out of the reply"""
         try:
             # Call Claude API
-            response = self.client.messages.create(
-                model="claude-3-5-sonnet-latest",
-                max_tokens=2000,
-                temperature=0.2,
-                system="You are an SEO analytics expert who analyzes search ranking trends and provides insights. Your responses should be detailed, data-driven, and actionable.",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
+            response_text = self._request_text(request)
+        except Exception as e:
+            logger.exception("Error calling Claude API")
+            return {"error": f"Claude API error: {str(e)}"}
+        return self._parse_analysis(response_text)
+
+    @staticmethod
+    def _parse_analysis(response_text):
+        """Analysis dict from a reply: its JSON, else {"raw_analysis": text}"""
+        try:
+            analysis_text = response_text
+            logger.debug(f"Raw Claude response: {analysis_text}")
             
-            # Parse the response
+            # Try to extract a JSON object from the response
             try:
-                analysis_text = response.content[0].text
-                print("Raw Claude response:", analysis_text)
+                # Find JSON content (it might be wrapped in markdown code blocks)
+                if "```json" in analysis_text:
+                    json_part = analysis_text.split("```json")[1].split("```")[0].strip()
+                    analysis = json.loads(json_part)
+                    logger.debug("Parsed JSON from code block")
+                else:
+                    analysis = json.loads(analysis_text)
+                    logger.debug("Parsed JSON directly")
                 
-                # Try to extract a JSON object from the response
-                try:
-                    # Find JSON content (it might be wrapped in markdown code blocks)
-                    if "```json" in analysis_text:
-                        json_part = analysis_text.split("```json")[1].split("```")[0].strip()
-                        analysis = json.loads(json_part)
-                        print("Successfully parsed JSON from code block")
-                    else:
-                        analysis = json.loads(analysis_text)
-                        print("Successfully parsed JSON directly")
-                    
-                    return analysis
-                except json.JSONDecodeError as e:
-                    print(f"JSON parsing error: {str(e)}")
-                    
-                    # If the JSON is incomplete or malformed, try to clean it up
-                    if "raw_analysis" in analysis_text:
-                        # We might already have a nested structure, try to parse that
-                        try:
-                            if isinstance(analysis_text, dict) and "raw_analysis" in analysis_text:
-                                raw_json = analysis_text["raw_analysis"]
-                                if "```json" in raw_json:
-                                    json_part = raw_json.split("```json")[1].split("```")[0].strip()
-                                    return json.loads(json_part)
-                        except:
-                            pass
-                    
-                    # Fall back to returning the raw text
-                    return {"raw_analysis": analysis_text}
-            except Exception as inner_e:
-                print(f"Error parsing Claude response: {str(inner_e)}")
-                return {"error": "Failed to parse Claude response"}
+                return analysis
+            except json.JSONDecodeError as e:
+                logger.warning(f"Could not parse Claude response as JSON: {e}")
                 
-        except Exception as e:
-            print(f"Error calling Claude API: {str(e)}")
-            return {"error": f"Claude API error: {str(e)}"}
+                # If the JSON is incomplete or malformed, try to clean it up
+                if "raw_analysis" in analysis_text:
+                    # We might already have a nested structure, try to parse that
+                    try:
+                        if isinstance(analysis_text, dict) and "raw_analysis" in analysis_text:
+                            raw_json = analysis_text["raw_analysis"]
+                            if "```json" in raw_json:
+                                json_part = raw_json.split("```json")[1].split("```")[0].strip()
+                                return json.loads(json_part)
+                    except:
+                        pass
+                
+                # Fall back to returning the raw text
+                return {"raw_analysis": analysis_text}
+        except Exception as inner_e:
+            logger.exception("Error parsing Claude response")
+            return {"error": "Failed to parse Claude response"}
 
     def predict_ranking_changes(self, historical_data):
         """Use Claude to analyze and predict ranking changes"""
@@ -117,13 +300,14 @@ Format your response as JSON with these keys: "summary", "volatility_analysis",
         """
         
         try:
-            response = self.client.messages.create(
-                model="claude-3-5-sonnet-latest",
-                max_tokens=4096,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
+            with metrics.timed('claude'):
+                response = self.client.messages.create(
+                    model="claude-3-5-sonnet-latest",
+                    max_tokens=4096,
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ]
+                )
             # Extract JSON from response
             analysis_text = response.content[0].text
             # Find the start of the JSON in the response
@@ -142,13 +326,49 @@ Format your response as JSON with these keys: "summary", "volatility_analysis",
             return None
         
         try:
-            # Fetch content
-            content_service = ContentService()
-            target_content = content_service.fetch_page_content(target_url)
-            competitor_contents = content_service.fetch_multiple_pages(competitor_urls, limit=3)
+            # Fetch the target and competitor pages together
+            pages = self.content_service.fetch_pages([target_url] + list(competitor_urls[:3]))
+            request, error = self._content_gap_request(query, pages)
+            if error:
+                return error
+
+            # Call Claude API
+            with metrics.timed('claude'):
+                response = self.client.messages.create(**request)
+            return self._parse_content_analysis(response.content[0].text)
             
-            # Create prompt for Claude
-            prompt = f"""Analyze content gaps for the search query "{query}".
+        except Exception as e:
+            logger.exception("Error analyzing content")
+            return {"error": f"Content analysis error: {str(e)}"}
+
+    async def analyze_content_gaps_async(self, query, target_url, competitor_urls):
+        """analyze_content_gaps on the event loop: pages and Claude are awaited, not waited on by a thread"""
+        if not self.is_available():
+            return None
+
+        try:
+            pages = await self.content_service.fetch_pages_async([target_url] + list(competitor_urls[:3]))
+            request, error = self._content_gap_request(query, pages)
+            if error:
+                return error
+            with metrics.timed('claude'):
+                response = await self._async_client().messages.create(**request)
+            return self._parse_content_analysis(response.content[0].text)
+        except Exception as e:
+            logger.exception("Error analyzing content")
+            return {"error": f"Content analysis error: {str(e)}"}
+
+    @staticmethod
+    def _content_gap_request(query, pages):
+        """(Messages API request, None) for fetched [target] + competitor pages, or (None, error dict)"""
+        target_content = pages[0]
+        if target_content.get("error"):
+            return None, {"error": f"Could not fetch target page: {target_content['error']}"}
+        # Competitors that failed or missed the deadline are left out rather than failing the analysis
+        competitor_contents = [page for page in pages[1:] if not page.get("error")]
+        
+        # Create prompt for Claude
+        prompt = f"""Analyze content gaps for the search query "{query}".
 
 TARGET PAGE:
 URL: {target_content['url']}
@@ -161,8 +381,8 @@ Content Preview: {target_content['content'][:1000]}...
 COMPETITOR PAGES:
 """
 
-            for i, comp in enumerate(competitor_contents, 1):
-                prompt += f"""
+        for i, comp in enumerate(competitor_contents, 1):
+            prompt += f"""
 COMPETITOR {i}:
 URL: {comp['url']}
 Title: {comp['title']}
@@ -172,7 +392,7 @@ Word Count: {comp.get('word_count', 'N/A')}
 Content Preview: {comp.get('content', 'N/A')[:500]}...
 """
 
-            prompt += """
+        prompt += """
 Based on this data, please:
 1. Identify the top 10 content strengths of the target page
 2. Identify the top 10 content gaps or weaknesses compared to competitors
@@ -181,33 +401,28 @@ Based on this data, please:
 
 Format your response as JSON with these keys: "strengths", "weaknesses", "recommendations", and "competitiveness_score".
 """
+        return {
+            "model": "claude-3-7-sonnet-latest",
+            "max_tokens": 3000,
+            "temperature": 0.2,
+            "system": "You are an SEO content analyst who specializes in identifying content gaps and opportunities. You provide detailed, actionable insights based on content analysis.",
+            "messages": [
+                {"role": "user", "content": prompt}
+            ]
+        }, None
 
-            # Call Claude API
-            response = self.client.messages.create(
-                model="claude-3-7-sonnet-latest",
-                max_tokens=3000,
-                temperature=0.2,
-                system="You are an SEO content analyst who specializes in identifying content gaps and opportunities. You provide detailed, actionable insights based on content analysis.",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            
-            # Parse the response
-            try:
-                analysis_text = response.content[0].text
-                # Try to extract JSON
-                if "```json" in analysis_text:
-                    json_part = analysis_text.split("```json")[1].split("```")[0].strip()
-                    analysis = json.loads(json_part)
-                else:
-                    analysis = json.loads(analysis_text)
-                
-                return analysis
-            except:
-                # Return raw text if parsing fails
-                return {"raw_analysis": analysis_text}
+    @staticmethod
+    def _parse_content_analysis(analysis_text):
+        # Parse the response
+        try:
+            # Try to extract JSON
+            if "```json" in analysis_text:
+                json_part = analysis_text.split("```json")[1].split("```")[0].strip()
+                analysis = json.loads(json_part)
+            else:
+                analysis = json.loads(analysis_text)
             
-        except Exception as e:
-            print(f"Error analyzing content: {str(e)}")
-            return {"error": f"Content analysis error: {str(e)}"} 
\ No newline at end of file
+            return analysis
+        except:
+            # Return raw text if parsing fails
+            return {"raw_analysis": analysis_text}
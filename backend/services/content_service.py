@@ -1,53 +1,182 @@
 import requests
-from bs4 import BeautifulSoup
-import re
+from requests.adapters import HTTPAdapter
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+import asyncio
+import contextvars
+import httpx
+from urllib.parse import urlsplit
+from config import Config
+from services.disk_cache import DiskCache
+from services.extractors import get_extractor
+from services.metrics import metrics
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+def default_page_cache():
+    """Page cache configured from PAGE_CACHE_*; None when PAGE_CACHE_PATH is empty"""
+    if not Config.PAGE_CACHE_PATH:
+        return None
+    return DiskCache(Config.PAGE_CACHE_PATH, ttl=Config.PAGE_CACHE_TTL,
+                     max_entries=Config.PAGE_CACHE_MAX_ENTRIES, namespace='pages')
+
+
+class AsyncHost:
+    """Async client and concurrency limit for one host on the event loop.
+
+    Each host gets its own small connection pool: httpcore checks every
+    pooled connection on every request, so a single pool holding hundreds
+    of connections makes each request slower the more are open.
+    """
+
+    def __init__(self, headers, per_host):
+        self.client = httpx.AsyncClient(headers=headers, follow_redirects=True,
+                                        limits=httpx.Limits(max_connections=per_host,
+                                                            max_keepalive_connections=per_host))
+        self.slots = asyncio.Semaphore(per_host)
+        self.active = 0
+
+
 class ContentService:
-    def __init__(self):
+    def __init__(self, timeout=None, workers=None, per_host=None, deadline=None, page_cache=None, max_age=None,
+                 extractor=None):
+        """`page_cache` replaces the configured on-disk page cache (False disables caching);
+        `extractor` names an entry of services.extractors.EXTRACTORS (CONTENT_EXTRACTOR by default)."""
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
-        
-    def fetch_page_content(self, url, timeout=10):
-        """Fetch and extract content from a webpage"""
+        self.timeout = timeout or Config.CONTENT_FETCH_TIMEOUT
+        self.workers = workers or Config.CONTENT_FETCH_WORKERS
+        self.per_host = per_host or Config.CONTENT_FETCH_PER_HOST
+        self.deadline = Config.CONTENT_FETCH_DEADLINE if deadline is None else deadline
+        self.extractor = get_extractor(extractor or Config.CONTENT_EXTRACTOR)
+
+        # urllib3 keeps one pool per host, so per_host also caps the keep-alive connections kept per host
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.per_host)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # Extracted pages by URL; entries younger than max_age are served without a request,
+        # older ones are revalidated with If-None-Match / If-Modified-Since
+        self.page_cache = default_page_cache() if page_cache is None else page_cache
+        self.max_age = Config.PAGE_CACHE_MAX_AGE if max_age is None else max_age
+        self.revalidated = 0
+
+        self._executor = None
+        self._host_slots = {}
+        self._lock = threading.Lock()
+
+        # Async path: clients and semaphores belong to the loop that created them
+        self._async_loop = None
+        self._async_hosts = OrderedDict()
+        self._async_slots = None
+        self._closing = set()
+
+    def _host_slot(self, url):
+        """Semaphore limiting concurrent requests to the URL's host"""
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return slot
+
+    def _async_host(self, url):
+        """AsyncHost for the URL's host on the running loop; least recently used idle hosts beyond
+        ASYNC_HOST_CLIENTS are closed"""
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            self._async_hosts = OrderedDict()
+            # Caps open connections across all hosts
+            self._async_slots = asyncio.Semaphore(Config.ASYNC_MAX_CONNECTIONS)
+            self._async_loop = loop
+        host = urlsplit(url).netloc.lower()
+        entry = self._async_hosts.get(host)
+        if entry is None:
+            entry = self._async_hosts[host] = AsyncHost(self.headers, self.per_host)
+            idle = [name for name, other in self._async_hosts.items() if other.active == 0 and other is not entry]
+            for name in idle[:max(0, len(self._async_hosts) - Config.ASYNC_HOST_CLIENTS)]:
+                task = loop.create_task(self._async_hosts.pop(name).client.aclose())
+                self._closing.add(task)
+                task.add_done_callback(self._closing.discard)
+        self._async_hosts.move_to_end(host)
+        return entry
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='content-fetch')
+            return self._executor
+
+    def _cache_page(self, url, page, etag=None, last_modified=None):
+        if self.page_cache:
+            self.page_cache.set(url, {"page": page, "etag": etag, "last_modified": last_modified,
+                                      "checked_at": time.time()})
+
+    def fetch_page_content(self, url, timeout=None):
+        """Fetch and extract content from a webpage, served from the page cache while fresh"""
+        cached = self.page_cache.get(url) if self.page_cache else None
+        if cached and time.time() - cached["checked_at"] < self.max_age:
+            return cached["page"]
+
         try:
-            response = requests.get(url, headers=self.headers, timeout=timeout)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Remove script, style elements and comments
-            for element in soup(["script", "style", "nav", "footer", "header"]):
-                element.decompose()
-                
-            # Get text content and clean it
-            text = soup.get_text(separator=' ')
-            # Remove extra whitespace
-            text = re.sub(r'\s+', ' ', text).strip()
-            
-            # Get meta information
-            title = soup.title.string if soup.title else "No title"
-            meta_desc = ""
-            meta_desc_tag = soup.find("meta", attrs={"name": "description"})
-            if meta_desc_tag and "content" in meta_desc_tag.attrs:
-                meta_desc = meta_desc_tag["content"]
-                
-            # Get headings
-            headings = []
-            for heading in soup.find_all(["h1", "h2", "h3"]):
-                headings.append(heading.get_text())
-                
+            headers = dict(self.headers)
+            headers.update(self._validators(cached))
+            with self._host_slot(url), metrics.timed('page_fetch'):
+                response = self.session.get(url, headers=headers, timeout=timeout or self.timeout)
+            return self._page_from_response(url, cached, response)
+        except Exception as e:
+            logger.error(f"Error fetching content from {url}: {str(e)}")
             return {
                 "url": url,
-                "title": title,
-                "meta_description": meta_desc,
-                "headings": headings,
-                "content": text[:10000],  # Limit content length for Claude
-                "word_count": len(text.split())
+                "error": str(e),
+                "content": None
             }
+
+    @staticmethod
+    def _validators(cached):
+        """Conditional request headers for revalidating a cached page"""
+        headers = {}
+        if cached and cached["etag"]:
+            headers['If-None-Match'] = cached["etag"]
+        if cached and cached["last_modified"]:
+            headers['If-Modified-Since'] = cached["last_modified"]
+        return headers
+
+    def _page_from_response(self, url, cached, response):
+        """Extracted page for a requests or httpx response; raises on HTTP errors"""
+        if cached and response.status_code == 304:
+            # Unchanged upstream: keep the stored extraction, skip the parse
+            with self._lock:
+                self.revalidated += 1
+            self._cache_page(url, cached["page"], response.headers.get('ETag', cached["etag"]),
+                             response.headers.get('Last-Modified', cached["last_modified"]))
+            return cached["page"]
+        response.raise_for_status()
+
+        with metrics.timed('page_parse'):
+            page = self.extractor(url, response.text)
+        self._cache_page(url, page, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return page
+
+    async def fetch_page_content_async(self, url, timeout=None):
+        """fetch_page_content on the event loop; the page cache and parsing run via asyncio.to_thread"""
+        cached = await asyncio.to_thread(self.page_cache.get, url) if self.page_cache else None
+        if cached and time.time() - cached["checked_at"] < self.max_age:
+            return cached["page"]
+
+        host = self._async_host(url)
+        host.active += 1
+        try:
+            async with host.slots, self._async_slots:
+                with metrics.timed('page_fetch'):
+                    response = await host.client.get(url, headers=self._validators(cached),
+                                                      timeout=timeout or self.timeout)
+            return await asyncio.to_thread(self._page_from_response, url, cached, response)
         except Exception as e:
             logger.error(f"Error fetching content from {url}: {str(e)}")
             return {
@@ -55,11 +184,64 @@ class ContentService:
                 "error": str(e),
                 "content": None
             }
+        finally:
+            host.active -= 1
     
-    def fetch_multiple_pages(self, urls, limit=5):
-        """Fetch content from multiple pages"""
+    def cache_stats(self):
+        if not self.page_cache:
+            return None
+        stats = self.page_cache.stats()
+        stats.update({"max_age_seconds": self.max_age, "revalidated": self.revalidated})
+        return stats
+
+    def fetch_pages(self, urls, deadline=None):
+        """Fetch pages concurrently, returning results in input order.
+
+        Pages not finished within `deadline` seconds (CONTENT_FETCH_DEADLINE by
+        default) come back as error entries, so callers get partial results
+        instead of waiting for the slowest page.
+        """
+        if self.workers <= 1 or len(urls) <= 1:
+            return [self.fetch_page_content(url) for url in urls]
+
+        deadline = self.deadline if deadline is None else deadline
+        executor = self._get_executor()
+        # Copied contexts keep the fetch times on the calling request's metrics
+        futures = [executor.submit(contextvars.copy_context().run, self.fetch_page_content, url) for url in urls]
+        wait(futures, timeout=deadline or None)
+
         results = []
-        for url in urls[:limit]:  # Limit to first 5 URLs
-            content = self.fetch_page_content(url)
-            results.append(content)
-        return results 
\ No newline at end of file
+        for url, future in zip(urls, futures):
+            if future.done():
+                results.append(future.result())
+            else:
+                future.cancel()  # only stops fetches that haven't started; running ones end at their timeout
+                logger.warning(f"Fetching {url} exceeded the {deadline}s deadline")
+                results.append({"url": url, "error": f"Deadline of {deadline}s exceeded", "content": None})
+        return results
+
+    async def fetch_pages_async(self, urls, deadline=None):
+        """fetch_pages for coroutines: all pages at once (per-host limits apply), in input order.
+
+        Fetches still running at the deadline are cancelled outright, so no
+        sockets or threads stay busy behind the partial result.
+        """
+        deadline = self.deadline if deadline is None else deadline
+        tasks = [asyncio.ensure_future(self.fetch_page_content_async(url)) for url in urls]
+        if not tasks:
+            return []
+        done, _ = await asyncio.wait(tasks, timeout=deadline or None)
+
+        results = []
+        for url, task in zip(urls, tasks):
+            if task in done:
+                results.append(task.result())
+            else:
+                task.cancel()
+                logger.warning(f"Fetching {url} exceeded the {deadline}s deadline")
+                results.append({"url": url, "error": f"Deadline of {deadline}s exceeded", "content": None})
+        return results
+
+    def fetch_multiple_pages(self, urls, limit=5, deadline=None):
+        """Fetch content from multiple pages"""
+        return self.fetch_pages(urls[:limit], deadline=deadline)  # Limit to first 5 URLs 
\ No newline at end of file
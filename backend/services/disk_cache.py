@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class DiskCache:
+    """Persistent key/value cache for JSON-serializable values in a SQLite file.
+
+    Entries expire after `ttl` seconds and the least recently used ones are
+    evicted once more than `max_entries` are stored. Uses its own sqlite3
+    connection so it works outside the Flask app context and survives restarts.
+    """
+
+    def __init__(self, path, ttl=86400, max_entries=5000, namespace='default'):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.namespace = namespace
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entry ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " created_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))")
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_cache_entry_accessed ON cache_entry (namespace, accessed_at)")
+
+    @staticmethod
+    def make_key(*parts):
+        """Content address for JSON-serializable parts (sha256 of their canonical JSON)"""
+        canonical = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, created_at FROM cache_entry WHERE namespace = ? AND key = ?",
+                (self.namespace, key)).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                self.conn.execute("DELETE FROM cache_entry WHERE namespace = ? AND key = ?",
+                                  (self.namespace, key))
+                self.evictions += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE cache_entry SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                              (now, self.namespace, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        now = time.time()
+        payload = json.dumps(value)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache_entry (namespace, key, value, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)", (self.namespace, key, payload, now, now))
+            self._evict(now)
+
+    def _evict(self, now):
+        cursor = self.conn.execute("DELETE FROM cache_entry WHERE namespace = ? AND created_at < ?",
+                                   (self.namespace, now - self.ttl))
+        self.evictions += cursor.rowcount
+        count = self.conn.execute("SELECT COUNT(*) FROM cache_entry WHERE namespace = ?",
+                                  (self.namespace,)).fetchone()[0]
+        if count > self.max_entries:
+            cursor = self.conn.execute(
+                "DELETE FROM cache_entry WHERE namespace = ? AND key IN ("
+                " SELECT key FROM cache_entry WHERE namespace = ? ORDER BY accessed_at LIMIT ?)",
+                (self.namespace, self.namespace, count - self.max_entries))
+            self.evictions += cursor.rowcount
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM cache_entry WHERE namespace = ?", (self.namespace,))
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM cache_entry WHERE namespace = ?",
+                                        (self.namespace,)).fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,264 @@
+"""Columnar export of ranking history and the matching loader.
+
+An export is a directory:
+
+    manifest.json            columns, dtypes, parts and their keyword/time ranges
+    urls.json                {url_id: url} for every url id in the parts
+    part-00000/*.npy         one .npy per column (format 'npy', memory-mappable)
+    part-00000.npz           all columns in one file (format 'npz')
+    part-00000.parquet       all columns in one file (format 'parquet', needs pyarrow)
+
+Rows in a part are sorted by (keyword_id, timestamp); timestamps are epoch
+microseconds like RankingColumns.
+"""
+from datetime import datetime, timedelta
+import json
+import os
+import shutil
+import time
+import numpy as np
+
+from sqlalchemy import func, select
+from models.database import db, Keyword, Ranking, SerpSnapshot
+from services import snapshot_store
+from services.history import RankingColumns, reads_snapshots, to_epoch_us, url_strings
+
+FORMATS = ('npy', 'npz', 'parquet')
+COLUMNS = {'keyword_ids': '<i8', 'url_ids': '<i8', 'positions': '<i2', 'timestamps': '<i8'}
+MANIFEST_VERSION = 1
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("The parquet format needs pyarrow (pip install pyarrow); use 'npy' or 'npz' instead")
+    return pyarrow
+
+
+def iter_column_batches(keyword_ids, since=None, until=None, batch_size=50000):
+    """Yield RankingColumns batches for the given keywords, ordered by (keyword_id, timestamp).
+
+    Reads plain columns through a streaming cursor, never ORM objects.
+    """
+    if reads_snapshots():
+        query = select(SerpSnapshot.keyword_id, SerpSnapshot.timestamp, SerpSnapshot.payload)\
+            .where(SerpSnapshot.keyword_id.in_(keyword_ids))
+        query = _window(query, SerpSnapshot.timestamp, since, until)\
+            .order_by(SerpSnapshot.keyword_id, SerpSnapshot.timestamp)
+        # Roughly batch_size results per batch at 30 results per snapshot
+        result = db.session.execute(query.execution_options(yield_per=max(1, batch_size // 30)))
+        for batch in result.partitions():
+            packed = [snapshot_store.decode_snapshot(payload) for _, _, payload in batch]
+            lengths = np.array([len(p) for p in packed])
+            results = np.concatenate(packed)
+            yield RankingColumns(
+                np.repeat(np.array([keyword_id for keyword_id, _, _ in batch], dtype=np.int64), lengths),
+                results['url_id'].astype(np.int64),
+                results['position'].astype(np.int16),
+                np.repeat(to_epoch_us([timestamp for _, timestamp, _ in batch]), lengths))
+        return
+
+    query = select(Ranking.keyword_id, Ranking.url_id, Ranking.position, Ranking.timestamp)\
+        .where(Ranking.keyword_id.in_(keyword_ids))
+    query = _window(query, Ranking.timestamp, since, until).order_by(Ranking.keyword_id, Ranking.timestamp)
+    result = db.session.execute(query.execution_options(yield_per=batch_size))
+    for batch in result.partitions():
+        keyword_col, url_col, position_col, timestamp_col = zip(*batch)
+        yield RankingColumns(np.array(keyword_col, dtype=np.int64), np.array(url_col, dtype=np.int64),
+                             np.array(position_col, dtype=np.int16), to_epoch_us(timestamp_col))
+
+
+def _window(query, timestamp_col, since, until):
+    if since is not None:
+        query = query.where(timestamp_col >= since)
+    if until is not None:
+        query = query.where(timestamp_col < until)
+    return query
+
+
+def _time_windows(since, until, period_days):
+    if not period_days:
+        return [(since, until)]
+    if since is None:
+        timestamp_col = SerpSnapshot.timestamp if reads_snapshots() else Ranking.timestamp
+        since = db.session.execute(select(func.min(timestamp_col))).scalar()
+        if since is None:
+            return [(None, until)]
+    until = until or datetime.utcnow()
+    step = timedelta(days=period_days)
+    windows = []
+    start = since
+    while start < until:
+        windows.append((start, min(start + step, until)))
+        start += step
+    return windows
+
+
+def _write_part(path, name, columns, fmt):
+    arrays = {column: getattr(columns, column).astype(dtype, copy=False) for column, dtype in COLUMNS.items()}
+    if fmt == 'npy':
+        os.makedirs(os.path.join(path, name))
+        for column, values in arrays.items():
+            np.save(os.path.join(path, name, f"{column}.npy"), values)
+    elif fmt == 'npz':
+        np.savez_compressed(os.path.join(path, f"{name}.npz"), **arrays)
+    else:
+        pyarrow = require_pyarrow()
+        table = pyarrow.table({column: values for column, values in arrays.items()})
+        pyarrow.parquet.write_table(table, os.path.join(path, f"{name}.parquet"))
+
+
+def _concat(batches):
+    return RankingColumns(*(np.concatenate([getattr(b, column) for b in batches]) for column in COLUMNS))
+
+
+def _flush_part(path, fmt, batches, parts, url_ids):
+    """Write the batches read so far as the next part and record it in `parts`"""
+    columns = batches[0] if len(batches) == 1 else _concat(batches)
+    name = f"part-{len(parts):05d}"
+    _write_part(path, name, columns, fmt)
+    url_ids.update(np.unique(columns.url_ids).tolist())
+    parts.append({
+        "name": name,
+        "rows": len(columns),
+        "keyword_min": int(columns.keyword_ids[0]),
+        "keyword_max": int(columns.keyword_ids[-1]),
+        "timestamp_min": int(columns.timestamps.min()),
+        "timestamp_max": int(columns.timestamps.max())
+    })
+
+
+def export_rankings(path, keyword_ids=None, since=None, until=None, fmt='npy',
+                    keywords_per_part=500, period_days=None, batch_size=50000, rows_per_part=1000000,
+                    progress=None):
+    """Write ranking history to `path` as columnar parts; returns the manifest.
+
+    Parts hold up to `keywords_per_part` keywords each, further split into
+    `period_days` windows when given. Batches are written out as they are
+    read: a part is flushed once it reaches `rows_per_part` rows, so memory
+    stays around rows_per_part + batch_size rows whatever the window (a
+    keyword may then continue in the next part). `progress(fraction,
+    message)` is called after every keyword chunk (e.g. Job.update).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {FORMATS}")
+    if fmt == 'parquet':
+        require_pyarrow()
+    if keyword_ids is None:
+        keyword_ids = list(db.session.execute(select(Keyword.id).order_by(Keyword.id)).scalars())
+    keyword_ids = sorted(set(keyword_ids))
+    os.makedirs(path, exist_ok=True)
+
+    parts = []
+    url_ids = set()
+    chunks = [keyword_ids[i:i + keywords_per_part] for i in range(0, len(keyword_ids), keywords_per_part)]
+    for chunk_index, chunk in enumerate(chunks):
+        for start, end in _time_windows(since, until, period_days):
+            batches = []
+            rows = 0
+            for batch in iter_column_batches(chunk, start, end, batch_size):
+                batches.append(batch)
+                rows += len(batch)
+                if rows >= rows_per_part:
+                    _flush_part(path, fmt, batches, parts, url_ids)
+                    batches = []
+                    rows = 0
+            if batches:
+                _flush_part(path, fmt, batches, parts, url_ids)
+        if progress:
+            progress((chunk_index + 1) / len(chunks), f"Exported {chunk_index + 1}/{len(chunks)} keyword chunks")
+
+    with open(os.path.join(path, 'urls.json'), 'w') as f:
+        json.dump({str(url_id): url for url_id, url in sorted(url_strings(url_ids).items())}, f)
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "format": fmt,
+        "created_at": datetime.utcnow().isoformat(),
+        "since": since.isoformat() if since else None,
+        "until": until.isoformat() if until else None,
+        "keywords": len(keyword_ids),
+        "rows": sum(part["rows"] for part in parts),
+        "columns": COLUMNS,
+        "parts": parts
+    }
+    with open(os.path.join(path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def remove_export(path):
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def sweep_exports(root, max_age):
+    """Delete export directories under `root` last modified more than `max_age` seconds ago.
+
+    Catches exports whose job is gone without an eviction, e.g. after a restart.
+    """
+    if not max_age or not os.path.isdir(root):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for entry in os.scandir(root):
+        if entry.is_dir() and entry.stat().st_mtime < cutoff:
+            remove_export(entry.path)
+            removed += 1
+    return removed
+
+
+class ColumnarExport:
+    """Reader for an export directory; 'npy' parts are memory-mapped, so slicing keywords copies nothing"""
+
+    def __init__(self, path, mmap=True):
+        self.path = path
+        self.mmap_mode = 'r' if mmap else None
+        with open(os.path.join(path, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        self._urls = None
+
+    @property
+    def urls(self):
+        """{url_id: url}"""
+        if self._urls is None:
+            with open(os.path.join(self.path, 'urls.json')) as f:
+                self._urls = {int(url_id): url for url_id, url in json.load(f).items()}
+        return self._urls
+
+    def read_part(self, part):
+        name = part["name"]
+        fmt = self.manifest["format"]
+        if fmt == 'npy':
+            return RankingColumns(*(np.load(os.path.join(self.path, name, f"{column}.npy"), mmap_mode=self.mmap_mode)
+                                    for column in COLUMNS))
+        if fmt == 'npz':
+            with np.load(os.path.join(self.path, f"{name}.npz")) as data:
+                return RankingColumns(*(data[column] for column in COLUMNS))
+        table = require_pyarrow().parquet.read_table(os.path.join(self.path, f"{name}.parquet"))
+        return RankingColumns(*(table.column(column).to_numpy() for column in COLUMNS))
+
+    def iter_parts(self):
+        for part in self.manifest["parts"]:
+            yield self.read_part(part)
+
+    def load_keywords(self, keyword_ids):
+        """RankingColumns for the given keywords, oldest first within each keyword"""
+        wanted = sorted(set(keyword_ids))
+        pieces = []
+        for part in self.manifest["parts"]:
+            if not any(part["keyword_min"] <= kid <= part["keyword_max"] for kid in wanted):
+                continue
+            columns = self.read_part(part)
+            # Parts are sorted by keyword, so each keyword is one contiguous slice
+            starts = np.searchsorted(columns.keyword_ids, wanted, side='left')
+            ends = np.searchsorted(columns.keyword_ids, wanted, side='right')
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                if end > start:
+                    pieces.append(columns.select(slice(start, end)))
+        if not pieces:
+            return RankingColumns(*(np.zeros(0, dtype=dtype) for dtype in COLUMNS.values()))
+        if len(pieces) == 1:
+            return pieces[0]
+        return _concat(pieces)
@@ -0,0 +1,184 @@
+"""Page content extractors for ContentService.
+
+Each extractor is a callable (url, html) -> dict with the keys ContentService
+returns: url, title, meta_description, headings, content (capped at
+CONTENT_LIMIT characters) and word_count.
+"""
+from html import unescape
+from html.parser import HTMLParser
+import re
+
+from bs4 import BeautifulSoup
+
+CONTENT_LIMIT = 10000  # characters of page text sent to Claude
+SKIPPED_TAGS = {"script", "style", "nav", "footer", "header"}
+HEADING_TAGS = {"h1", "h2", "h3"}
+
+
+def extract_with_soup(url, html):
+    """Reference extractor: full BeautifulSoup tree, then get_text over it"""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Remove script, style elements and comments
+    for element in soup(["script", "style", "nav", "footer", "header"]):
+        element.decompose()
+
+    # Get text content and clean it
+    text = soup.get_text(separator=' ')
+    # Remove extra whitespace
+    text = re.sub(r'\s+', ' ', text).strip()
+
+    # Get meta information
+    title = soup.title.string if soup.title else "No title"
+    meta_desc = ""
+    meta_desc_tag = soup.find("meta", attrs={"name": "description"})
+    if meta_desc_tag and "content" in meta_desc_tag.attrs:
+        meta_desc = meta_desc_tag["content"]
+
+    # Get headings
+    headings = []
+    for heading in soup.find_all(["h1", "h2", "h3"]):
+        headings.append(heading.get_text())
+
+    return {
+        "url": url,
+        "title": str(title) if title is not None else None,
+        "meta_description": meta_desc,
+        "headings": headings,
+        "content": text[:CONTENT_LIMIT],  # Limit content length for Claude
+        "word_count": len(text.split())
+    }
+
+
+# Used on the unparsed remainder once the streaming extractor has its content budget
+_SKIPPED_BLOCK = re.compile(r'<(script|style|nav|footer|header)\b.*?</\1\s*>', re.S | re.I)
+_COMMENT = re.compile(r'<!--.*?-->', re.S)
+_HEADING = re.compile(r'<(h[1-3])\b[^>]*>(.*?)</\1\s*>', re.S | re.I)
+_TAG = re.compile(r'<[^>]*>')
+
+
+class StreamingExtractor(HTMLParser):
+    """Single pass over the token stream without building a tree.
+
+    Text from skipped elements is dropped as it streams past, and words are
+    collected directly, so joining them gives the same whitespace-collapsed
+    text as extract_with_soup. With stop_early, parsing ends once the content
+    budget is filled; word_count and headings for the rest of the page then
+    come from a regex scan of the remaining markup.
+    """
+
+    def __init__(self, limit=CONTENT_LIMIT, stop_early=True):
+        super().__init__(convert_charrefs=True)
+        self.limit = limit
+        self.stop_early = stop_early
+        self.words = []
+        self.text_length = -1  # length of ' '.join(words)
+        self.skip_depth = 0
+        self.title_parts = None
+        self.in_title = False
+        self.meta_description = None
+        self.headings = []
+        self.open_headings = []
+
+    @property
+    def full(self):
+        return self.text_length >= self.limit
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self.skip_depth += 1
+        elif self.skip_depth:
+            return
+        elif tag in HEADING_TAGS:
+            self.headings.append([])
+            self.open_headings.append((tag, self.headings[-1]))
+        elif tag == 'title' and self.title_parts is None:
+            self.title_parts = []
+            self.in_title = True
+        elif tag == 'meta' and self.meta_description is None:
+            attrs = dict(attrs)
+            if attrs.get('name') == 'description':
+                self.meta_description = attrs.get('content') or ""
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif self.skip_depth:
+            return
+        elif tag == 'title':
+            self.in_title = False
+        elif tag in HEADING_TAGS:
+            for idx in range(len(self.open_headings) - 1, -1, -1):
+                if self.open_headings[idx][0] == tag:
+                    del self.open_headings[idx:]
+                    break
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        if self.in_title:
+            self.title_parts.append(data)
+        for _, parts in self.open_headings:
+            parts.append(data)
+        for word in data.split():
+            self.words.append(word)
+            self.text_length += len(word) + 1
+
+    def scan_rest(self, markup):
+        """Count words and collect headings in markup the parser never saw"""
+        markup = _COMMENT.sub(' ', markup)
+        markup = _SKIPPED_BLOCK.sub(' ', markup)
+        for _, inner in _HEADING.findall(markup):
+            self.headings.append([unescape(_TAG.sub('', inner))])
+        return len(unescape(_TAG.sub(' ', markup)).split())
+
+    def extract(self, url, html, chunk_size=16384):
+        pos = 0
+        rest_words = 0
+        while pos < len(html):
+            # Cut chunks at a tag boundary so text nodes reach handle_data whole
+            end = html.find('<', pos + chunk_size)
+            end = len(html) if end < 0 else end
+            self.feed(html[pos:end])
+            pos = end
+            if self.stop_early and self.full and pos < len(html):
+                rest_words = self.scan_rest(self.rawdata + html[pos:])
+                break
+        else:
+            self.close()
+
+        if self.title_parts is None:
+            title = "No title"
+        else:
+            title = self.title_parts[0] if len(self.title_parts) == 1 else None
+        return {
+            "url": url,
+            "title": title,
+            "meta_description": self.meta_description or "",
+            "headings": [''.join(parts) for parts in self.headings],
+            "content": ' '.join(self.words)[:self.limit],
+            "word_count": len(self.words) + rest_words
+        }
+
+
+def extract_streaming(url, html):
+    return StreamingExtractor().extract(url, html)
+
+
+def extract_streaming_full(url, html):
+    """Streaming extractor without the early stop; matches extract_with_soup field for field"""
+    return StreamingExtractor(stop_early=False).extract(url, html)
+
+
+EXTRACTORS = {
+    'soup': extract_with_soup,
+    'streaming': extract_streaming,
+    'streaming_full': extract_streaming_full,
+}
+
+
+def get_extractor(name):
+    try:
+        return EXTRACTORS[name]
+    except KeyError:
+        raise ValueError(f"Unknown content extractor {name!r}; expected one of {sorted(EXTRACTORS)}")
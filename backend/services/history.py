@@ -0,0 +1,221 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+import numpy as np
+
+from sqlalchemy import func, select, tuple_
+from config import Config
+from models.database import db, Ranking, SerpSnapshot, Url
+from services import snapshot_store
+
+RankingRow = namedtuple('RankingRow', ['keyword_id', 'url', 'position', 'timestamp'])
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class RankingColumns:
+    """Flat ranking history as parallel NumPy arrays (timestamps in epoch microseconds)"""
+    __slots__ = ('keyword_ids', 'url_ids', 'positions', 'timestamps')
+
+    def __init__(self, keyword_ids, url_ids, positions, timestamps):
+        self.keyword_ids = keyword_ids  # int64
+        self.url_ids = url_ids          # int64
+        self.positions = positions      # int16
+        self.timestamps = timestamps    # int64
+
+    def __len__(self):
+        return len(self.positions)
+
+    def select(self, mask):
+        return RankingColumns(self.keyword_ids[mask], self.url_ids[mask],
+                              self.positions[mask], self.timestamps[mask])
+
+
+def reads_snapshots():
+    """True when ranking history is read from packed SerpSnapshot rows"""
+    return Config.RANKING_STORAGE == 'snapshots'
+
+
+def writes_rows():
+    return Config.RANKING_STORAGE in ('rows', 'dual')
+
+
+def writes_snapshots():
+    return Config.RANKING_STORAGE in ('snapshots', 'dual')
+
+
+def window_start(days, now=None):
+    """Start of a prediction window of `days` ending now.
+
+    With daily resampling (PREDICTION_RESAMPLE) the window is widened to
+    the start of its first UTC day, so no day is cut in half.
+    """
+    since = (now or datetime.utcnow()) - timedelta(days=days)
+    if Config.PREDICTION_RESAMPLE.lower() not in ('', 'none'):
+        since = datetime.combine(since.date(), datetime.min.time())
+    return since
+
+
+def to_epoch_us(datetimes):
+    """Convert datetimes to int64 epoch microseconds, converting each distinct value once"""
+    cache = {}
+    for value in datetimes:
+        if value not in cache:
+            cache[value] = (value - EPOCH) // MICROSECOND
+    return np.fromiter((cache[value] for value in datetimes), dtype=np.int64, count=len(datetimes))
+
+
+def url_strings(url_ids, chunk_size=500):
+    """{url_id: url} for the given ids"""
+    url_ids = list({int(url_id) for url_id in url_ids})
+    urls = {}
+    for start in range(0, len(url_ids), chunk_size):
+        chunk = url_ids[start:start + chunk_size]
+        urls.update(db.session.execute(select(Url.id, Url.url).where(Url.id.in_(chunk))).all())
+    return urls
+
+
+def load_columns(keyword_ids, since=None):
+    """Ranking history of the given keywords as RankingColumns, newest first"""
+    if reads_snapshots():
+        snapshots = snapshot_store.load_snapshots(keyword_ids, since)
+        if not snapshots:
+            return _empty_columns()
+        lengths = np.array([len(packed) for _, _, packed in snapshots])
+        packed = np.concatenate([packed for _, _, packed in snapshots])
+        return RankingColumns(
+            np.repeat(np.array([keyword_id for keyword_id, _, _ in snapshots], dtype=np.int64), lengths),
+            packed['url_id'].astype(np.int64),
+            packed['position'].copy(),
+            np.repeat(to_epoch_us([timestamp for _, timestamp, _ in snapshots]), lengths))
+
+    query = select(Ranking.keyword_id, Ranking.url_id, Ranking.position, Ranking.timestamp)\
+        .where(Ranking.keyword_id.in_(keyword_ids))
+    if since is not None:
+        query = query.where(Ranking.timestamp >= since)
+    rows = db.session.execute(query.order_by(Ranking.timestamp.desc())).all()
+    if not rows:
+        return _empty_columns()
+    keyword_col, url_col, position_col, timestamp_col = zip(*rows)
+    return RankingColumns(np.array(keyword_col, dtype=np.int64), np.array(url_col, dtype=np.int64),
+                          np.array(position_col, dtype=np.int16), to_epoch_us(timestamp_col))
+
+
+def _empty_columns():
+    return RankingColumns(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                          np.zeros(0, dtype=np.int16), np.zeros(0, dtype=np.int64))
+
+
+def load_rankings(keyword_ids, since=None):
+    """Ranking history of the given keywords as RankingRow tuples, newest first"""
+    if reads_snapshots():
+        snapshots = snapshot_store.load_snapshots(keyword_ids, since)
+        urls = url_strings(np.concatenate([packed['url_id'] for _, _, packed in snapshots])) if snapshots else {}
+        return [RankingRow(keyword_id, urls[url_id], position, timestamp)
+                for keyword_id, timestamp, packed in snapshots
+                for url_id, position in packed.tolist()]
+
+    query = select(Ranking.keyword_id, Url.url, Ranking.position, Ranking.timestamp)\
+        .join(Url, Url.id == Ranking.url_id)\
+        .where(Ranking.keyword_id.in_(keyword_ids))
+    if since is not None:
+        query = query.where(Ranking.timestamp >= since)
+    return [RankingRow(*row) for row in db.session.execute(query.order_by(Ranking.timestamp.desc()))]
+
+
+def iter_ranking_records(keyword_id, since=None, after=None, limit=None, newest_first=True, batch_size=1000):
+    """Yield (cursor_key, record) for one keyword in (timestamp, id) keyset order.
+
+    Records have the Ranking.to_dict() shape and are read through a streaming
+    cursor in batches of `batch_size`, so memory doesn't grow with the window.
+    `after` is a cursor_key from a previous call; iteration resumes just past it.
+    In snapshot storage the key is (timestamp, snapshot id), record ids are None,
+    and a page only ends on a snapshot boundary, so it may exceed `limit`.
+    """
+    if reads_snapshots():
+        yield from _iter_snapshot_records(keyword_id, since, after, limit, newest_first, batch_size)
+        return
+
+    query = select(Ranking.id, Ranking.keyword_id, Url.url, Ranking.position, Ranking.timestamp)\
+        .select_from(Ranking).join(Url, Url.id == Ranking.url_id)\
+        .where(Ranking.keyword_id == keyword_id)
+    query = _keyset(query, Ranking.timestamp, Ranking.id, since, after, newest_first)
+    if limit is not None:
+        query = query.limit(limit)
+    for row in db.session.execute(query.execution_options(yield_per=batch_size)):
+        yield (row.timestamp, row.id), {
+            'id': row.id,
+            'keyword_id': row.keyword_id,
+            'url': row.url,
+            'position': row.position,
+            'timestamp': row.timestamp.isoformat()
+        }
+
+
+def _keyset(query, timestamp_col, id_col, since, after, newest_first):
+    if since is not None:
+        query = query.where(timestamp_col >= since)
+    if after is not None:
+        key = tuple_(timestamp_col, id_col)
+        query = query.where(key < tuple_(*after) if newest_first else key > tuple_(*after))
+    if newest_first:
+        return query.order_by(timestamp_col.desc(), id_col.desc())
+    return query.order_by(timestamp_col, id_col)
+
+
+def _iter_snapshot_records(keyword_id, since, after, limit, newest_first, batch_size):
+    query = select(SerpSnapshot.id, SerpSnapshot.timestamp, SerpSnapshot.payload)\
+        .where(SerpSnapshot.keyword_id == keyword_id)
+    query = _keyset(query, SerpSnapshot.timestamp, SerpSnapshot.id, since, after, newest_first)
+    rows = db.session.execute(query.execution_options(yield_per=max(1, batch_size // 30)))
+
+    emitted = 0
+    for batch in rows.partitions():
+        decoded = [(snapshot_id, timestamp, snapshot_store.decode_snapshot(payload))
+                   for snapshot_id, timestamp, payload in batch]
+        urls = url_strings(np.concatenate([packed['url_id'] for _, _, packed in decoded]))
+        for snapshot_id, timestamp, packed in decoded:
+            stamp = timestamp.isoformat()
+            for url_id, position in packed.tolist():
+                yield (timestamp, snapshot_id), {
+                    'id': None,
+                    'keyword_id': keyword_id,
+                    'url': urls[url_id],
+                    'position': position,
+                    'timestamp': stamp
+                }
+            emitted += len(packed)
+            if limit is not None and emitted >= limit:
+                return
+
+
+def latest_timestamp(keyword_id):
+    """Timestamp of the newest stored ranking for a keyword, or None"""
+    if reads_snapshots():
+        query = select(func.max(SerpSnapshot.timestamp)).where(SerpSnapshot.keyword_id == keyword_id)
+    else:
+        query = select(func.max(Ranking.timestamp)).where(Ranking.keyword_id == keyword_id)
+    return db.session.execute(query).scalar()
+
+
+def with_url_strings(predictions):
+    """Re-key {url_id: prediction} by URL string"""
+    urls = url_strings(predictions)
+    return {urls[url_id]: prediction for url_id, prediction in predictions.items()}
+
+
+def latest_urls(keyword_id, limit=10):
+    """URLs of the most recent rankings for a keyword, best position first within a snapshot"""
+    if reads_snapshots():
+        snapshots = snapshot_store.load_snapshots([keyword_id], limit=1)
+        if not snapshots:
+            return []
+        packed = np.sort(snapshots[0][2], order='position')[:limit]
+        urls = url_strings(packed['url_id'])
+        return [urls[url_id] for url_id in packed['url_id'].tolist()]
+
+    query = select(Url.url).select_from(Ranking).join(Url, Url.id == Ranking.url_id)\
+        .where(Ranking.keyword_id == keyword_id)\
+        .order_by(Ranking.timestamp.desc(), Ranking.position)\
+        .limit(limit)
+    return list(db.session.execute(query).scalars())
@@ -0,0 +1,142 @@
+from collections import OrderedDict
+from datetime import datetime
+import threading
+
+from sqlalchemy import insert, select
+from models.database import db, Ranking, Url
+from services import snapshot_store
+from services.history import writes_rows, writes_snapshots
+from services import ranking_stats
+from services.series_store import series_store
+
+
+class UrlInterner:
+    """Maps URL strings to Url ids, keeping the most recently used ids in memory.
+
+    Unknown URLs are looked up and inserted in bulk, so a snapshot whose URLs
+    are all cached costs no extra queries.
+    """
+
+    def __init__(self, max_size=100000, chunk_size=500):
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self.ids = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _lookup(self, urls):
+        found = {}
+        for start in range(0, len(urls), self.chunk_size):
+            chunk = urls[start:start + self.chunk_size]
+            found.update(db.session.execute(select(Url.url, Url.id).where(Url.url.in_(chunk))).all())
+        return found
+
+    def get_ids(self, urls):
+        """Return {url: id} for the given URLs, creating Url rows for new ones"""
+        result = {}
+        with self.lock:
+            for url in urls:
+                url_id = self.ids.get(url)
+                if url_id is not None:
+                    self.ids.move_to_end(url)
+                    result[url] = url_id
+
+        missing = list({url for url in urls if url not in result})
+        if missing:
+            found = self._lookup(missing)
+            new = [url for url in missing if url not in found]
+            if new:
+                # OR IGNORE lets concurrent ingests race on the same new URL
+                db.session.execute(insert(Url).prefix_with('OR IGNORE', dialect='sqlite'),
+                                   [{"url": url} for url in new])
+                found.update(self._lookup(new))
+            result.update(found)
+
+            with self.lock:
+                self.ids.update(found)
+                while len(self.ids) > self.max_size:
+                    self.ids.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self.lock:
+            self.ids.clear()
+
+
+url_interner = UrlInterner()
+
+# Callables run with the set of keyword ids after every ingest (cache invalidation etc.)
+ingest_listeners = []
+
+
+def on_ingest(listener):
+    """Register listener(keyword_ids) to run after rankings are written; usable as a decorator"""
+    ingest_listeners.append(listener)
+    return listener
+
+
+def snapshot_rows(keyword_id, organic_results, timestamp):
+    """(keyword_id, url, position, timestamp) for one SERP snapshot; position is the 1-based index"""
+    return [
+        (keyword_id, result['url'], idx, timestamp)
+        for idx, result in enumerate(organic_results, 1)
+        if result.get('url')
+    ]
+
+
+def ingest_snapshots(snapshots, commit=True):
+    """Write many SERP snapshots with a single executemany insert.
+
+    Depending on RANKING_STORAGE this writes one Ranking row per result,
+    one packed SerpSnapshot row per snapshot, or both.
+
+    `snapshots` is an iterable of (keyword_id, organic_results, timestamp)
+    tuples; a None timestamp means now. Returns the number of rows written.
+    With commit=False the caller owns the transaction and must call
+    url_interner.clear() if it rolls back.
+    """
+    now = datetime.utcnow()
+    grouped = [snapshot_rows(keyword_id, organic_results, timestamp or now)
+               for keyword_id, organic_results, timestamp in snapshots]
+    rows = [row for group in grouped for row in group]
+    if not rows:
+        return 0
+
+    try:
+        url_ids = url_interner.get_ids([url for _, url, _, _ in rows])
+        if writes_rows():
+            db.session.execute(insert(Ranking), [
+                {"keyword_id": keyword_id, "url_id": url_ids[url], "position": position, "timestamp": timestamp}
+                for keyword_id, url, position, timestamp in rows
+            ])
+        if writes_snapshots():
+            snapshot_store.write_snapshots([
+                (group[0][0], group[0][3], [url_ids[url] for _, url, _, _ in group],
+                 [position for _, _, position, _ in group])
+                for group in grouped if group
+            ])
+        if ranking_stats.stats_enabled():
+            ranking_stats.record_rankings([(keyword_id, url_ids[url], position, timestamp)
+                                           for keyword_id, url, position, timestamp in rows])
+        if commit:
+            db.session.commit()
+    except Exception:
+        # Ids of URLs inserted in the failed transaction must not outlive it
+        db.session.rollback()
+        url_interner.clear()
+        raise
+
+    keyword_ids = {row[0] for row in rows}
+    if commit:
+        series_store.append([(keyword_id, url_ids[url], position, timestamp)
+                             for keyword_id, url, position, timestamp in rows])
+    else:
+        # The caller may still roll back; resident keywords reload on their next read
+        series_store.invalidate_keywords(keyword_ids)
+    for listener in ingest_listeners:
+        listener(keyword_ids)
+    return len(rows)
+
+
+def ingest_snapshot(keyword_id, organic_results, timestamp=None, commit=True):
+    """Write one SERP snapshot for a keyword; returns the number of rows written"""
+    return ingest_snapshots([(keyword_id, organic_results, timestamp)], commit=commit)
@@ -0,0 +1,216 @@
+from collections import OrderedDict
+from datetime import datetime
+import asyncio
+import logging
+import queue
+import threading
+import traceback
+import uuid
+
+from services.async_runner import async_runner
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """A unit of background work and its observable state"""
+
+    def __init__(self, kind, fn, args, kwargs):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.status = 'queued'
+        self.progress = 0.0
+        self.message = None
+        self.result = None
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return self.status in ('succeeded', 'failed')
+
+    def update(self, progress=None, message=None):
+        """Report progress (0..1) and an optional status message from inside the job"""
+        if progress is not None:
+            self.progress = max(0.0, min(1.0, float(progress)))
+        if message is not None:
+            self.message = message
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class JobQueue:
+    """In-process job queue with a fixed pool of worker threads.
+
+    Jobs run inside the Flask app context, so they can use db.session like a
+    request handler does. Job functions are called as fn(job, *args, **kwargs)
+    and their return value becomes the job result. Finished jobs are kept
+    (oldest evicted first) so clients can poll for results.
+
+    submit_async takes a coroutine function instead; it runs on the shared
+    event loop (services.async_runner) without a worker thread, at most
+    `async_concurrency` at a time, and does its database work through
+    run_blocking.
+    """
+
+    def __init__(self, app=None, workers=4, max_jobs=1000, async_concurrency=256, runner=None):
+        self.app = None
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.async_concurrency = async_concurrency
+        self.runner = runner or async_runner
+        self._async_slots = None
+        self.jobs = OrderedDict()
+        self.evict_listeners = []
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.threads = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('JOB_WORKERS', self.workers)
+        self.max_jobs = app.config.get('JOB_RETENTION', self.max_jobs)
+        self.async_concurrency = app.config.get('ASYNC_JOB_CONCURRENCY', self.async_concurrency)
+        app.extensions['job_queue'] = self
+
+    def _ensure_workers(self):
+        # Threads start lazily so importing the app (or the reloader parent) spawns nothing
+        with self.lock:
+            self.threads = [t for t in self.threads if t.is_alive()]
+            for _ in range(self.workers - len(self.threads)):
+                thread = threading.Thread(target=self._work, name='job-worker', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def on_evict(self, listener):
+        """Register listener(job) to run when a finished job is dropped (e.g. to delete its files)"""
+        self.evict_listeners.append(listener)
+        return listener
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.done]
+        return [self.jobs.pop(job_id) for job_id in finished[:max(0, len(self.jobs) - self.max_jobs)]]
+
+    def _add(self, kind, fn, args, kwargs):
+        job = Job(kind, fn, args, kwargs)
+        with self.lock:
+            self.jobs[job.id] = job
+            evicted = self._evict()
+        for old in evicted:
+            for listener in self.evict_listeners:
+                try:
+                    listener(old)
+                except Exception as e:
+                    logger.error(f"Evict listener failed for job {old.id}: {e}")
+        return job
+
+    def submit(self, kind, fn, *args, **kwargs):
+        """Queue fn(job, *args, **kwargs) and return the Job right away"""
+        job = self._add(kind, fn, args, kwargs)
+        self._ensure_workers()
+        self.queue.put(job)
+        return job
+
+    def submit_async(self, kind, fn, *args, **kwargs):
+        """Schedule `await fn(job, *args, **kwargs)` on the event loop and return the Job right away"""
+        job = self._add(kind, fn, args, kwargs)
+        self.runner.submit(self._run_async(job))
+        return job
+
+    async def run_blocking(self, fn, *args, **kwargs):
+        """Await fn(*args, **kwargs) run on the loop's executor inside the app context (e.g. DB work)"""
+        def call():
+            with self.app.app_context():
+                return fn(*args, **kwargs)
+        return await asyncio.to_thread(call)
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def stats(self):
+        with self.lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        counts['workers'] = len(self.threads)
+        counts['async_in_flight'] = self.runner.in_flight
+        return counts
+
+    @staticmethod
+    def _start(job):
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+
+    @staticmethod
+    def _succeed(job, result):
+        job.result = result
+        job.progress = 1.0
+        job.status = 'succeeded'
+
+    @staticmethod
+    def _fail(job, e):
+        logger.error(f"Job {job.id} ({job.kind}) failed: {e}\n{traceback.format_exc()}")
+        job.error = str(e)
+        job.status = 'failed'
+
+    @staticmethod
+    def _finish(job, stages):
+        job.finished_at = datetime.utcnow()
+        metrics.observe_job(job, stages)
+
+    def _run(self, job):
+        self._start(job)
+        with metrics.breakdown() as stages:
+            try:
+                with self.app.app_context():
+                    result = job.fn(job, *job.args, **job.kwargs)
+                self._succeed(job, result)
+            except Exception as e:
+                self._fail(job, e)
+            finally:
+                self._finish(job, stages)
+
+    async def _run_async(self, job):
+        if self._async_slots is None:  # created on the loop that uses it
+            self._async_slots = asyncio.Semaphore(self.async_concurrency)
+        async with self._async_slots:
+            self._start(job)
+            with metrics.breakdown() as stages:
+                try:
+                    self._succeed(job, await job.fn(job, *job.args, **job.kwargs))
+                except Exception as e:
+                    self._fail(job, e)
+                finally:
+                    self._finish(job, stages)
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            try:
+                self._run(job)
+            finally:
+                self.queue.task_done()
+
+
+job_queue = JobQueue()
@@ -0,0 +1,223 @@
+"""Latency histograms for requests, jobs and the stages inside them, in Prometheus text format.
+
+Stages are the places time usually goes: SQL statements (timed by
+SQLAlchemy cursor events), SerpAPI calls, page fetches and parsing,
+predictor fits and Claude calls. Every stage call is observed globally;
+calls made while a request or job is running are also summed per
+request/job, so /metrics shows e.g. how much SQL time a /predict request
+adds up to. The per-request sums follow contextvars, i.e. the handling
+thread or task and anything it starts through asyncio.to_thread or a
+copied context; concurrent calls add up, so a stage can exceed the
+request's wall time.
+
+Request durations are taken when the view returns, so streamed bodies
+(NDJSON, exports) only count their setup.
+"""
+from contextlib import contextmanager
+import contextvars
+import threading
+import time
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import Config
+
+PREFIX = 'rankflux'
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# {stage: seconds} of the request or job running in the current context, or None
+_stage_totals = contextvars.ContextVar('stage_totals', default=None)
+_totals_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, le=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Thread-safe cumulative histogram with one series per label tuple"""
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}  # labels -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self.lock:
+            snapshot = {labels: list(series) for labels, series in self.series.items()}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, bound)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, '+Inf')} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-2]!r}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+    def reset(self):
+        with self.lock:
+            self.series.clear()
+
+
+class Metrics:
+    """Request, job and stage histograms plus the hooks that fill them"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.requests = Histogram(f'{PREFIX}_request_duration_seconds', "HTTP request duration",
+                                  ('method', 'endpoint', 'status'))
+        self.stages = Histogram(f'{PREFIX}_stage_duration_seconds', "Duration of each timed call, by stage",
+                                ('stage',))
+        self.request_stages = Histogram(f'{PREFIX}_request_stage_seconds',
+                                        "Time one request spent in each stage (summed over its calls)",
+                                        ('endpoint', 'stage'))
+        self.jobs = Histogram(f'{PREFIX}_job_duration_seconds', "Background job run time", ('kind', 'status'))
+        self.job_waits = Histogram(f'{PREFIX}_job_wait_seconds', "Time a job spent queued before it started",
+                                   ('kind',))
+        self.job_stages = Histogram(f'{PREFIX}_job_stage_seconds',
+                                    "Time one job spent in each stage (summed over its calls)", ('kind', 'stage'))
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS', self.enabled)
+        app.extensions['metrics'] = self
+        if not self.enabled:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(Engine, 'handle_error', _handle_error)
+
+    def observe_stage(self, stage, seconds):
+        if not self.enabled:
+            return
+        self.stages.observe(seconds, stage)
+        totals = _stage_totals.get()
+        if totals is not None:
+            with _totals_lock:
+                totals[stage] = totals.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def timed(self, stage):
+        """Time the block as one call of `stage`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - start)
+
+    @contextmanager
+    def breakdown(self):
+        """Sum the stage time spent inside the block into the dict it yields"""
+        totals = {}
+        token = _stage_totals.set(totals)
+        try:
+            yield totals
+        finally:
+            _stage_totals.reset(token)
+
+    def observe_job(self, job, stages):
+        if not self.enabled or job.started_at is None:
+            return
+        self.job_waits.observe((job.started_at - job.created_at).total_seconds(), job.kind)
+        self.jobs.observe((job.finished_at - job.started_at).total_seconds(), job.kind, job.status)
+        for stage, seconds in stages.items():
+            self.job_stages.observe(seconds, job.kind, stage)
+
+    def _before_request(self):
+        if not self.enabled:
+            return
+        g.metrics_start = time.perf_counter()
+        g.metrics_stages = {}
+        g.metrics_token = _stage_totals.set(g.metrics_stages)
+
+    def _after_request(self, response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            self.requests.observe(time.perf_counter() - start, request.method, endpoint, str(response.status_code))
+            with _totals_lock:
+                stages = dict(g.metrics_stages)
+            for stage, seconds in stages.items():
+                self.request_stages.observe(seconds, endpoint, stage)
+        return response
+
+    def _teardown_request(self, exc):
+        token = g.pop('metrics_token', None)
+        if token is not None:
+            _stage_totals.reset(token)
+
+    def render(self, gauges=None):
+        """All histograms, plus `gauges` ({section: {name: number}}, e.g. cache stats) as gauges"""
+        lines = []
+        for histogram in (self.requests, self.request_stages, self.stages, self.jobs, self.job_waits,
+                          self.job_stages):
+            lines.extend(histogram.render())
+        for section, values in sorted((gauges or {}).items()):
+            for name, value in sorted((values or {}).items()):
+                if isinstance(value, bool):
+                    value = int(value)
+                if not isinstance(value, (int, float)):
+                    continue
+                metric = f"{PREFIX}_{section}_{name}"
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        for histogram in (self.requests, self.request_stages, self.stages, self.jobs, self.job_waits,
+                          self.job_stages):
+            histogram.reset()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if metrics.enabled:
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_query_start')
+    if starts:
+        metrics.observe_stage('sql', time.perf_counter() - starts.pop())
+
+
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get('metrics_query_start') \
+        if exception_context.connection is not None else None
+    if starts:
+        metrics.observe_stage('sql', time.perf_counter() - starts.pop())
+
+
+metrics = Metrics(enabled=Config.METRICS)
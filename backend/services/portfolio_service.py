@@ -0,0 +1,65 @@
+from datetime import datetime
+import logging
+
+from sqlalchemy import select
+from config import Config
+from models.database import db, Keyword
+from services.batch_predictor import BatchRankingPredictor
+from services.history import load_columns, url_strings, window_start
+from services.metrics import metrics
+from services.prediction_pool import prediction_pool
+
+logger = logging.getLogger(__name__)
+
+
+class PortfolioPredictionService:
+    """Predictions for many keywords at once, loaded with set-based queries"""
+
+    def __init__(self, chunk_size=None, workers=None, volatility_threshold=2.0, pool=None):
+        self.chunk_size = chunk_size or Config.BULK_PREDICTION_CHUNK_SIZE
+        self.pool = pool or prediction_pool
+        self.workers = workers
+        self.predictor = BatchRankingPredictor(volatility_threshold=volatility_threshold,
+                                               resample=Config.PREDICTION_RESAMPLE, model=Config.PREDICTION_MODEL)
+
+    def load_keywords(self, keyword_ids=None):
+        """Return [(id, term)] for the requested keywords, or all of them"""
+        query = select(Keyword.id, Keyword.term).order_by(Keyword.id)
+        if keyword_ids:
+            query = query.where(Keyword.id.in_(keyword_ids))
+        return [tuple(row) for row in db.session.execute(query)]
+
+    def predict_chunk(self, columns, days_ahead=7, current_date=None, workers=None, model=None):
+        """Predict a chunk of history, sharding keywords across the prediction pool when it's big enough.
+
+        `workers` caps the shards per chunk at up to the pool's size (0 or 1 predicts inline).
+        Returns {keyword_id: {url: prediction dict}}.
+        """
+        with metrics.timed('predictor_fit'):
+            by_url_id = self.pool.predict_columns(columns, self.predictor, days_ahead, current_date, model, workers)
+
+        urls = url_strings({url_id for predictions in by_url_id.values() for url_id in predictions})
+        return {keyword_id: {urls[url_id]: prediction for url_id, prediction in predictions.items()}
+                for keyword_id, predictions in by_url_id.items()}
+
+    def iter_predictions(self, keyword_ids=None, days=30, days_ahead=7, workers=None, model=None):
+        """Yield one result dict per keyword, chunk by chunk"""
+        workers = self.workers if workers is None else workers
+        model = model or self.predictor.model
+        current_date = datetime.utcnow()
+        since = window_start(days, current_date)
+        keywords = self.load_keywords(keyword_ids)
+
+        for start in range(0, len(keywords), self.chunk_size):
+            chunk = keywords[start:start + self.chunk_size]
+            columns = load_columns([keyword_id for keyword_id, _ in chunk], since)
+            predictions = self.predict_chunk(columns, days_ahead, current_date, workers, model)
+            logger.debug("Predicted %d keywords from %d rankings", len(chunk), len(columns))
+
+            for keyword_id, term in chunk:
+                yield {
+                    "keyword": {"id": keyword_id, "term": term},
+                    "predictions": predictions.get(keyword_id, {}),
+                    "days_analyzed": days,
+                    "model": model
+                }
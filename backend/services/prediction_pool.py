@@ -0,0 +1,155 @@
+"""Process pool for CPU-bound batch prediction.
+
+Keywords are sharded across worker processes as plain arrays (a
+RankingColumns slice with ids narrowed to int32), never ORM objects, and the
+per-shard {keyword_id: {url_id: prediction}} results are merged. Shards hold
+whole keywords and are balanced by row count, so one busy keyword doesn't
+leave the other workers idle.
+"""
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+import logging
+import multiprocessing
+import threading
+import numpy as np
+
+from config import Config
+from services.batch_predictor import BatchRankingPredictor
+from services.history import RankingColumns
+
+logger = logging.getLogger(__name__)
+
+
+def _predict_shard(keyword_ids, url_ids, positions, timestamps, days_ahead, volatility_threshold,
+                   current_date, resample, model):
+    """Worker entry point: predict one shard of keywords from plain arrays"""
+    predictor = BatchRankingPredictor(volatility_threshold=volatility_threshold, resample=resample, model=model)
+    columns = RankingColumns(keyword_ids.astype(np.int64), url_ids.astype(np.int64), positions, timestamps)
+    return predictor.predict_columns(columns, days_ahead, current_date)
+
+
+def shard_columns(columns, shards):
+    """Split columns into up to `shards` parts of whole keywords with roughly equal row counts"""
+    keyword_ids, inverse, counts = np.unique(columns.keyword_ids, return_inverse=True, return_counts=True)
+    shards = min(shards, len(keyword_ids))
+    if shards <= 1:
+        return [columns] if len(columns) else []
+    # A keyword goes to the shard its first row falls in, by cumulative row count
+    first_row = np.cumsum(counts) - counts
+    shard_of = first_row * shards // len(columns)
+    row_shard = shard_of[inverse.ravel()]
+    parts = [columns.select(row_shard == shard) for shard in range(shards)]
+    return [part for part in parts if len(part)]
+
+
+def _compact(columns):
+    """Arrays to ship to a worker: ids fit in 32 bits (prediction keys pack them into one int64)"""
+    return (columns.keyword_ids.astype(np.int32), columns.url_ids.astype(np.int32),
+            columns.positions.astype(np.int16, copy=False), columns.timestamps)
+
+
+class PredictionPool:
+    """Shards BatchRankingPredictor.predict_columns across worker processes.
+
+    Chunks smaller than `min_rows`, or any call with fewer than two workers,
+    run inline: below that the pickling round trip costs more than it saves.
+    The executor has `workers` processes, is created on first use and is
+    shared by every caller; a per-call worker count only caps how many
+    shards a chunk is split into, it never resizes the pool. If a worker
+    dies (or the pool is shut down under a call) the pool is dropped, the
+    chunk is predicted inline and the next call starts a fresh pool.
+    """
+
+    def __init__(self, workers=None, min_rows=None, shards_per_worker=None, start_method=None):
+        self.workers = Config.PREDICTION_WORKERS if workers is None else workers
+        self.min_rows = Config.PREDICTION_POOL_MIN_ROWS if min_rows is None else min_rows
+        self.shards_per_worker = shards_per_worker or Config.PREDICTION_POOL_SHARDS_PER_WORKER
+        self.start_method = start_method or Config.PREDICTION_POOL_START_METHOD
+        self.lock = threading.Lock()
+        self._executor = None
+        self._executor_workers = 0
+        self.pooled_calls = 0
+        self.inline_calls = 0
+        self.shards = 0
+        self.failures = 0
+
+    def _get_executor(self):
+        with self.lock:
+            if self._executor is None:
+                # 'spawn' by default: forking a process that runs request and job threads can copy held locks
+                context = multiprocessing.get_context(self.start_method)
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                self._executor_workers = self.workers
+            return self._executor
+
+    def _discard(self, executor):
+        with self.lock:
+            if self._executor is executor:
+                self._executor = None
+                self._executor_workers = 0
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _count(self, **increments):
+        with self.lock:
+            for name, value in increments.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def predict_columns(self, columns, predictor, days_ahead=7, current_date=None, model=None, workers=None):
+        """{keyword_id: {url_id: prediction dict}} for `columns`, using `predictor`'s settings"""
+        workers = self.workers if workers is None else min(workers, self.workers)
+        model = model or predictor.model
+        current_date = current_date or datetime.utcnow()
+        if workers <= 1 or len(columns) < max(1, self.min_rows):
+            self._count(inline_calls=1)
+            return predictor.predict_columns(columns, days_ahead, current_date, model)
+
+        executor = self._get_executor()
+        parts = shard_columns(columns, workers * self.shards_per_worker)
+        try:
+            futures = [executor.submit(_predict_shard, *_compact(part), days_ahead, predictor.volatility_threshold,
+                                       current_date, predictor.resample, model)
+                       for part in parts]
+        except RuntimeError as e:
+            # submit() refuses work once the executor is shut down, e.g. by shutdown() during this call
+            if 'cannot schedule new futures' not in str(e):
+                raise
+            return self._predict_inline(executor, e, columns, predictor, days_ahead, current_date, model)
+        results = {}
+        try:
+            for future in futures:
+                results.update(future.result())
+        except (BrokenProcessPool, CancelledError) as e:
+            # A worker died, or another call discarded the executor and cancelled our queued shards;
+            # exceptions raised by the prediction code itself propagate
+            return self._predict_inline(executor, e, columns, predictor, days_ahead, current_date, model)
+        self._count(pooled_calls=1, shards=len(parts))
+        return results
+
+    def _predict_inline(self, executor, error, columns, predictor, days_ahead, current_date, model):
+        logger.warning("Prediction pool failed (%r); predicting %d rankings inline", error, len(columns))
+        self._count(failures=1)
+        self._discard(executor)
+        return predictor.predict_columns(columns, days_ahead, current_date, model)
+
+    def shutdown(self, wait=True):
+        with self.lock:
+            executor, self._executor, self._executor_workers = self._executor, None, 0
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "running_workers": self._executor_workers,
+                "start_method": self.start_method,
+                "min_rows": self.min_rows,
+                "pooled_calls": self.pooled_calls,
+                "inline_calls": self.inline_calls,
+                "shards": self.shards,
+                "failures": self.failures
+            }
+
+
+prediction_pool = PredictionPool()
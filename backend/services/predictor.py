@@ -1,19 +1,36 @@
 import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
 from datetime import datetime, timedelta
 import json
 from scipy import stats
+from config import Config
+from services.batch_predictor import BatchRankingPredictor
+from services.history import RankingColumns
+from services.metrics import metrics
+from services import ranking_stats
 
 class RankingPredictor:
     def __init__(self):
-        self.model = LinearRegression()
         self.volatility_threshold = 2.0
-        self.confidence_level = 0.95
+        self.batch = BatchRankingPredictor(volatility_threshold=self.volatility_threshold,
+                                           resample=Config.PREDICTION_RESAMPLE, model=Config.PREDICTION_MODEL)
     
-    def prepare_data(self, rankings_data):
-        """Convert rankings data to time series format"""
-        df = pd.DataFrame(rankings_data)
+    def prepare_data(self, rankings_data, urls=None):
+        """Convert rankings data to time series format.
+
+        Also accepts RankingColumns (e.g. from ColumnarExport.load_keywords);
+        `urls` ({url_id: url}) then maps url ids back to strings.
+        """
+        if isinstance(rankings_data, RankingColumns):
+            columns = rankings_data
+            df = pd.DataFrame({
+                'keyword_id': columns.keyword_ids,
+                'url': pd.Series(columns.url_ids).map(urls) if urls is not None else columns.url_ids,
+                'position': columns.positions,
+                'timestamp': pd.to_datetime(columns.timestamps, unit='us')
+            })
+        else:
+            df = pd.DataFrame(rankings_data)
         df['timestamp'] = pd.to_datetime(df['timestamp'])
         df = df.sort_values('timestamp')
         
@@ -22,54 +39,49 @@ class RankingPredictor:
         
         return df
     
-    def train_model(self, df, url):
-        """Train prediction model for a specific URL"""
-        url_data = df[df['url'] == url].copy()
-        if len(url_data) < 5:  # Need minimum data points
-            return None
-            
-        X = url_data[['days_since_start']]
-        y = url_data['position']
-        
-        self.model.fit(X, y)
-        return self.model
-    
-    def predict_future(self, df, url, days_ahead=14):
-        """Predict future rankings for a URL"""
-        model = self.train_model(df, url)
-        if model is None:
-            return None
-            
-        # Create future dates
-        last_date = df['timestamp'].max()
-        future_days = np.array([(df['days_since_start'].max() + i) for i in range(1, days_ahead+1)])
-        
-        # Make predictions
-        predictions = model.predict(future_days.reshape(-1, 1))
-        
-        # Format results
-        future_dates = [(last_date + timedelta(days=i)).isoformat() for i in range(1, days_ahead+1)]
-        prediction_data = [{"date": date, "predicted_position": float(pos)} 
-                          for date, pos in zip(future_dates, predictions)]
-        
-        return prediction_data
-    
-    def detect_volatility(self, predictions):
-        """Detect if predictions show high volatility"""
-        if not predictions:
-            return False
-            
-        positions = [p['predicted_position'] for p in predictions]
-        std_dev = np.std(positions)
-        max_change = max(positions) - min(positions)
-        
-        # Threshold for volatility alert
-        return std_dev > 2.0 or max_change > 5
-    
-    def predict_future_rankings(self, rankings, days_ahead=7):
-        """Generate ranking predictions for the coming days"""
+    def predict_future_rankings(self, rankings, days_ahead=7, model=None):
+        """Generate ranking predictions for the coming days.
+
+        `model` picks a trend fitter from services.trend_models.MODELS
+        (PREDICTION_MODEL by default).
+        """
+        self.batch.volatility_threshold = self.volatility_threshold
+        with metrics.timed('predictor_fit'):
+            return self.batch.predict(rankings, days_ahead, model=model)
+
+    def predict_from_columns(self, columns, days_ahead=7, model=None):
+        """Predictions from array-backed history (see services.history.RankingColumns),
+        returned as {keyword_id: {url_id: prediction dict}}"""
+        self.batch.volatility_threshold = self.volatility_threshold
+        with metrics.timed('predictor_fit'):
+            return self.batch.predict_columns(columns, days_ahead, model=model)
+
+    def predict_from_stats(self, keyword_id, days=30, days_ahead=7):
+        """Predictions from the persisted regression sums (services.ranking_stats), as {url_id: prediction dict}.
+
+        O(1) per URL. The window is whole UTC days: everything from the day `days` ago onwards.
+        The sums hold each day's last position, so this matches resample='last' with the
+        'linear' model.
+        """
+        current_date = datetime.utcnow()
+        since_day = (current_date - timedelta(days=days)).date()
+        sums, fits = ranking_stats.window_fits(keyword_id, since_day)
+        self.batch.volatility_threshold = self.volatility_threshold
+        # x is days since since_day
+        next_x = (current_date.date() - since_day).days + 1
+        with metrics.timed('predictor_fit'):
+            return self.batch.predict_fits(sums.url_ids, sums.n.astype(np.int64), fits, sums.last_positions,
+                                           days_ahead, current_date, next_x)
+
+    def predict_future_rankings_per_url(self, rankings, days_ahead=7):
+        """Reference implementation: one linregress call per URL.
+
+        Kept for benchmarking and for checking the batched engine's output.
+        Daily resampling, when configured, is done with pandas here.
+        """
         if not rankings:
             return {}
+        resample = self.batch.resample
             
         # Group rankings by URL
         url_rankings = {}
@@ -88,15 +100,27 @@ class RankingPredictor:
             
             # Extract positions
             positions = [pos for _, pos in data]
+            x = np.arange(len(positions))
+            next_x = len(positions)
+            if resample:
+                # One point per UTC day, x in days; gaps drop out rather than being filled
+                series = pd.Series(positions, index=pd.DatetimeIndex([t for t, _ in data]))
+                daily = getattr(series.resample('D'), resample)().dropna()
+                positions = daily.tolist()
+                first_day = daily.index[0].date()
+                x = np.array([(day.date() - first_day).days for day in daily.index])
+                next_x = (current_date.date() - first_day).days + 1
             
             if len(positions) < 3:
                 # Not enough data for prediction
                 continue
                 
             # Calculate trend using linear regression
-            x = np.arange(len(positions))
             y = np.array(positions)
             slope, intercept, r_value, p_value, std_err = stats.linregress(x, y)
+            if np.isnan(std_err):
+                # Newer scipy returns NaN for a flat series; a flat line fits exactly
+                std_err = 0.0
             
             # Calculate volatility (standard deviation)
             volatility = np.std(positions)
@@ -106,7 +130,7 @@ class RankingPredictor:
             
             for day in range(1, days_ahead + 1):
                 future_date = current_date + timedelta(days=day)
-                future_x = len(positions) + day - 1
+                future_x = next_x + day - 1
                 
                 # Predicted position based on trend
                 predicted_pos = intercept + slope * future_x
@@ -128,7 +152,7 @@ class RankingPredictor:
             
             # Store predictions for this URL - convert NumPy types to Python types
             predictions[url] = {
-                "current_position": int(positions[-1]),
+                "current_position": int(round(positions[-1])),
                 "trend": float(slope),
                 "volatility": float(volatility),
                 "is_volatile": bool(volatility > self.volatility_threshold),
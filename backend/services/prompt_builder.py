@@ -0,0 +1,273 @@
+"""Compact, token-budgeted prompts for Claude ranking analyses.
+
+Instead of every raw ranking row and the full predictions dict, the prompt
+carries one compact JSON line per URL: current/first/best/worst position,
+change over the window, the fitted trend and volatility, the forecast, and
+a sparkline-style history of one position per day. Only the biggest movers
+are included (CLAUDE_PROMPT_MAX_URLS). When the prompt would exceed
+CLAUDE_PROMPT_TOKEN_BUDGET the history is coarsened (one position per 2, 3,
+7, 14 days, then none) and, if that isn't enough, the least interesting
+URLs are dropped.
+
+Tokens are estimated from the character count (CHARS_PER_TOKEN); no
+tokenizer round trip is needed to stay under the budget.
+"""
+from collections import namedtuple
+from datetime import timedelta
+import json
+import threading
+
+from config import Config
+
+CHARS_PER_TOKEN = 3.5  # JSON with many short numbers tokenizes denser than prose
+HISTORY_STEPS = (1, 2, 3, 7, 14, None)  # days per history point; None drops the history
+
+# dropped: URLs cut to fit the budget, on top of those beyond max_urls
+CompactPrompt = namedtuple('CompactPrompt', ['text', 'tokens', 'rankings', 'urls_total', 'urls_included',
+                                             'history_step', 'dropped'])
+
+INSTRUCTIONS = """Please provide an analysis covering:
+1. An overall summary of the ranking trends
+2. Which URLs showed significant volatility
+3. Which URLs are predicted to improve or decline in rankings
+4. Any patterns or anomalies in the data
+5. Strategic recommendations based on these trends
+
+Format your response as JSON with these keys: "summary", "volatility_analysis", "prediction_analysis", "patterns_discovered", and "recommendations"."""
+
+
+def estimate_tokens(text):
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def summarize_history(rankings):
+    """(first_day, last_day, {url: [position or None per day]}) with each day's last position"""
+    daily = {}
+    for r in sorted(rankings, key=lambda r: r.timestamp):
+        daily.setdefault(r.url, {})[r.timestamp.date()] = r.position
+    if not daily:
+        return None, None, {}
+    first_day = min(min(days) for days in daily.values())
+    last_day = max(max(days) for days in daily.values())
+    span = (last_day - first_day).days + 1
+    dates = [first_day + timedelta(days=i) for i in range(span)]
+    return first_day, last_day, {url: [days.get(date) for date in dates] for url, days in daily.items()}
+
+
+def _coarsen(series, step):
+    """Last known position of every `step`-day bucket, aligned so the final bucket ends on the last day"""
+    if step == 1:
+        return series
+    start = len(series) % step
+    buckets = ([series[:start]] if start else []) + [series[i:i + step] for i in range(start, len(series), step)]
+    return [next((p for p in reversed(bucket) if p is not None), None) for bucket in buckets]
+
+
+def url_summaries(rankings, predictions):
+    """Per-URL summary dicts, biggest movers first, and the (first_day, last_day) window"""
+    first_day, last_day, history = summarize_history(rankings)
+    summaries = []
+    for url in set(history) | set(predictions):
+        series = history.get(url, [])
+        seen = [p for p in series if p is not None]
+        prediction = predictions.get(url) or {}
+        summary = {"url": url}
+        if seen:
+            summary.update(now=seen[-1], first=seen[0], best=min(seen), worst=max(seen), change=seen[-1] - seen[0])
+        if prediction:
+            forecast = prediction.get("predictions") or []
+            summary.update(trend=round(prediction["trend"], 3), volatility=round(prediction["volatility"], 2),
+                           volatile=bool(prediction["is_volatile"]),
+                           forecast=[p["position"] for p in forecast])
+            if forecast:
+                summary["band"] = [forecast[-1]["lower_bound"], forecast[-1]["upper_bound"]]
+            summary.setdefault("now", prediction["current_position"])
+        # How much the URL moved and is expected to move; ties favour better current positions
+        shift = abs(summary["forecast"][-1] - summary["now"]) if summary.get("forecast") else 0
+        summary["_score"] = (-(abs(summary.get("change", 0)) + shift), summary["now"], url)
+        summary["_series"] = series
+        summaries.append(summary)
+    summaries.sort(key=lambda s: s["_score"])
+    return summaries, (first_day, last_day)
+
+
+def _render_line(summary, step):
+    line = {key: value for key, value in summary.items() if not key.startswith('_')}
+    if step is not None and summary["_series"]:
+        line["history"] = _coarsen(summary["_series"], step)
+    return json.dumps(line, separators=(',', ':'))
+
+
+def _render(keyword, window, lines, urls_total, step, horizon, instructions):
+    first_day, last_day = window
+    if first_day is not None:
+        span = f"{first_day} to {last_day} ({(last_day - first_day).days + 1} days)"
+    else:
+        span = "no stored history"
+    if step is None:
+        history = "history omitted for brevity"
+    else:
+        period = "day" if step == 1 else f"{step} days"
+        history = f"history is one position per {period}, oldest first (null = not ranked)"
+    shown = f"the {len(lines)} biggest movers of {urls_total} URLs" if len(lines) < urls_total \
+        else f"all {urls_total} URLs"
+    section = f"""Window: {span}. Lower positions are better; change = now - first, so negative means the URL moved up.
+One JSON object per URL, showing {shown}: now/first/best/worst positions, change, trend (positions per day), \
+volatility (std dev of positions), volatile flag, forecast (predicted positions for the next {horizon} days) \
+with the 95% band of the last one; {history}.
+
+{chr(10).join(lines)}"""
+    if instructions is None:
+        return section
+    return f"""Analyze these search ranking trends for the keyword "{keyword}".
+
+{section}
+
+{instructions}"""
+
+
+def build_ranking_prompt(keyword, rankings, predictions, token_budget=None, max_urls=None,
+                         instructions=INSTRUCTIONS):
+    """CompactPrompt for analyze_rankings, as detailed as fits in `token_budget` estimated tokens.
+
+    The instructions and the top URL are always included, so a budget below
+    a few hundred tokens can't be met. With instructions=None only the data
+    section is rendered (see build_batch_prompt).
+    """
+    token_budget = Config.CLAUDE_PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+    max_urls = Config.CLAUDE_PROMPT_MAX_URLS if max_urls is None else max_urls
+    summaries, window = url_summaries(rankings, predictions)
+    selected = summaries[:max_urls] if max_urls else summaries
+    horizon = max((len(s.get("forecast", [])) for s in selected), default=0)
+
+    def render(step, count):
+        lines = [_render_line(s, step) for s in selected[:count]]
+        return _render(keyword, window, lines, len(summaries), step, horizon, instructions)
+
+    # Coarsen the history first, then drop the least interesting URLs
+    for step in HISTORY_STEPS:
+        text = render(step, len(selected))
+        if not token_budget or estimate_tokens(text) <= token_budget:
+            return CompactPrompt(text, estimate_tokens(text), len(rankings), len(summaries), len(selected), step, 0)
+    low, high = min(1, len(selected)), len(selected)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(render(None, middle)) <= token_budget:
+            low = middle
+        else:
+            high = middle - 1
+    text = render(None, low)
+    return CompactPrompt(text, estimate_tokens(text), len(rankings), len(summaries), low, None, len(selected) - low)
+
+
+ANALYSIS_KEYS = ("summary", "volatility_analysis", "prediction_analysis", "patterns_discovered", "recommendations")
+
+BATCH_INSTRUCTIONS = """For each keyword, provide an analysis covering:
+1. An overall summary of the ranking trends
+2. Which URLs showed significant volatility
+3. Which URLs are predicted to improve or decline in rankings
+4. Any patterns or anomalies in the data
+5. Strategic recommendations based on these trends
+
+Format your response as one JSON object that maps each keyword id (as a string, e.g. "{example}") to its analysis: \
+an object with these keys: "summary", "volatility_analysis", "prediction_analysis", "patterns_discovered", and \
+"recommendations". Include every keyword id listed above."""
+
+
+def build_batch_prompt(sections):
+    """One prompt analyzing several keywords; `sections` is [(key, keyword, CompactPrompt)] built
+    with instructions=None, and the reply maps str(key) to each keyword's analysis"""
+    parts = [f"Analyze the search ranking trends of the {len(sections)} keywords below, each introduced by "
+             f"a \"### Keyword <id>\" heading."]
+    for key, keyword, section in sections:
+        parts.append(f'### Keyword {key}: "{keyword}"\n{section.text}')
+    parts.append(BATCH_INSTRUCTIONS.format(example=sections[0][0] if sections else 1))
+    return "\n\n".join(parts)
+
+
+def _json_objects(text):
+    """Yield (start, object) for every JSON object that decodes at a '{' in text"""
+    decoder = json.JSONDecoder()
+    position = text.find('{')
+    while position >= 0:
+        try:
+            value, end = decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            position = text.find('{', position + 1)
+            continue
+        yield position, value
+        position = text.find('{', end)
+
+
+def parse_batch_analysis(text, keys):
+    """{key: analysis dict} for the keys answered in a batch reply.
+
+    Reads every JSON object keyed by keyword ids, wherever it sits in the
+    reply (code fences, prose around it). If the reply as a whole is not
+    valid JSON (e.g. cut off at max_tokens), each '"<id>": {...}' entry that
+    still decodes is salvaged. Missing or malformed keywords are left out.
+    """
+    wanted = {str(key): key for key in keys}
+    found = {}
+    for _, value in _json_objects(text):
+        if isinstance(value, dict) and wanted.keys() & value.keys():
+            found.update({wanted[name]: analysis for name, analysis in value.items()
+                          if name in wanted and isinstance(analysis, dict)})
+    if len(found) < len(wanted):
+        decoder = json.JSONDecoder()
+        for name, key in wanted.items():
+            if key in found:
+                continue
+            marker = text.find(f'"{name}"')
+            while marker >= 0 and key not in found:
+                start = text.find('{', marker)
+                between = text[marker + len(name) + 2:start] if start >= 0 else ''
+                if start >= 0 and between.strip() == ':':
+                    try:
+                        analysis, _ = decoder.raw_decode(text, start)
+                        if isinstance(analysis, dict):
+                            found[key] = analysis
+                    except json.JSONDecodeError:
+                        pass
+                marker = text.find(f'"{name}"', marker + 1)
+    return found
+
+
+class PromptMetrics:
+    """Running prompt-size counters for /api/cache/stats"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.prompts = 0
+        self.tokens = 0
+        self.max_tokens = 0
+        self.rankings = 0
+        self.urls_total = 0
+        self.urls_included = 0
+        self.coarsened = 0
+        self.truncated = 0
+
+    def record(self, prompt):
+        with self.lock:
+            self.prompts += 1
+            self.tokens += prompt.tokens
+            self.max_tokens = max(self.max_tokens, prompt.tokens)
+            self.rankings += prompt.rankings
+            self.urls_total += prompt.urls_total
+            self.urls_included += prompt.urls_included
+            self.coarsened += prompt.history_step != 1
+            self.truncated += prompt.dropped > 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "prompts": self.prompts,
+                "avg_tokens": round(self.tokens / self.prompts, 1) if self.prompts else 0.0,
+                "max_tokens": self.max_tokens,
+                "token_budget": Config.CLAUDE_PROMPT_TOKEN_BUDGET,
+                "avg_rankings": round(self.rankings / self.prompts, 1) if self.prompts else 0.0,
+                "urls_included": self.urls_included,
+                "urls_total": self.urls_total,
+                "coarsened": self.coarsened,
+                "truncated": self.truncated
+            }
@@ -0,0 +1,254 @@
+"""Persisted regression sums for O(1) per-URL trend fits.
+
+Fits follow BatchRankingPredictor with resample='last': one point per UTC
+day, the day's last position, regressed against the day (as day_number).
+RankingStat keeps n, Σx, Σy, Σxy, Σx², Σy² over each (keyword, url)'s
+closed days, plus the latest point, which stands for the still open day.
+When a later day's first point arrives the open day is folded into the sums
+and RankingStatCheckpoint records them as of the end of that day, so the
+sums for any whole-day window are the current totals minus the last
+checkpoint before the window, plus the open day. Sums are integers, which
+keeps the subtraction exact.
+"""
+from collections import namedtuple
+from datetime import timedelta
+import logging
+import numpy as np
+
+from sqlalchemy import bindparam, delete, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from config import Config
+from models.database import db, Keyword, RankingStat, RankingStatCheckpoint
+from services.batch_predictor import MICROSECONDS_PER_DAY, day_number, fit_from_sums, resample_daily
+from services.history import EPOCH, load_columns
+
+logger = logging.getLogger(__name__)
+
+SUMS = ('n', 'sum_x', 'sum_y', 'sum_xy', 'sum_xx', 'sum_yy')
+
+WindowSums = namedtuple('WindowSums', ['url_ids', 'n', 'sum_x', 'sum_y', 'sum_xy', 'sum_xx', 'sum_yy',
+                                       'last_positions'])
+
+
+def stats_enabled():
+    return Config.RANKING_STATS
+
+
+def serves_predictions(model='linear'):
+    """Whether /predict can fit `model` from the sums: a least-squares line over each day's last position"""
+    return stats_enabled() and model == 'linear' and Config.PREDICTION_RESAMPLE == 'last'
+
+
+def _current(keyword_ids):
+    """{(keyword_id, url_id): RankingStat row} for the given keywords"""
+    query = select(RankingStat.__table__).where(RankingStat.keyword_id.in_(keyword_ids))
+    return {(row.keyword_id, row.url_id): row for row in db.session.execute(query)}
+
+
+def _lock_keywords(keyword_ids):
+    """Hold the keywords' rows until the transaction ends, so concurrent ingests of a keyword take turns.
+
+    SELECT ... FOR UPDATE where the database has row locks; SQLite ignores
+    it, but the ingest already holds its write lock from writing the rankings.
+    """
+    query = select(Keyword.id).where(Keyword.id.in_(keyword_ids)).order_by(Keyword.id).with_for_update()
+    db.session.execute(query).all()
+
+
+def _checkpoints_before_query():
+    previous = aliased(RankingStatCheckpoint)
+
+    def last(column):
+        # One primary-key seek per URL; SQLite plans a join on max(day) as a scan of the keyword's checkpoints
+        return select(column)\
+            .where(previous.keyword_id == RankingStat.keyword_id, previous.url_id == RankingStat.url_id,
+                   previous.day < bindparam('day'))\
+            .order_by(previous.day.desc()).limit(1)\
+            .correlate(RankingStat).scalar_subquery().label(column.key)
+
+    return select(RankingStat.url_id, *(last(getattr(previous, name)) for name in SUMS))\
+        .where(RankingStat.keyword_id == bindparam('keyword_id'))
+
+
+# Built once: constructing it costs more than running it
+CHECKPOINTS_BEFORE = _checkpoints_before_query()
+
+
+def _checkpoints_before(keyword_id, day):
+    """{url_id: row} with each URL's last checkpoint strictly before `day`"""
+    rows = db.session.execute(CHECKPOINTS_BEFORE, {'keyword_id': keyword_id, 'day': day})
+    return {row.url_id: row for row in rows if row.n is not None}
+
+
+def _fold(state, x, y):
+    state['n'] += 1
+    state['sum_x'] += x
+    state['sum_y'] += y
+    state['sum_xy'] += x * y
+    state['sum_xx'] += x * x
+    state['sum_yy'] += y * y
+
+
+def record_rankings(rows):
+    """Fold new (keyword_id, url_id, position, timestamp) rows into the totals and day checkpoints.
+
+    Runs in the caller's transaction, with the keywords locked against
+    concurrent ingests. A series that receives a point older than its latest
+    one can't be updated in place, so its keyword is rebuilt from history
+    instead; so are the keywords of a write that still conflicts with stored
+    rows. Returns the rebuilt keyword ids.
+    """
+    if not rows:
+        return set()
+    series = {}
+    for keyword_id, url_id, position, timestamp in sorted(rows, key=lambda row: row[3]):
+        series.setdefault((keyword_id, url_id), []).append((position, timestamp))
+    keyword_ids = {keyword_id for keyword_id, _ in series}
+    _lock_keywords(keyword_ids)
+    current = _current(keyword_ids)
+
+    stale = set()
+    totals, checkpoints = [], []
+    for (keyword_id, url_id), points in series.items():
+        stat = current.get((keyword_id, url_id))
+        if stat is not None and points[0][1] < stat.last_timestamp:
+            stale.add(keyword_id)
+            continue
+        state = {name: getattr(stat, name) if stat is not None else 0 for name in SUMS}
+        day, last_position = (stat.last_timestamp.date(), stat.last_position) if stat is not None else (None, None)
+        for position, timestamp in points:
+            if day is not None and timestamp.date() != day:
+                # A later day closes the open one
+                _fold(state, day_number(day), last_position)
+                checkpoints.append(dict(state, keyword_id=keyword_id, url_id=url_id, day=day))
+            day, last_position = timestamp.date(), position
+        totals.append(dict(state, keyword_id=keyword_id, url_id=url_id,
+                           last_position=position, last_timestamp=timestamp))
+
+    totals = [row for row in totals if row['keyword_id'] not in stale]
+    checkpoints = [row for row in checkpoints if row['keyword_id'] not in stale]
+    try:
+        # A savepoint, so a conflict only undoes these writes and not the caller's rankings
+        with db.session.begin_nested():
+            if totals:
+                db.session.execute(insert(RankingStat.__table__).prefix_with('OR REPLACE', dialect='sqlite'),
+                                   totals)
+            if checkpoints:
+                db.session.execute(insert(RankingStatCheckpoint.__table__), checkpoints)
+    except IntegrityError as e:
+        conflicted = {row['keyword_id'] for row in totals}
+        logger.warning(f"Ranking stats conflict for keywords {sorted(conflicted)}, rebuilding: {e.orig}")
+        stale |= conflicted
+    if stale:
+        rebuild_stats(stale, commit=False)
+    return stale
+
+
+def _stat_rows(columns):
+    """(totals, checkpoints) row dicts for a RankingColumns history (any order)"""
+    if len(columns) == 0:
+        return [], []
+    order = np.lexsort((columns.timestamps, columns.url_ids, columns.keyword_ids))
+    keyword_ids = columns.keyword_ids[order]
+    url_ids = columns.url_ids[order]
+    positions = columns.positions[order].astype(np.int64)
+    timestamps = columns.timestamps[order]
+
+    new_series = np.ones(len(order), dtype=bool)
+    new_series[1:] = (keyword_ids[1:] != keyword_ids[:-1]) | (url_ids[1:] != url_ids[:-1])
+    codes = np.cumsum(new_series) - 1
+    last_points = np.append(np.flatnonzero(new_series)[1:], len(order)) - 1
+
+    # One point per (series, day); each series' last day is still open
+    codes, days, y = resample_daily(codes, timestamps // MICROSECONDS_PER_DAY, positions, 'last')
+    closed = np.zeros(len(codes), dtype=bool)
+    closed[:-1] = codes[1:] == codes[:-1]
+    codes, x, y = codes[closed], days[closed], y[closed]
+
+    series_start = np.zeros(len(codes), dtype=np.int64)
+    if len(codes):
+        starts = np.ones(len(codes), dtype=bool)
+        starts[1:] = codes[1:] != codes[:-1]
+        series_start = np.maximum.accumulate(np.where(starts, np.arange(len(codes)), 0))
+
+    def running(values):
+        total = np.cumsum(values)
+        return total - np.where(series_start > 0, total[series_start - 1], 0)
+
+    sums = {'n': np.arange(len(codes)) - series_start + 1, 'sum_x': running(x), 'sum_y': running(y),
+            'sum_xy': running(x * y), 'sum_xx': running(x * x), 'sum_yy': running(y * y)}
+
+    checkpoints = [{'keyword_id': int(keyword_ids[last_points[code]]), 'url_id': int(url_ids[last_points[code]]),
+                    'day': (EPOCH + timedelta(days=int(day))).date(),
+                    **{name: int(values[i]) for name, values in sums.items()}}
+                   for i, (code, day) in enumerate(zip(codes.tolist(), x.tolist()))]
+
+    # Totals are the sums as of each series' last closed day (zero if it has none)
+    last_closed = np.searchsorted(codes, np.arange(len(last_points)), side='right') - 1
+    totals = []
+    for code, i in enumerate(last_points.tolist()):
+        j = int(last_closed[code])
+        has_closed = j >= 0 and codes[j] == code
+        row = {name: int(values[j]) if has_closed else 0 for name, values in sums.items()}
+        row.update(keyword_id=int(keyword_ids[i]), url_id=int(url_ids[i]), last_position=int(positions[i]),
+                   last_timestamp=EPOCH + timedelta(microseconds=int(timestamps[i])))
+        totals.append(row)
+    return totals, checkpoints
+
+
+def rebuild_stats(keyword_ids=None, chunk_size=100, commit=True):
+    """Recompute the totals and checkpoints of the given keywords (all by default) from stored history"""
+    if keyword_ids is None:
+        keyword_ids = list(db.session.execute(select(Keyword.id)).scalars())
+    keyword_ids = sorted(keyword_ids)
+    written = 0
+    for start in range(0, len(keyword_ids), chunk_size):
+        chunk = keyword_ids[start:start + chunk_size]
+        db.session.execute(delete(RankingStat).where(RankingStat.keyword_id.in_(chunk)))
+        db.session.execute(delete(RankingStatCheckpoint).where(RankingStatCheckpoint.keyword_id.in_(chunk)))
+        totals, checkpoints = _stat_rows(load_columns(chunk))
+        if totals:
+            db.session.execute(insert(RankingStat.__table__), totals)
+        if checkpoints:
+            db.session.execute(insert(RankingStatCheckpoint.__table__), checkpoints)
+        written += len(checkpoints)
+    if commit:
+        db.session.commit()
+    return written
+
+
+def window_sums(keyword_id, since_day):
+    """Per-URL sums over the days from `since_day` on, with x in days since `since_day`"""
+    current = _current([keyword_id])
+    before = _checkpoints_before(keyword_id, since_day)
+    k = day_number(since_day)
+
+    url_ids, last_positions = [], []
+    sums = {name: [] for name in SUMS}
+    for (_, url_id), stat in current.items():
+        if stat.last_timestamp.date() < since_day:
+            continue  # nothing inside the window
+        base = before.get(url_id)
+        diff = {name: getattr(stat, name) - (getattr(base, name) if base is not None else 0)
+                for name in SUMS}
+        _fold(diff, day_number(stat.last_timestamp), stat.last_position)  # the open day
+        # Shift x by k: Σ(x-k) = Σx - nk, Σ(x-k)y = Σxy - kΣy, Σ(x-k)² = Σx² - 2kΣx + nk²
+        n = diff['n']
+        sums['n'].append(n)
+        sums['sum_x'].append(diff['sum_x'] - n * k)
+        sums['sum_y'].append(diff['sum_y'])
+        sums['sum_xy'].append(diff['sum_xy'] - k * diff['sum_y'])
+        sums['sum_xx'].append(diff['sum_xx'] - 2 * k * diff['sum_x'] + n * k * k)
+        sums['sum_yy'].append(diff['sum_yy'])
+        url_ids.append(url_id)
+        last_positions.append(stat.last_position)
+
+    return WindowSums(url_ids, *(np.array(sums[name], dtype=np.float64) for name in SUMS),
+                      np.array(last_positions, dtype=np.float64))
+
+
+def window_fits(keyword_id, since_day):
+    """(WindowSums, fits) for one keyword; fits as returned by fit_from_sums"""
+    sums = window_sums(keyword_id, since_day)
+    return sums, fit_from_sums(sums.n, sums.sum_x, sums.sum_y, sums.sum_xy, sums.sum_xx, sums.sum_yy)
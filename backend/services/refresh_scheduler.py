@@ -0,0 +1,79 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+import logging
+import time
+
+from sqlalchemy import select
+from config import Config
+from models.database import db, Keyword
+from services.serp_service import SerpDataService
+from services.ingest import ingest_snapshots
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshScheduler:
+    """Fetch SERP data for many keywords concurrently and bulk-insert the rankings.
+
+    HTTP fetches run on a bounded thread pool sharing the service's pooled
+    session and per-API-key rate limiter; database writes stay on the calling
+    thread (which must hold an app context) and are flushed in batches.
+    """
+
+    def __init__(self, serp_service=None, concurrency=None, batch_size=5000):
+        self.concurrency = concurrency or Config.SERP_CONCURRENCY
+        self.serp_service = serp_service or SerpDataService(pool_size=self.concurrency)
+        self.batch_size = batch_size
+
+    def _fetch(self, keyword_id, term):
+        serp_data = self.serp_service.fetch_rankings(term)
+        return keyword_id, serp_data, datetime.utcnow()
+
+    def _flush(self, snapshots):
+        return ingest_snapshots(snapshots) if snapshots else 0
+
+    def run(self, keyword_ids=None, progress=None):
+        """Refresh the given keywords (all keywords by default) and return run statistics.
+
+        `progress(fraction, message)` is called as fetches finish (e.g. a job's update).
+        """
+        query = select(Keyword.id, Keyword.term).order_by(Keyword.id)
+        if keyword_ids:
+            query = query.where(Keyword.id.in_(keyword_ids))
+        keywords = db.session.execute(query).all()
+
+        started = time.perf_counter()
+        stats = {"keywords": len(keywords), "fetched": 0, "failed": 0, "rows_inserted": 0}
+        pending = []
+        pending_rows = 0
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [executor.submit(self._fetch, keyword_id, term) for keyword_id, term in keywords]
+            for done, future in enumerate(as_completed(futures), 1):
+                if progress:
+                    progress(done / len(futures), f"Fetched {done}/{len(futures)} keywords")
+                try:
+                    keyword_id, serp_data, timestamp = future.result()
+                except Exception as e:
+                    logger.error(f"Refresh worker failed: {e}")
+                    stats["failed"] += 1
+                    continue
+
+                if not serp_data:
+                    stats["failed"] += 1
+                    continue
+
+                stats["fetched"] += 1
+                organic_results = serp_data.get('organic_results', [])
+                pending.append((keyword_id, organic_results, timestamp))
+                pending_rows += len(organic_results)
+
+                if pending_rows >= self.batch_size:
+                    stats["rows_inserted"] += self._flush(pending)
+                    pending = []
+                    pending_rows = 0
+
+        stats["rows_inserted"] += self._flush(pending)
+        stats["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+        logger.info(f"Refresh run finished: {stats}")
+        return stats
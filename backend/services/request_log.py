@@ -0,0 +1,168 @@
+"""Sampled, size-capped request logging that stays off the request thread.
+
+Each logged request becomes one JSON line: method, path, status, duration,
+body sizes and, up to REQUEST_LOG_MAX_BODY bytes each, the request and
+response bodies. The request thread only builds a small dict; a
+QueueHandler passes it to a QueueListener thread that serializes and
+writes it, so a slow log sink never holds up responses (when the queue is
+full, entries are dropped and counted). Bodies are read only when they are
+already in memory: a large request body is logged by size, and streamed or
+file responses are never touched.
+"""
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import json
+import logging
+import queue
+import random
+import threading
+import time
+
+from flask import g, request
+
+logger = logging.getLogger('rankflux.requests')
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock prepare() renders the message on the calling thread; request
+    entries are dicts that JsonFormatter serializes on the listener instead.
+    Entries that don't fit in the queue are dropped rather than blocking.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: a dict message's fields (or "message") plus a UTC timestamp"""
+
+    def format(self, record):
+        entry = {"time": datetime.utcfromtimestamp(record.created).isoformat(timespec='milliseconds') + 'Z'}
+        if isinstance(record.msg, dict):
+            entry.update(record.msg)
+        else:
+            entry["message"] = record.getMessage()
+        return json.dumps(entry, default=str)
+
+
+class RequestLogger:
+    """Flask hooks that log a sample of requests through a background listener"""
+
+    def __init__(self, sample_rate=1.0, max_body=0, queue_size=10000):
+        self.enabled = False
+        self.sample_rate = sample_rate
+        self.max_body = max_body
+        self.queue_size = queue_size
+        self.handler = None
+        self.listener = None
+        self.lock = threading.Lock()
+        self.logged = 0
+        self.skipped = 0
+
+    def init_app(self, app):
+        self.enabled = app.config.get('REQUEST_LOG', False)
+        self.sample_rate = app.config.get('REQUEST_LOG_SAMPLE_RATE', self.sample_rate)
+        self.max_body = app.config.get('REQUEST_LOG_MAX_BODY', self.max_body)
+        app.extensions['request_log'] = self
+        if not self.enabled:
+            return
+        self.start(app.config.get('REQUEST_LOG_PATH'))
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def start(self, path=None, target=None):
+        """Start the listener thread writing to `target` (a logging.Handler), a file at `path`, or stderr"""
+        with self.lock:
+            if self.listener is not None:
+                return
+            if target is None:
+                target = logging.FileHandler(path) if path else logging.StreamHandler()
+            target.setFormatter(JsonFormatter())
+            self.handler = DeferredQueueHandler(queue.Queue(self.queue_size))
+            logger.addHandler(self.handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            self.listener = QueueListener(self.handler.queue, target)
+            self.listener.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Flush queued entries and stop the listener"""
+        with self.lock:
+            listener, handler = self.listener, self.handler
+            self.listener = self.handler = None
+        if listener is not None:
+            listener.stop()
+            logger.removeHandler(handler)
+            for target in listener.handlers:
+                target.close()
+
+    def _before_request(self):
+        g.request_log_start = time.perf_counter()
+        g.request_log_sampled = self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def _after_request(self, response):
+        start = g.pop('request_log_start', None)
+        if start is None:
+            return response
+        if not g.pop('request_log_sampled', False) and response.status_code < 500:
+            with self.lock:
+                self.skipped += 1
+            return response
+
+        entry = {
+            "method": request.method,
+            "path": request.path,
+            "query": request.query_string.decode('utf-8', 'replace'),
+            "status": response.status_code,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+            "request_bytes": request.content_length,
+            "response_bytes": response.content_length,
+            "streamed": response.is_streamed
+        }
+        if self.max_body > 0:
+            if request.content_length and request.content_length <= self.max_body:
+                entry["request_body"] = request.get_data(cache=True).decode('utf-8', 'replace')
+            head = self._response_head(response)
+            if head is not None:
+                entry["response_body"] = head
+        logger.info(entry)
+        with self.lock:
+            self.logged += 1
+        return response
+
+    def _response_head(self, response):
+        """The first max_body bytes of a buffered response, without joining the whole body"""
+        if response.is_streamed or response.direct_passthrough:
+            return None
+        head = bytearray()
+        for chunk in response.response:
+            head += chunk[:self.max_body - len(head)]
+            if len(head) >= self.max_body:
+                break
+        return bytes(head).decode('utf-8', 'replace')
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "logged": self.logged,
+            "skipped": self.skipped,
+            "dropped": self.handler.dropped if self.handler else 0
+        }
+
+
+request_log = RequestLogger()
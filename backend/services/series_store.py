@@ -0,0 +1,204 @@
+"""Process-wide in-memory ranking history for hot keywords.
+
+Each resident keyword is one KeywordSeries: growable NumPy columns (int32
+url ids, int16 positions, int64 epoch-microsecond timestamps) covering the
+last SERIES_STORE_DAYS days. /predict reads RankingColumns straight from it
+instead of querying and regrouping rows. ingest_snapshots appends new
+rankings to resident keywords after committing them; keywords it doesn't
+hold are loaded on their next read. The total is capped at
+SERIES_STORE_MAX_MB, evicting the least recently read keywords.
+
+Reads pass the keyword's latest stored timestamp, so rankings written by
+another process (which this store never sees) trigger a reload.
+"""
+from collections import OrderedDict
+import threading
+import numpy as np
+
+from config import Config
+from services.history import RankingColumns, load_columns, to_epoch_us, window_start
+
+MIN_CAPACITY = 64
+
+
+class KeywordSeries:
+    """One keyword's history since `covers_from` (epoch µs), in columns that grow by doubling"""
+    __slots__ = ('covers_from', 'newest', 'size', 'url_ids', 'positions', 'timestamps')
+
+    def __init__(self, covers_from, url_ids, positions, timestamps):
+        self.covers_from = covers_from
+        self.size = len(positions)
+        capacity = max(MIN_CAPACITY, self.size)
+        self.url_ids = np.zeros(capacity, dtype=np.int32)
+        self.positions = np.zeros(capacity, dtype=np.int16)
+        self.timestamps = np.zeros(capacity, dtype=np.int64)
+        self.url_ids[:self.size] = url_ids
+        self.positions[:self.size] = positions
+        self.timestamps[:self.size] = timestamps
+        self.newest = int(timestamps.max()) if self.size else -1
+
+    @property
+    def nbytes(self):
+        return self.url_ids.nbytes + self.positions.nbytes + self.timestamps.nbytes
+
+    def append(self, url_ids, positions, timestamps, retain_from):
+        """Add rows; on growth rows older than `retain_from` (epoch µs) are dropped first"""
+        needed = self.size + len(positions)
+        if needed > len(self.positions):
+            keep = self.timestamps[:self.size] >= retain_from
+            self.covers_from = max(self.covers_from, retain_from)
+            kept = int(keep.sum())
+            capacity = max(MIN_CAPACITY, 2 * (kept + len(positions)))
+            self.url_ids = _regrow(self.url_ids[:self.size][keep], capacity)
+            self.positions = _regrow(self.positions[:self.size][keep], capacity)
+            self.timestamps = _regrow(self.timestamps[:self.size][keep], capacity)
+            self.size = kept
+        end = self.size + len(positions)
+        self.url_ids[self.size:end] = url_ids
+        self.positions[self.size:end] = positions
+        self.timestamps[self.size:end] = timestamps
+        self.size = end
+        if len(timestamps):
+            self.newest = max(self.newest, int(timestamps.max()))
+
+    def columns(self, keyword_id, since):
+        """RankingColumns of the rows at or after `since` (epoch µs), in insertion order"""
+        timestamps = self.timestamps[:self.size]
+        selected = np.flatnonzero(timestamps >= since)
+        return RankingColumns(np.full(len(selected), keyword_id, dtype=np.int64),
+                              self.url_ids[selected].astype(np.int64), self.positions[selected],
+                              timestamps[selected])
+
+
+def _regrow(values, capacity):
+    grown = np.zeros(capacity, dtype=values.dtype)
+    grown[:len(values)] = values
+    return grown
+
+
+class SeriesStore:
+    """Thread-safe LRU of KeywordSeries, bounded by total array bytes"""
+
+    def __init__(self, max_bytes=256 * 2**20, days=90):
+        self.max_bytes = max_bytes
+        self.days = days
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.reloads = 0
+        self.evictions = 0
+        self.appended = 0
+
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def columns(self, keyword_id, since, latest=None):
+        """History of one keyword from `since` on as RankingColumns.
+
+        `latest` is the keyword's newest stored timestamp (history.latest_timestamp);
+        a resident series older than that is reloaded. Windows reaching further back
+        than the store keeps are read from the database without caching.
+        """
+        coverage = window_start(self.days)
+        if not self.enabled() or since < coverage:
+            with self.lock:
+                self.bypasses += 1
+            return load_columns([keyword_id], since)
+
+        since_us = int(to_epoch_us([since])[0])
+        latest_us = int(to_epoch_us([latest])[0]) if latest is not None else -1
+        with self.lock:
+            series = self.entries.get(keyword_id)
+            if series is not None and series.covers_from <= since_us and series.newest >= latest_us:
+                self.entries.move_to_end(keyword_id)
+                self.hits += 1
+                return series.columns(keyword_id, since_us)
+            if series is not None:
+                self.reloads += 1
+            self.misses += 1
+
+        loaded = load_columns([keyword_id], coverage)
+        series = KeywordSeries(int(to_epoch_us([coverage])[0]), loaded.url_ids, loaded.positions, loaded.timestamps)
+        with self.lock:
+            self._put(keyword_id, series)
+        return series.columns(keyword_id, since_us)
+
+    def _put(self, keyword_id, series):
+        previous = self.entries.pop(keyword_id, None)
+        if previous is not None:
+            self.bytes -= previous.nbytes
+        if series.nbytes > self.max_bytes:
+            return
+        self.entries[keyword_id] = series
+        self.bytes += series.nbytes
+        self._evict()
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and self.entries:
+            _, series = self.entries.popitem(last=False)
+            self.bytes -= series.nbytes
+            self.evictions += 1
+
+    def append(self, rows):
+        """Add committed (keyword_id, url_id, position, timestamp) rows to the resident keywords.
+
+        Rows no newer than a series' latest point (a backfill, or rows a
+        concurrent reload already picked up) drop the keyword instead; its
+        next read reloads it.
+        """
+        retain_from = int(to_epoch_us([window_start(self.days)])[0])
+        with self.lock:
+            by_keyword = {}
+            for row in rows:
+                if row[0] in self.entries:
+                    by_keyword.setdefault(row[0], []).append(row)
+            for keyword_id, keyword_rows in by_keyword.items():
+                series = self.entries[keyword_id]
+                _, url_ids, positions, timestamps = zip(*keyword_rows)
+                timestamps = to_epoch_us(timestamps)
+                if timestamps.min() <= series.newest:
+                    del self.entries[keyword_id]
+                    self.bytes -= series.nbytes
+                    continue
+                before = series.nbytes
+                series.append(np.array(url_ids, dtype=np.int32), np.array(positions, dtype=np.int16),
+                              timestamps, retain_from)
+                self.bytes += series.nbytes - before
+                self.appended += len(keyword_rows)
+            self._evict()
+
+    def invalidate_keywords(self, keyword_ids):
+        with self.lock:
+            for keyword_id in keyword_ids:
+                series = self.entries.pop(keyword_id, None)
+                if series is not None:
+                    self.bytes -= series.nbytes
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "keywords": len(self.entries),
+                "rows": sum(series.size for series in self.entries.values()),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "days": self.days,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "reloads": self.reloads,
+                "bypasses": self.bypasses,
+                "evictions": self.evictions,
+                "appended": self.appended
+            }
+
+
+series_store = SeriesStore(int(Config.SERIES_STORE_MAX_MB * 2**20), Config.SERIES_STORE_DAYS)
@@ -1,54 +1,155 @@
 import requests
+from requests.adapters import HTTPAdapter
+import asyncio
+import httpx
 import logging
 from config import Config
+from services.metrics import metrics
+from services.rate_limit import get_rate_limiter
+import random
 import time
 
 logger = logging.getLogger(__name__)
 
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
 class SerpDataService:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, base_url=None, timeout=None, max_retries=None, pool_size=None,
+                 rate_limit=None):
         self.api_key = api_key or Config.SERPAPI_KEY
-        self.base_url = "https://serpapi.com/search"
-        
+        self.base_url = base_url or Config.SERPAPI_URL
+        self.timeout = timeout or Config.SERP_TIMEOUT
+        self.max_retries = Config.SERP_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base = 0.5
+        self.backoff_cap = 30.0
+
+        # One pooled session per service so keep-alive connections are reused across fetches
+        pool_size = pool_size or Config.SERP_CONCURRENCY
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        rate_limit = Config.SERP_RATE_LIMIT if rate_limit is None else rate_limit
+        self.rate_limiter = get_rate_limiter(self.api_key, rate_limit, Config.SERP_RATE_BURST)
+
+        # Async path: one httpx client per event loop
+        self._async_loop = None
+        self._async_session = None
+
+    def _async_client(self):
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            self._async_session = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=Config.ASYNC_MAX_CONNECTIONS,
+                                    max_keepalive_connections=Config.SERP_CONCURRENCY))
+            self._async_loop = loop
+        return self._async_session
+
+    def _backoff(self, attempt, response=None):
+        """Seconds to wait before retry `attempt`: Retry-After if given, else exponential with jitter"""
+        if response is not None and response.headers.get('Retry-After'):
+            try:
+                return min(self.backoff_cap, float(response.headers['Retry-After']))
+            except ValueError:
+                pass
+        return min(self.backoff_cap, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def _get(self, params):
+        """GET the search endpoint, retrying 429/5xx and connection errors"""
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                with metrics.timed('serp_fetch'):
+                    response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"SERP request failed ({e}), retrying")
+                time.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                logger.warning(f"SERP request returned {response.status_code}, retrying")
+                time.sleep(self._backoff(attempt, response))
+                continue
+
+            response.raise_for_status()
+            return response
+
+    async def _get_async(self, params):
+        """_get for coroutines: same retries, but rate limiting and backoff wait with asyncio.sleep"""
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire_async()
+            try:
+                with metrics.timed('serp_fetch'):
+                    response = await self._async_client().get(self.base_url, params=params, timeout=self.timeout)
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"SERP request failed ({e}), retrying")
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                logger.warning(f"SERP request returned {response.status_code}, retrying")
+                await asyncio.sleep(self._backoff(attempt, response))
+                continue
+
+            response.raise_for_status()
+            return response
+
+    def _params(self, query, location, language):
+        return {
+            "api_key": self.api_key,
+            "q": query,
+            "location": location,
+            "hl": language,
+            "gl": "us",
+            "google_domain": "google.com",
+            "num": 30  # Get top 30 results
+        }
+
+    @staticmethod
+    def _parse(query, response_data):
+        # Extract organic results from the SERPapi response
+        organic_results = []
+
+        if "organic_results" in response_data:
+            for i, result in enumerate(response_data["organic_results"], 1):
+                organic_results.append({
+                    'position': i,
+                    'url': result.get('link'),
+                    'title': result.get('title'),
+                    'description': result.get('snippet'),
+                })
+
+        return {
+            'organic_results': organic_results,
+            'query': query,
+            'timestamp': time.time()
+        }
+
     def fetch_rankings(self, query, location="United States", language="en"):
         """Fetch SERP data for a given query using SERPapi.com"""
         try:
-            params = {
-                "api_key": self.api_key,
-                "q": query,
-                "location": location,
-                "hl": language,
-                "gl": "us",
-                "google_domain": "google.com",
-                "num": 30  # Get top 30 results
-            }
-            
-            response = requests.get(self.base_url, params=params)
-            response.raise_for_status()
-            
-            response_data = response.json()
-            
-            # Extract organic results from the SERPapi response
-            organic_results = []
-            
-            if "organic_results" in response_data:
-                for i, result in enumerate(response_data["organic_results"], 1):
-                    organic_results.append({
-                        'position': i,
-                        'url': result.get('link'),
-                        'title': result.get('title'),
-                        'description': result.get('snippet'),
-                    })
-            
-            return {
-                'organic_results': organic_results,
-                'query': query,
-                'timestamp': time.time()
-            }
-            
+            response = self._get(self._params(query, location, language))
+            return self._parse(query, response.json())
         except requests.RequestException as e:
             logger.error(f"Error fetching SERP data from SERPapi: {e}")
             return None
+        except (KeyError, IndexError, ValueError) as e:
+            logger.error(f"Error parsing SERPapi response: {e}")
+            return None
+
+    async def fetch_rankings_async(self, query, location="United States", language="en"):
+        """fetch_rankings on the event loop"""
+        try:
+            response = await self._get_async(self._params(query, location, language))
+            return self._parse(query, response.json())
+        except httpx.HTTPError as e:
+            logger.error(f"Error fetching SERP data from SERPapi: {e}")
+            return None
         except (KeyError, IndexError, ValueError) as e:
             logger.error(f"Error parsing SERPapi response: {e}")
             return None 
\ No newline at end of file
@@ -0,0 +1,82 @@
+from itertools import groupby
+import numpy as np
+
+from sqlalchemy import insert, select
+from models.database import db, Ranking, SerpSnapshot
+
+# 6 bytes per result; positions fit easily in int16 (SERPs go to 100 at most)
+SNAPSHOT_DTYPE = np.dtype([('url_id', '<i4'), ('position', '<i2')])
+
+
+def encode_snapshot(url_ids, positions):
+    """Pack one snapshot's (url_id, position) pairs into bytes"""
+    packed = np.empty(len(url_ids), dtype=SNAPSHOT_DTYPE)
+    packed['url_id'] = url_ids
+    packed['position'] = positions
+    return packed.tobytes()
+
+
+def decode_snapshot(payload):
+    """Read-only structured array view over a snapshot payload"""
+    return np.frombuffer(payload, dtype=SNAPSHOT_DTYPE)
+
+
+def write_snapshots(snapshots, commit=False):
+    """Insert packed snapshots with one executemany.
+
+    `snapshots` is a list of (keyword_id, timestamp, url_ids, positions).
+    """
+    if not snapshots:
+        return 0
+    db.session.execute(insert(SerpSnapshot), [
+        {
+            "keyword_id": keyword_id,
+            "timestamp": timestamp,
+            "result_count": len(url_ids),
+            "payload": encode_snapshot(url_ids, positions)
+        }
+        for keyword_id, timestamp, url_ids, positions in snapshots
+    ])
+    if commit:
+        db.session.commit()
+    return len(snapshots)
+
+
+def load_snapshots(keyword_ids, since=None, newest_first=True, limit=None):
+    """[(keyword_id, timestamp, decoded array)] for the given keywords"""
+    query = select(SerpSnapshot.keyword_id, SerpSnapshot.timestamp, SerpSnapshot.payload)\
+        .where(SerpSnapshot.keyword_id.in_(keyword_ids))
+    if since is not None:
+        query = query.where(SerpSnapshot.timestamp >= since)
+    order = SerpSnapshot.timestamp.desc() if newest_first else SerpSnapshot.timestamp
+    query = query.order_by(order)
+    if limit is not None:
+        query = query.limit(limit)
+    return [(keyword_id, timestamp, decode_snapshot(payload))
+            for keyword_id, timestamp, payload in db.session.execute(query)]
+
+
+def backfill_from_rows(batch_size=1000):
+    """Pack existing Ranking rows into SerpSnapshot rows; returns the number of snapshots written.
+
+    Only (keyword_id, timestamp) groups without a snapshot yet are written,
+    so it can be re-run after a partial backfill.
+    """
+    existing = set(db.session.execute(select(SerpSnapshot.keyword_id, SerpSnapshot.timestamp)).all())
+    query = select(Ranking.keyword_id, Ranking.timestamp, Ranking.url_id, Ranking.position)\
+        .order_by(Ranking.keyword_id, Ranking.timestamp, Ranking.position)
+
+    written = 0
+    pending = []
+    rows = db.session.execute(query).yield_per(10000)
+    for (keyword_id, timestamp), group in groupby(rows, key=lambda r: (r.keyword_id, r.timestamp)):
+        if (keyword_id, timestamp) in existing:
+            continue
+        group = list(group)
+        pending.append((keyword_id, timestamp, [r.url_id for r in group], [r.position for r in group]))
+        if len(pending) >= batch_size:
+            written += write_snapshots(pending)
+            pending = []
+    written += write_snapshots(pending)
+    db.session.commit()
+    return written
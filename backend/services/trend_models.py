@@ -0,0 +1,167 @@
+"""Trend fitters for packed position series.
+
+Every model takes the arrays of a SeriesBatch (positions, mask, counts) and
+returns, per row, a line through its points: slope and intercept against the
+column index, plus std_err (the slope's standard error from that line's
+residuals, which sets the confidence band) and volatility (np.std of the
+positions). Rows with fewer than three points get NaN. Pick one by name with
+get_model; BatchRankingPredictor turns the lines into predictions.
+"""
+import warnings
+import numpy as np
+
+HOLT_ALPHA = 0.5
+HOLT_BETA = 0.1
+HUBER_K = 1.345
+HUBER_ITERATIONS = 10
+THEIL_SEN_PAIRS_PER_CHUNK = 4_000_000
+
+
+def _moments(positions, mask, counts):
+    """(x, n_safe, x_mean, y_mean, ss_xx, ss_yy) per row, NaN for rows with fewer than three points"""
+    n_safe = np.where(counts >= 3, counts.astype(np.float64), np.nan)
+    x = np.arange(positions.shape[1], dtype=np.float64)
+    x_mean = np.where(mask, x[None, :], 0.0).sum(axis=1) / n_safe
+    y_mean = positions.sum(axis=1) / n_safe
+    dx = np.where(mask, x[None, :] - x_mean[:, None], 0.0)
+    dy = np.where(mask, positions - y_mean[:, None], 0.0)
+    return x, n_safe, x_mean, y_mean, (dx * dx).sum(axis=1), (dy * dy).sum(axis=1)
+
+
+def _line_fit(positions, mask, counts, slope, intercept, residual_ss=None):
+    """Result dict for a fitted line; std_err from the line's own residuals unless given"""
+    x, n_safe, _, _, ss_xx, ss_yy = _moments(positions, mask, counts)
+    slope = np.where(counts >= 3, slope, np.nan)
+    intercept = np.where(counts >= 3, intercept, np.nan)
+    if residual_ss is None:
+        residual = np.where(mask, positions - (intercept[:, None] + slope[:, None] * x[None, :]), 0.0)
+        residual_ss = (residual * residual).sum(axis=1)
+    return {
+        'slope': slope,
+        'intercept': intercept,
+        'std_err': np.sqrt(residual_ss / (n_safe - 2) / ss_xx),
+        'volatility': np.sqrt(ss_yy / n_safe),
+    }
+
+
+def fit_linear_trends(positions, mask, counts):
+    """Closed-form least squares of position against column index for every row at once.
+
+    x is the column: the sample index for left-aligned rows, the day for
+    daily grids (gaps are simply masked). Returns slope, intercept, std_err
+    and volatility arrays with the same semantics as scipy.stats.linregress /
+    np.std applied row by row. Rows with fewer than three points get NaN.
+    """
+    x, n_safe, x_mean, y_mean, ss_xx, ss_yy = _moments(positions, mask, counts)
+    dx = np.where(mask, x[None, :] - x_mean[:, None], 0.0)
+    dy = np.where(mask, positions - y_mean[:, None], 0.0)
+    ss_xy = (dx * dy).sum(axis=1)
+
+    slope = ss_xy / ss_xx
+    intercept = y_mean - slope * x_mean
+    residual = np.maximum(ss_yy - slope * ss_xy, 0.0)
+    std_err = np.sqrt(residual / (n_safe - 2) / ss_xx)
+    volatility = np.sqrt(ss_yy / n_safe)
+
+    return {
+        'slope': slope,
+        'intercept': intercept,
+        'std_err': std_err,
+        'volatility': volatility,
+    }
+
+
+def fit_holt(positions, mask, counts, alpha=HOLT_ALPHA, beta=HOLT_BETA):
+    """Holt's linear (double exponential) smoothing, all rows stepped together column by column.
+
+    The trend starts at the least-squares slope. Masked columns after a row's
+    first point advance the level by the trend without updating either, so
+    gaps are extrapolated. std_err comes from the one-step-ahead errors.
+    """
+    n_series, width = positions.shape
+    start = fit_linear_trends(positions, mask, counts)
+    level = np.full(n_series, np.nan)
+    trend = np.nan_to_num(start['slope'])
+    sse = np.zeros(n_series)
+
+    for t in range(width):
+        observed = mask[:, t]
+        y = positions[:, t]
+        started = ~np.isnan(level)
+        forecast = level + trend
+        update = observed & started
+        error = np.where(update, y - forecast, 0.0)
+        sse += error * error
+        smoothed = forecast + alpha * error
+        trend = np.where(update, beta * (smoothed - level) + (1 - beta) * trend, trend)
+        level = np.where(started, smoothed, np.where(observed, y, level))
+
+    # Every started row's level now sits at the last column
+    slope = trend
+    intercept = level - slope * (width - 1)
+    return _line_fit(positions, mask, counts, slope, intercept, residual_ss=sse)
+
+
+def fit_theil_sen(positions, mask, counts):
+    """Theil–Sen: the median of all pairwise slopes, intercept median(y) - slope·median(x) as in scipy.
+
+    Cost grows with the square of the row width, so rows are processed in
+    chunks of about THEIL_SEN_PAIRS_PER_CHUNK pairs.
+    """
+    n_series, width = positions.shape
+    x = np.arange(width, dtype=np.float64)
+    left, right = np.triu_indices(width, 1)
+    dx = (right - left).astype(np.float64)
+    slope = np.full(n_series, np.nan)
+    chunk = max(1, THEIL_SEN_PAIRS_PER_CHUNK // max(1, len(left)))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN rows (fewer than two points)
+        for start in range(0, n_series, chunk):
+            rows = slice(start, start + chunk)
+            pair_slopes = (positions[rows][:, right] - positions[rows][:, left]) / dx
+            valid = mask[rows][:, right] & mask[rows][:, left]
+            slope[rows] = np.nanmedian(np.where(valid, pair_slopes, np.nan), axis=1)
+        intercept = np.nanmedian(np.where(mask, positions, np.nan), axis=1) \
+            - slope * np.nanmedian(np.where(mask, x[None, :], np.nan), axis=1)
+    return _line_fit(positions, mask, counts, slope, intercept)
+
+
+def fit_huber(positions, mask, counts, k=HUBER_K, iterations=HUBER_ITERATIONS):
+    """Huber regression by iteratively reweighted least squares, starting from the least-squares line.
+
+    Residuals beyond k robust standard deviations (MAD / 0.6745) get weight
+    k·scale/|r|, so a few freak positions barely move the trend.
+    """
+    x = np.arange(positions.shape[1], dtype=np.float64)
+    start = fit_linear_trends(positions, mask, counts)
+    slope, intercept = start['slope'], start['intercept']
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # rows with fewer than three points stay NaN
+        for _ in range(iterations):
+            residual = positions - (intercept[:, None] + slope[:, None] * x[None, :])
+            scale = np.nanmedian(np.where(mask, np.abs(residual), np.nan), axis=1) / 0.6745
+            scaled = np.abs(residual) / (k * np.where(scale > 0, scale, np.inf))[:, None]
+            weights = np.where(mask, 1.0 / np.maximum(scaled, 1.0), 0.0)
+
+            total = weights.sum(axis=1)
+            x_mean = (weights * x[None, :]).sum(axis=1) / total
+            y_mean = (weights * positions).sum(axis=1) / total
+            dx = x[None, :] - x_mean[:, None]
+            slope = (weights * dx * (positions - y_mean[:, None])).sum(axis=1) / (weights * dx * dx).sum(axis=1)
+            intercept = y_mean - slope * x_mean
+    return _line_fit(positions, mask, counts, slope, intercept)
+
+
+MODELS = {
+    'linear': fit_linear_trends,
+    'holt': fit_holt,
+    'theil_sen': fit_theil_sen,
+    'huber': fit_huber,
+}
+
+
+def get_model(name):
+    try:
+        return MODELS[name]
+    except KeyError:
+        raise ValueError(f"Unknown trend model {name!r}; expected one of {sorted(MODELS)}")